@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Run per-agent analysis over a pool of worker processes
+Call columns are placed in shared memory once; each worker copies out the
+contiguous block of calls for its agents, so no DataFrames are pickled
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from call_data import CATEGORY_COLUMNS, CallData
+
+COLUMNS = ('extension', 'epoch', 'duration', 'clock_hour') + tuple(CATEGORY_COLUMNS)
+
+# Partitions handed out per worker, so one busy agent doesn't leave cores idle
+PARTITIONS_PER_WORKER = 4
+
+
+def map_agents(func, data, workers=1):
+    """Run func over agent partitions of the calls: {extension: result} in extension order
+
+    func takes a CallData holding every call of some agents (each agent's calls
+    in file order) and returns a dict keyed by extension. It must be a
+    module-level function (or a functools.partial of one) so worker processes
+    can import it, and an agent's result must depend only on that agent's
+    calls, which makes the output the same for any number of workers.
+    """
+    if workers <= 1 or len(data.extensions()) <= 1:
+        return dict(sorted(func(data).items()))
+
+    # Group each agent's calls into one contiguous block (stable, so file order is kept)
+    order = np.argsort(data.extension, kind='stable')
+    bounds = _partition_bounds(data.extension[order], workers * PARTITIONS_PER_WORKER)
+
+    blocks = []
+    try:
+        spec = []
+        for name in COLUMNS:
+            column = data.codes(name)[order]
+            block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(column.shape, column.dtype, buffer=block.buf)[:] = column
+            spec.append((name, block.name, column.shape, column.dtype.str))
+
+        tasks = [(func, spec, data.categories, start, stop)
+                 for start, stop in zip(bounds[:-1], bounds[1:])]
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for partial in pool.map(_run_partition, tasks):
+                results.update(partial)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return dict(sorted(results.items()))
+
+
+def _partition_bounds(extensions, partitions):
+    """Row offsets splitting extension-sorted calls into about `partitions`
+    similar-sized blocks, never splitting an agent"""
+    agent_starts = np.flatnonzero(np.r_[True, extensions[1:] != extensions[:-1]])
+    targets = np.linspace(0, len(extensions), partitions + 1)[1:-1]
+    cuts = agent_starts[np.clip(np.searchsorted(agent_starts, targets), 0, len(agent_starts) - 1)]
+    return np.unique(np.r_[0, cuts, len(extensions)]).tolist()
+
+
+def _run_partition(task):
+    """Worker: attach to the shared columns, copy out rows start:stop and run func"""
+    func, spec, categories, start, stop = task
+    columns = {}
+    for name, block_name, shape, dtype in spec:
+        block = shared_memory.SharedMemory(name=block_name)
+        try:
+            columns[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)[start:stop].copy()
+        finally:
+            block.close()
+
+    codes = {name: columns[name] for name in CATEGORY_COLUMNS}
+    part = CallData(columns['extension'], columns['epoch'], columns['duration'], columns['clock_hour'],
+                    codes, categories)
+    return func(part)
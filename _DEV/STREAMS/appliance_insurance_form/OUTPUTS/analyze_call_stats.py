@@ -4,87 +4,59 @@ Analyze call statistics for extensions 1001 and 1002
 Provides detailed breakdowns by hour, day, and comparison with other agents
 """
 
-import csv
+import argparse
 import os
 from collections import defaultdict
-from datetime import datetime, timedelta
 
-def parse_duration_seconds(duration_str):
-    """Parse duration in seconds"""
-    try:
-        return int(duration_str)
-    except:
-        return 0
+import numpy as np
 
-def extract_extension(from_field):
-    """Extract extension number from 'From' field"""
-    if not from_field:
-        return None
-    if 'Ext' in from_field:
-        parts = from_field.split()
-        for part in parts:
-            if part.isdigit():
-                return part
-    return None
+import data_store
+from call_data import load_call_data
+from call_metrics import MetricsCube
 
-def parse_time(time_str):
-    """Parse time string to hour"""
-    try:
-        # Format: "13:19:41"
-        hour = int(time_str.split(':')[0])
-        return hour
-    except:
-        return None
+def counts_by_first_seen(codes, labels):
+    """(label, count) pairs for a categorical column, in order of first appearance"""
+    uniq, first, counts = np.unique(codes, return_index=True, return_counts=True)
+    return [(labels[uniq[i]], int(counts[i])) for i in np.argsort(first, kind='stable')]
 
 def main():
+    parser = argparse.ArgumentParser(description='Analyze call statistics for Ext 1001 and 1002')
+    parser.add_argument('--db', action='store_true',
+                        help='query the SQLite store (data_store.py) for just these agents\' calls and the '
+                             'per-agent totals, loading the export into it if it changed')
+    parser.add_argument('--input', metavar='CSV',
+                        help="call-data export to analyze (default: the one in ~/Downloads)")
+    args = parser.parse_args()
+    
     downloads_dir = os.path.expanduser('~/Downloads')
     output_dir = os.path.dirname(os.path.abspath(__file__))
     
-    input_file = os.path.join(downloads_dir, 'Untitled spreadsheet - call-data (1) (2).csv')
+    input_file = args.input or os.path.join(downloads_dir, 'Untitled spreadsheet - call-data (1) (2).csv')
     
     print("📊 Analyzing Call Statistics for Ext 1001 and 1002\n")
     print("="*80)
     
-    # Data structures
-    ext_1001_calls = []
-    ext_1002_calls = []
-    all_extensions = defaultdict(list)
-    
     # Read call data
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            from_field = row.get('From', '')
-            ext = extract_extension(from_field)
-            
-            if ext:
-                call_data = {
-                    'extension': ext,
-                    'call_type': row.get('Call Type', ''),
-                    'to': row.get('To', ''),
-                    'answered_by': row.get('Answered By', ''),
-                    'date': row.get('Date', ''),
-                    'time': row.get('Time', ''),
-                    'day_of_week': row.get('Day Of Week', ''),
-                    'duration': row.get('Duration', ''),
-                    'duration_seconds': parse_duration_seconds(row.get('Duration (Seconds)', '0')),
-                    'call_result': row.get('Call Result', ''),
-                    'has_recording': row.get('Has Recording', ''),
-                    'hour': parse_time(row.get('Time', ''))
-                }
-                
-                all_extensions[ext].append(call_data)
-                
-                if ext == '1001':
-                    ext_1001_calls.append(call_data)
-                elif ext == '1002':
-                    ext_1002_calls.append(call_data)
+    if args.db:
+        conn = data_store.connect()
+        source = data_store.load_calls(conn, input_file)
+        data = data_store.select_calls(conn, source, [1001, 1002])
+        agent_totals = data_store.agent_totals(conn, source)
+        conn.close()
+    else:
+        data = load_call_data(input_file)
+        agent_totals = None
+    # Agent x date x hour totals; the tables below are slices and reductions of it
+    cube = MetricsCube(data)
+    if agent_totals is None:
+        agent_totals = cube.agent_totals()
+    ext_1001_calls = data.select(data.extension == 1001)
+    ext_1002_calls = data.select(data.extension == 1002)
     
     print(f"\n✅ Loaded call data")
     print(f"   📞 Ext 1001: {len(ext_1001_calls)} calls")
     print(f"   📞 Ext 1002: {len(ext_1002_calls)} calls")
-    print(f"   👥 Total extensions found: {len(all_extensions)}")
+    print(f"   👥 Total extensions found: {len(agent_totals)}")
     print("="*80)
     
     # Analysis for each extension
@@ -99,22 +71,21 @@ def main():
         print(f"📊 DETAILED ANALYSIS: {ext_name}")
         print(f"{'='*80}\n")
         
+        a = cube.agent(ext_num)
+        
         # Overall Statistics
         total_calls = len(calls)
-        total_duration_sec = sum(c['duration_seconds'] for c in calls)
+        total_duration_sec = int(cube.talk[a].sum() + cube.untimed_talk[a].sum())
         total_duration_min = total_duration_sec / 60
         avg_duration_sec = total_duration_sec / total_calls if total_calls > 0 else 0
         
         # Call results breakdown
         call_results = defaultdict(int)
-        for call in calls:
-            result = call['call_result'] or 'Unknown'
-            call_results[result] += 1
+        for result, count in counts_by_first_seen(calls.call_result, data.categories['call_result']):
+            call_results[result or 'Unknown'] += count
         
         # Call types breakdown
-        call_types = defaultdict(int)
-        for call in calls:
-            call_types[call['call_type']] += 1
+        call_types = dict(counts_by_first_seen(calls.call_type, data.categories['call_type']))
         
         print("📈 OVERALL STATISTICS")
         print("-" * 80)
@@ -136,31 +107,25 @@ def main():
             pct = (count / total_calls * 100) if total_calls > 0 else 0
             print(f"   {result:15s}: {count:4d} calls ({pct:5.1f}%)")
         
-        # By Hour Analysis
-        by_hour = defaultdict(lambda: {'count': 0, 'duration': 0})
-        for call in calls:
-            hour = call['hour']
-            if hour is not None:
-                by_hour[hour]['count'] += 1
-                by_hour[hour]['duration'] += call['duration_seconds']
+        # By Hour Analysis (the Time column's hour, whatever the Date)
+        hour_counts = cube.clock_calls[a]
+        hour_durations = cube.clock_talk[a]
         
         print(f"\n📅 CALLS BY HOUR")
         print("-" * 80)
         print(f"   {'Hour':<6} {'Calls':<8} {'Duration (min)':<15} {'Avg (sec)':<12}")
         print("-" * 80)
-        for hour in sorted(by_hour.keys()):
-            count = by_hour[hour]['count']
-            duration = by_hour[hour]['duration']
+        for hour in np.flatnonzero(hour_counts):
+            count = int(hour_counts[hour])
+            duration = hour_durations[hour]
             avg = duration / count if count > 0 else 0
             print(f"   {hour:02d}:00  {count:<8d} {duration/60:<15.2f} {avg:<12.1f}")
         
         # By Day Analysis
-        by_day = defaultdict(lambda: {'count': 0, 'duration': 0})
-        for call in calls:
-            day = call['day_of_week']
-            if day:
-                by_day[day]['count'] += 1
-                by_day[day]['duration'] += call['duration_seconds']
+        day_labels = data.categories['day_of_week']
+        day_counts, day_durations = cube.weekday_calls[a], cube.weekday_talk[a]
+        by_day = {label: (int(day_counts[code]), day_durations[code])
+                  for code, label in enumerate(day_labels) if label and day_counts[code]}
         
         print(f"\n📅 CALLS BY DAY OF WEEK")
         print("-" * 80)
@@ -169,26 +134,22 @@ def main():
         day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         for day in day_order:
             if day in by_day:
-                count = by_day[day]['count']
-                duration = by_day[day]['duration']
+                count, duration = by_day[day]
                 avg = duration / count if count > 0 else 0
                 print(f"   {day:<12} {count:<8d} {duration/60:<15.2f} {avg:<12.1f}")
         
-        # By Date Analysis
-        by_date = defaultdict(lambda: {'count': 0, 'duration': 0})
-        for call in calls:
-            date = call['date']
-            if date:
-                by_date[date]['count'] += 1
-                by_date[date]['duration'] += call['duration_seconds']
+        # By Date Analysis (per Date string as exported, whatever the Time)
+        date_labels = data.categories['date']
+        dates = sorted((label, code) for code, label in enumerate(date_labels)
+                       if label and cube.date_calls[a, code])
         
         print(f"\n📅 CALLS BY DATE")
         print("-" * 80)
         print(f"   {'Date':<20} {'Calls':<8} {'Duration (min)':<15} {'Avg (sec)':<12}")
         print("-" * 80)
-        for date in sorted(by_date.keys()):
-            count = by_date[date]['count']
-            duration = by_date[date]['duration']
+        for date, code in dates:
+            count = int(cube.date_calls[a, code])
+            duration = cube.date_talk[a, code]
             avg = duration / count if count > 0 else 0
             print(f"   {date:<20} {count:<8d} {duration/60:<15.2f} {avg:<12.1f}")
     
@@ -198,12 +159,8 @@ def main():
     print(f"{'='*80}\n")
     
     agent_stats = {}
-    for ext, calls in all_extensions.items():
-        total_calls = len(calls)
-        total_duration = sum(c['duration_seconds'] for c in calls)
-        answered = sum(1 for c in calls if c['call_result'] == 'Answered')
-        
-        agent_stats[ext] = {
+    for ext, total_calls, total_duration, answered in agent_totals:
+        agent_stats[str(ext)] = {
             'calls': total_calls,
             'duration_min': total_duration / 60,
             'avg_duration': total_duration / total_calls if total_calls > 0 else 0,
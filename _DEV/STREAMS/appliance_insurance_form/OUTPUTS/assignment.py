@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Sparse maximum-weight bipartite matching
+Shortest augmenting path Hungarian method (Jonker-Volgenant / Crouse) on
+adjacency lists with a heap, so work grows with the candidate edges rather
+than rows x columns; integer weights keep the optimum exact
+"""
+
+import heapq
+
+
+def max_weight_matching(edges, n_columns, fallback=None):
+    """Assign each row at most one column, and each column at most one row, maximising total weight
+
+    edges[i] lists (column, weight) pairs for row i (columns 0..n_columns-1,
+    integer weights). fallback[i] is the weight row i earns when left
+    unassigned (default 0). Returns the column chosen for each row, or -1
+    for rows left on their fallback.
+    """
+    n_rows = len(edges)
+    if fallback is None:
+        fallback = [0] * n_rows
+
+    # Minimum-cost form: every row also gets a private column n_columns + i for its fallback,
+    # so a complete assignment always exists
+    costs = [[(j, -w) for j, w in row] + [(n_columns + i, -fallback[i])]
+             for i, row in enumerate(edges)]
+    total_columns = n_columns + n_rows
+
+    # Start from each row's cheapest edge so every reduced cost is non-negative
+    u = [min(c for _, c in row) for row in costs]
+    v = [0] * total_columns
+    row4col = [-1] * total_columns
+    col4row = [-1] * n_rows
+
+    for current in range(n_rows):
+        # Dijkstra over reduced costs from the new row to the nearest free column
+        shortest = {}
+        path = {}
+        scanned_rows = []
+        scanned_columns = set()
+        heap = []
+        i = current
+        min_value = 0
+        while True:
+            scanned_rows.append(i)
+            for j, c in costs[i]:
+                if j in scanned_columns:
+                    continue
+                reduced = min_value + c - u[i] - v[j]
+                if reduced < shortest.get(j, reduced + 1):
+                    shortest[j] = reduced
+                    path[j] = i
+                    heapq.heappush(heap, (reduced, j))
+            while True:
+                min_value, j = heapq.heappop(heap)
+                if j not in scanned_columns and shortest[j] == min_value:
+                    break
+            scanned_columns.add(j)
+            if row4col[j] == -1:
+                sink = j
+                break
+            i = row4col[j]
+
+        # Move the duals so the path's edges are tight and every reduced cost stays non-negative
+        u[current] += min_value
+        for i in scanned_rows[1:]:
+            u[i] += min_value - shortest[col4row[i]]
+        for j in scanned_columns:
+            v[j] -= min_value - shortest[j]
+
+        # Flip the augmenting path
+        j = sink
+        while True:
+            i = path[j]
+            row4col[j] = i
+            col4row[i], j = j, col4row[i]
+            if i == current:
+                break
+
+    return [j if j < n_columns else -1 for j in col4row]
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the call reports
+Runs each report on synthetic exports (generate_call_data.py) of growing size,
+timing it and measuring its peak memory, once with the parsed-export cache
+cold and once warm. Each report runs in its own process, so peak RSS is that
+report's alone. Results are saved as JSON in .benchmark/results/ under the
+commit they were measured on; --compare diffs a run against an earlier file
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from call_data import drop_cache
+from generate_call_data import WORK_HOURS, write_call_data
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(SCRIPT_DIR, '.benchmark')
+# Bump when what is measured changes, so older results aren't compared like for like
+RESULTS_VERSION = 1
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Report script -> whether it writes an HTML report (and so takes --output-dir)
+REPORTS = {
+    'analyze_call_stats.py': False,
+    'generate_call_report_html.py': True,
+    'generate_detailed_agent_report.py': True,
+    'generate_all_agents_report.py': True
+}
+
+
+def git_commit():
+    """(commit, uncommitted changes?) of the scripts being measured, or (None, None) outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--', '.'], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, any(line.endswith('.py') for line in status.splitlines())
+
+
+def dataset(rows, agents, calls_per_hour, seed):
+    """Path of the synthetic export with these settings, generated the first time it's needed"""
+    data_dir = os.path.join(BENCHMARK_DIR, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'calls-{rows}-a{agents}-c{calls_per_hour:g}-s{seed}.csv')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        # Days only bound the run when rows isn't given; the row count decides here
+        write_call_data(tmp_file, agents, 1, calls_per_hour, seed, rows)
+        os.replace(tmp_file, path)
+        print(f"   📝 Generated {rows:,} rows in {time.perf_counter() - started:.1f} s")
+    return path
+
+
+def run_report(script, input_file, output_dir, log_file):
+    """(wall seconds, peak RSS in MB, exit code) of one report run in its own process"""
+    command = [sys.executable, os.path.join(SCRIPT_DIR, script), '--input', input_file]
+    if REPORTS[script]:
+        command += ['--output-dir', output_dir]
+    with open(log_file, 'w', encoding='utf-8') as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=SCRIPT_DIR, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives this child's own resource usage (getrusage would fold in every child so far);
+        # it reaps the child behind Popen's back, so hand Popen the exit code
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        seconds = time.perf_counter() - started
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    peak = usage.ru_maxrss / (1 << 20) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    return seconds, peak, process.returncode
+
+
+def compare(results, baseline_file, tolerance):
+    """Print each measurement against the same one in a baseline results file"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != RESULTS_VERSION:
+        print(f"⚠️  {baseline_file} is from another version of the benchmark; not comparing")
+        return
+    before = {(r['report'], r['rows'], r['cache']): r for r in baseline['results']}
+
+    print(f"\n📊 Against {os.path.basename(baseline_file)} (commit {(baseline['commit'] or '?')[:10]})\n")
+    print(f"{'Report':<36} {'Rows':>11} {'Cache':<6} {'Seconds':<24} Peak RSS (MB)")
+    print("-" * 104)
+    regressions = 0
+    for result in results:
+        old = before.get((result['report'], result['rows'], result['cache']))
+        if not old or old['exit_code'] or result['exit_code']:
+            continue
+        time_change = result['seconds'] / old['seconds'] - 1 if old['seconds'] else 0
+        memory_change = result['peak_rss_mb'] / old['peak_rss_mb'] - 1 if old['peak_rss_mb'] else 0
+        flag = ''
+        if time_change > tolerance or memory_change > tolerance:
+            flag = '  ⚠️'
+            regressions += 1
+        seconds = f"{old['seconds']:.2f} → {result['seconds']:.2f} ({time_change:+.0%})"
+        memory = f"{old['peak_rss_mb']:.0f} → {result['peak_rss_mb']:.0f} ({memory_change:+.0%})"
+        print(f"{result['report']:<36} {result['rows']:>11,} {result['cache']:<6} {seconds:<24} {memory}{flag}")
+    print(f"\n{'⚠️ ' if regressions else '✅'} {regressions} measurement(s) more than {tolerance:.0%} "
+          f"slower or larger than the baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory-profile the call reports on synthetic '
+                                                 'exports of growing size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='export sizes in rows')
+    parser.add_argument('--reports', nargs='+', choices=sorted(REPORTS), default=list(REPORTS),
+                        help='report scripts to run (default: all)')
+    parser.add_argument('--agents', type=int, default=50, help='agents in the synthetic exports')
+    parser.add_argument('--calls-per-hour', type=float, default=12,
+                        help='calls per agent per working hour (days grow with the size)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', metavar='JSON',
+                        help='results file (default: .benchmark/results/<date>-<commit>.json)')
+    parser.add_argument('--compare', metavar='JSON', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='flag measurements this much slower or larger than --compare\'s (default 0.10)')
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = []
+    run_dir = tempfile.mkdtemp(prefix='call-benchmark-')
+    per_day = args.agents * len(WORK_HOURS) * args.calls_per_hour
+
+    print(f"⏱️  Benchmarking {len(args.reports)} report(s) at {', '.join(f'{n:,}' for n in args.sizes)} rows "
+          f"({args.agents} agents, {args.calls_per_hour:g} calls/hour)\n")
+    for rows in args.sizes:
+        print(f"📞 {rows:,} rows (~{rows / per_day:.0f} days)")
+        input_file = dataset(rows, args.agents, args.calls_per_hour, args.seed)
+        for script in args.reports:
+            # Cold: parse the export; warm: the parse cached by the cold run
+            for cache in ('cold', 'warm'):
+                if cache == 'cold':
+                    drop_cache(input_file)
+                log_file = os.path.join(run_dir, f'{os.path.splitext(script)[0]}-{rows}-{cache}.log')
+                seconds, peak, exit_code = run_report(script, input_file, run_dir, log_file)
+                results.append({'report': script, 'rows': rows, 'cache': cache, 'seconds': round(seconds, 3),
+                                'peak_rss_mb': round(peak, 1), 'exit_code': exit_code})
+                failed = f"  ❌ exit {exit_code}, see {log_file}" if exit_code else ''
+                print(f"   {script:<36} {cache:<5} {seconds:>8.2f} s {peak:>8.0f} MB{failed}")
+        # Cached parses of the bigger exports are large; don't leave them behind
+        drop_cache(input_file)
+        print()
+
+    output_file = args.output
+    if not output_file:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output_file = os.path.join(BENCHMARK_DIR, 'results', f"{stamp}-{(commit or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'commit': commit,
+            'uncommitted_changes': dirty,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': {'agents': args.agents, 'calls_per_hour': args.calls_per_hour, 'seed': args.seed},
+            'results': results
+        }, f, indent=2)
+    print(f"💾 Results: {output_file}")
+    print(f"   Report output and logs: {run_dir}")
+
+    if args.compare:
+        compare(results, args.compare, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: SequenceMatcher name score vs the LCS kernel
+Times both scorers on generated UK name pairs and reports how closely the
+kernel's calibrated score follows the current 60/40 weighting
+"""
+
+import argparse
+import random
+import time
+from functools import partial
+
+from match_transactions import MATCH_THRESHOLD, token_match_score
+from name_similarity import lcs_match_score
+from name_table import extract_first_last
+
+FIRST_NAMES = """oliver george harry jack jacob noah charlie thomas oscar william james leo alfie henry
+joshua freddie archie ethan isaac alexander joseph edward samuel max logan lucas daniel theo
+arthur mohammed harrison benjamin mason finley sebastian adam dylan zachary riley teddy
+olivia amelia isla ava emily sophia grace mia poppy ella lily evie isabella sophie ivy freya
+harper willow charlotte jessica rosie daisy alice sienna florence matilda elsie phoebe evelyn
+margaret susan karen sarah helen julie claire joanne nicola emma rachel michelle lisa donna
+david john paul mark andrew stephen ian gary kevin peter michael richard christopher robert
+anthony simon neil colin graham stuart gareth rhys owen dafydd siobhan niamh aoife ciara
+sinead fiona morag moira eilidh catriona alasdair hamish angus fergus callum ewan rory""".split()
+
+LAST_NAMES = """smith jones williams taylor brown davies evans wilson thomas johnson roberts robinson
+thompson wright walker white edwards hughes green hall lewis harris clarke patel jackson wood
+turner martin cooper hill ward morris moore clark lee king baker harrison morgan allen james
+scott phillips watson davis parker price bennett young griffiths mitchell kelly cook carter
+richardson bailey collins bell shaw murphy miller cox richards khan marshall anderson simpson
+ellis adams singh begum wilkinson foster chapman powell webb rogers gray mason ali hunt
+hussain campbell matthews owen palmer holmes mills barnes knight lloyd butler russell barker
+fisher stevens jenkins murray dixon harvey graham pearson ahmed fletcher walsh kaur gibson
+howard andrews stewart elliott reynolds saunders payne fox ford pearce day brooks west
+macdonald mcdonald oconnor obrien barraclough featherstonehaugh cholmondeley ramsbottom
+higginbottom ormerod pemberton postlethwaite winterbottom greenhalgh ackroyd schofield""".split()
+
+TITLES = ['', '', '', 'Mr ', 'Mrs ', 'Ms ', 'Miss ', 'Dr ']
+
+
+def typo(word, rng):
+    """Drop, insert or swap one inner character"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 2)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice('aeiourstln') + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def bank_style(first, last, rng):
+    """How a bank export might show a customer's account name"""
+    style = rng.randrange(6)
+    if style == 0:
+        return f"{first.title()} {last.title()}"
+    if style == 1:
+        return f"{first[0].upper()} {last.upper()}"
+    if style == 2:
+        return f"MR {first.upper()} {last.upper()}"
+    if style == 3:
+        return f"{typo(first, rng).title()} {typo(last, rng).title()}"
+    if style == 4:
+        return f"{last.upper()} {first.upper()}"
+    return f"{first.title()} {typo(last, rng)}"
+
+
+def name_pairs(count, seed):
+    """Normalized (first1, last1, first2, last2) pairs: half the same person, half strangers"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customer = f"{rng.choice(TITLES)}{first.title()} {last.title()}"
+        if i % 2:
+            account = bank_style(first, last, rng)
+        else:
+            account = bank_style(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng)
+        pairs.append(extract_first_last(customer) + extract_first_last(account))
+    return pairs
+
+
+def time_scorer(label, score, pairs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pair in pairs:
+            score(*pair)
+        best = min(best, time.perf_counter() - start)
+    per_pair = best / len(pairs) * 1e6
+    print(f"   {label:<32} {per_pair:8.2f} µs/pair")
+    return per_pair
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the name scorers on UK name pairs')
+    parser.add_argument('--pairs', type=int, default=20000, help='name pairs to score')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per scorer (best is kept)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    pairs = name_pairs(args.pairs, args.seed)
+
+    print(f"⏱️  Scoring {len(pairs)} UK name pairs\n")
+    baseline = time_scorer('SequenceMatcher (current)', token_match_score, pairs, args.repeat)
+    full = time_scorer('LCS kernel (calibrated)', lcs_match_score, pairs, args.repeat)
+    bounded = time_scorer(f'LCS kernel (cutoff {MATCH_THRESHOLD})',
+                          partial(lcs_match_score, threshold=MATCH_THRESHOLD), pairs, args.repeat)
+    print(f"\n   Speed-up: {baseline / full:.1f}x calibrated, {baseline / bounded:.1f}x with cutoff")
+
+    # Agreement of the calibrated score with the current one
+    current = [token_match_score(*pair) for pair in pairs]
+    calibrated = [lcs_match_score(*pair) for pair in pairs]
+    diffs = [c - s for s, c in zip(current, calibrated)]
+    changed = [d for d in diffs if d]
+    flipped = sum((s >= MATCH_THRESHOLD) != (c >= MATCH_THRESHOLD) for s, c in zip(current, calibrated))
+
+    print(f"\n📏 Calibrated score vs current")
+    print(f"   Identical scores:   {100 * (1 - len(changed) / len(pairs)):.2f}%")
+    print(f"   Min difference:     {min(diffs):+.4f}")
+    print(f"   Max difference:     {max(diffs):+.4f}")
+    print(f"   Mean when changed:  {sum(changed) / len(changed) if changed else 0:+.4f}")
+    print(f"   Threshold flips:    {flipped} ({100 * flipped / len(pairs):.2f}% of pairs cross {MATCH_THRESHOLD})")
+
+
+if __name__ == '__main__':
+    main()
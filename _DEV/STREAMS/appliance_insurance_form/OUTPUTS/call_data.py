@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Shared loader for call-data CSV exports
+Parses the export once into typed columns used by every call report
+Parsed columns are cached on disk (.call_cache/) keyed by the export's fingerprint
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Marker for calls whose Date/Time could not be parsed (same bits as numpy NaT)
+NO_TIME = np.iinfo(np.int64).min
+
+# Categorical columns: attribute name -> CSV header
+CATEGORY_COLUMNS = {
+    'call_type': 'Call Type',
+    'call_result': 'Call Result',
+    'day_of_week': 'Day Of Week',
+    'date': 'Date'
+}
+
+EXTENSION_PATTERN = re.compile(r'Ext (\d+)')
+EPOCH = datetime(1970, 1, 1)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.call_cache')
+# Bump when the cached column layout changes so old cache files are ignored
+CACHE_VERSION = 3
+
+
+class CallData:
+    """Calls with an extension, stored as typed column arrays
+
+    extension   int16  agent extension (e.g. 1001)
+    epoch       int64  call start as wall-clock seconds since 1970-01-01 (NO_TIME if unparseable)
+    duration    int32  'Duration (Seconds)' (0 if missing)
+    clock_hour  int8   hour of the Time column alone (-1 if it has none), so a call
+                       with a bad Date still has an hour
+    call_type, call_result, day_of_week, date
+                int8   codes into self.categories[name] (date is the raw Date string)
+    """
+
+    def __init__(self, extension, epoch, duration, clock_hour, codes, categories, agent_state=None):
+        self.extension = extension
+        self.epoch = epoch
+        self.duration = duration
+        self.clock_hour = clock_hour
+        self.call_type = codes['call_type']
+        self.call_result = codes['call_result']
+        self.day_of_week = codes['day_of_week']
+        self.date = codes['date']
+        self.categories = categories
+        # Per-agent totals maintained by the loader (kept across incremental appends)
+        self.agent_state = agent_state
+
+    def __len__(self):
+        return len(self.extension)
+
+    def codes(self, name):
+        return getattr(self, name)
+
+    def code_of(self, name, label):
+        """Code for a category label (-1 if it never occurs)"""
+        labels = self.categories[name]
+        return labels.index(label) if label in labels else -1
+
+    def labels(self, name, codes=None):
+        """Decode a categorical column (or the given codes of it) back to an array of strings"""
+        if codes is None:
+            codes = self.codes(name)
+        return np.array(self.categories[name], dtype=object)[np.asarray(codes)]
+
+    @property
+    def answered(self):
+        return self.call_result == self.code_of('call_result', 'Answered')
+
+    @property
+    def has_time(self):
+        return self.epoch != NO_TIME
+
+    @property
+    def day(self):
+        """Days since 1970-01-01 (-1 when the call has no time)"""
+        return np.where(self.has_time, self.epoch // 86400, -1)
+
+    @property
+    def hour(self):
+        """Hour of day 0-23 (-1 when the call has no time)"""
+        return np.where(self.has_time, (self.epoch % 86400) // 3600, -1)
+
+    def extensions(self):
+        """Sorted unique extensions"""
+        return np.unique(self.extension)
+
+    def agent_totals(self):
+        """(extension, calls, talk seconds, answered) per agent, in order of first appearance"""
+        if self.agent_state is not None:
+            return self.agent_state
+        exts, first_seen, index = np.unique(self.extension, return_index=True, return_inverse=True)
+        calls = np.bincount(index, minlength=len(exts))
+        talk = np.bincount(index, weights=self.duration, minlength=len(exts))
+        answered = np.bincount(index, weights=self.answered, minlength=len(exts))
+        return [(int(exts[i]), int(calls[i]), int(talk[i]), int(answered[i]))
+                for i in np.argsort(first_seen, kind='stable')]
+
+    def select(self, index):
+        """New CallData holding only the rows picked by a mask or index array"""
+        codes = {name: self.codes(name)[index] for name in CATEGORY_COLUMNS}
+        return CallData(self.extension[index], self.epoch[index], self.duration[index],
+                        self.clock_hour[index], codes, self.categories)
+
+    def for_extension(self, ext):
+        """Calls for one extension, sorted by start time (file order kept for ties)"""
+        rows = np.flatnonzero(self.extension == int(ext))
+        return self.select(rows[np.argsort(self.epoch[rows], kind='stable')])
+
+    def to_frame(self):
+        """Enriched pandas DataFrame in the layout the pandas reports use"""
+        # pandas is only needed by the pandas reports, so import it here
+        import pandas as pd
+
+        df = pd.DataFrame({
+            'extension': self.extension,
+            'datetime': self.epoch.view('datetime64[s]').astype('datetime64[ns]'),
+            'duration_seconds': self.duration,
+            'Call Type': pd.Categorical.from_codes(self.call_type, self.categories['call_type']),
+            'Call Result': pd.Categorical.from_codes(self.call_result, self.categories['call_result']),
+            'day_of_week': pd.Categorical.from_codes(self.day_of_week, self.categories['day_of_week'])
+        })
+        # Build one date object per distinct day rather than one per call
+        days, day_index = np.unique(self.day, return_inverse=True)
+        dates = np.array([(EPOCH + timedelta(days=int(d))).date() if d >= 0 else pd.NaT
+                          for d in days], dtype=object)
+        df['date'] = dates[day_index]
+        df['hour'] = df['datetime'].dt.hour
+        return df
+
+
+def _code_dtype(n_categories):
+    return np.int8 if n_categories <= np.iinfo(np.int8).max else np.int16
+
+
+def _parse_duration(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value))
+        except ValueError:
+            return 0
+
+
+def _parse_day(date_str):
+    """'08 Jan 2026' -> epoch seconds at midnight (None if invalid)"""
+    try:
+        return int((datetime.strptime(date_str.strip(), '%d %b %Y') - EPOCH).total_seconds())
+    except ValueError:
+        return None
+
+
+def _parse_hour(time_str):
+    """Leading hour of a Time string ('13:19:41' -> 13), -1 if there is none"""
+    try:
+        hour = int(time_str.split(':')[0])
+    except ValueError:
+        return -1
+    return hour if 0 <= hour < 24 else -1
+
+
+def _parse_clock(time_str):
+    """'13:19:41' -> seconds since midnight (None if invalid)"""
+    parts = time_str.strip().split(':')
+    if len(parts) != 3:
+        return None
+    try:
+        hours, minutes, seconds = (int(p) for p in parts)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class _ColumnBuilder:
+    """Accumulates parsed rows into compact typed buffers"""
+
+    def __init__(self, categories=None):
+        self.extension = array('h')
+        self.epoch = array('q')
+        self.duration = array('i')
+        self.clock_hour = array('b')
+        self.codes = {name: array('h') for name in CATEGORY_COLUMNS}
+        # Seeded with known categories so codes stay stable when appending rows
+        self.lookup = {name: {label: code for code, label in enumerate((categories or {}).get(name, []))}
+                       for name in CATEGORY_COLUMNS}
+        self.day_cache = {}
+
+    def feed(self, reader, header):
+        index = {name: header.index(col) if col in header else None for name, col in
+                 [('from', 'From'), ('date', 'Date'), ('time', 'Time'),
+                  ('duration', 'Duration (Seconds)')] + list(CATEGORY_COLUMNS.items())}
+        day_cache = self.day_cache
+
+        def cell(row, name):
+            i = index[name]
+            return row[i] if i is not None and i < len(row) else ''
+
+        for row in reader:
+            match = EXTENSION_PATTERN.search(cell(row, 'from'))
+            if not match:
+                continue
+
+            date_str = cell(row, 'date')
+            if date_str not in day_cache:
+                day_cache[date_str] = _parse_day(date_str)
+            day = day_cache[date_str]
+            time_str = cell(row, 'time')
+            clock = _parse_clock(time_str)
+
+            self.extension.append(int(match.group(1)))
+            self.epoch.append(day + clock if day is not None and clock is not None else NO_TIME)
+            self.duration.append(_parse_duration(cell(row, 'duration')))
+            self.clock_hour.append(clock // 3600 if clock is not None else _parse_hour(time_str))
+            for name in CATEGORY_COLUMNS:
+                lookup = self.lookup[name]
+                label = cell(row, name)
+                if label not in lookup:
+                    lookup[label] = len(lookup)
+                self.codes[name].append(lookup[label])
+
+    def build(self):
+        categories = {name: list(self.lookup[name]) for name in CATEGORY_COLUMNS}
+        codes = {name: np.frombuffer(self.codes[name], dtype=np.int16).astype(
+                     _code_dtype(len(categories[name])))
+                 for name in CATEGORY_COLUMNS}
+        return CallData(
+            np.frombuffer(self.extension, dtype=np.int16).copy(),
+            np.frombuffer(self.epoch, dtype=np.int64).copy(),
+            np.frombuffer(self.duration, dtype=np.int32).copy(),
+            np.frombuffer(self.clock_hour, dtype=np.int8).copy(),
+            codes,
+            categories
+        )
+
+
+class _LineScanner:
+    """Decoded newline-terminated lines of a binary file from a byte offset
+
+    After iterating, `offset` is the end of the last complete line, `last_line`
+    holds that line's raw bytes and `tail` any unterminated text after it
+    (a row the exporter may still be writing).
+    """
+
+    def __init__(self, f, start, last_line):
+        self.f = f
+        self.offset = start
+        self.last_line = last_line
+        self.tail = ''
+        f.seek(start)
+
+    def __iter__(self):
+        for line in self.f:
+            if not line.endswith(b'\n'):
+                self.tail = line.decode('utf-8')
+                break
+            self.offset += len(line)
+            self.last_line = line
+            yield line.decode('utf-8')
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _append(data, new):
+    """Rows of `new` after the rows of `data` (`new` must be parsed with data's categories seeded)"""
+    codes = {name: np.concatenate([data.codes(name), new.codes(name)]).astype(
+                 _code_dtype(len(new.categories[name])))
+             for name in CATEGORY_COLUMNS}
+    return CallData(
+        np.concatenate([data.extension, new.extension]),
+        np.concatenate([data.epoch, new.epoch]),
+        np.concatenate([data.duration, new.duration]),
+        np.concatenate([data.clock_hour, new.clock_hour]),
+        codes,
+        new.categories,
+        _fold_agent_totals(data.agent_totals(), new.agent_totals())
+    )
+
+
+def _fold_agent_totals(totals, new_totals):
+    """Add per-agent totals of new rows onto running totals (first-seen order kept)"""
+    merged = {ext: [calls, talk, answered] for ext, calls, talk, answered in totals}
+    for ext, calls, talk, answered in new_totals:
+        entry = merged.setdefault(ext, [0, 0, 0])
+        entry[0] += calls
+        entry[1] += talk
+        entry[2] += answered
+    return [(ext, calls, talk, answered) for ext, (calls, talk, answered) in merged.items()]
+
+
+def _parse_rows(f, start, header, last_line, categories=None):
+    """Parse an open export from byte `start`
+
+    Returns (rows from complete lines, checkpoint after the last complete line).
+    The checkpoint's 'tail' holds the unterminated final line, if any.
+    """
+    builder = _ColumnBuilder(categories)
+    scanner = _LineScanner(f, start, last_line)
+    builder.feed(csv.reader(scanner), header)
+    return builder.build(), {
+        'offset': scanner.offset,
+        'last_line_sha256': _sha256(scanner.last_line),
+        'last_line_length': len(scanner.last_line),
+        'tail': scanner.tail
+    }
+
+
+def _parse_export(csv_path):
+    """Full parse from byte 0: (rows from complete lines, checkpoint)"""
+    with open(csv_path, 'rb') as f:
+        header_line = f.readline()
+        header = [h.strip() for h in next(csv.reader([header_line.decode('utf-8-sig')]), [])]
+        data, checkpoint = _parse_rows(f, len(header_line), header, header_line)
+    checkpoint.update(header=header, header_sha256=_sha256(header_line))
+    return data, checkpoint
+
+
+def _checkpointed_line(f, checkpoint):
+    """Last checkpointed row's bytes, or None when the export was truncated or its
+    header / last checkpointed row changed since the checkpoint"""
+    if os.fstat(f.fileno()).st_size < checkpoint['offset']:
+        return None
+    f.seek(0)
+    if _sha256(f.readline()) != checkpoint['header_sha256']:
+        return None
+    f.seek(checkpoint['offset'] - checkpoint['last_line_length'])
+    last_line = f.read(checkpoint['last_line_length'])
+    if _sha256(last_line) != checkpoint['last_line_sha256']:
+        return None
+    return last_line
+
+
+def _resume_export(csv_path, data, checkpoint):
+    """Fold rows appended since `checkpoint` into `data`, reading only the bytes after it
+
+    Returns (data, checkpoint), or None when the export was truncated or its
+    header / last checkpointed row changed, i.e. it must be rebuilt from scratch.
+    """
+    with open(csv_path, 'rb') as f:
+        last_line = _checkpointed_line(f, checkpoint)
+        if last_line is None:
+            return None
+        new_rows, new_checkpoint = _parse_rows(f, checkpoint['offset'], checkpoint['header'],
+                                               last_line, data.categories)
+    new_checkpoint.update(header=checkpoint['header'], header_sha256=checkpoint['header_sha256'])
+    return _append(data, new_rows), new_checkpoint
+
+
+def _with_tail(data, checkpoint):
+    """Add rows from the unterminated final line (never persisted, re-read each load)"""
+    if not checkpoint['tail']:
+        return data
+    builder = _ColumnBuilder(data.categories)
+    builder.feed(csv.reader([checkpoint['tail']]), checkpoint['header'])
+    return _append(data, builder.build())
+
+
+def _stat_fingerprint(csv_path):
+    """Absolute path, size and mtime of an export (no read of its content)"""
+    stat = os.stat(csv_path)
+    return {
+        'path': os.path.abspath(csv_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'version': CACHE_VERSION
+    }
+
+
+def file_fingerprint(csv_path):
+    """Cache key for an export: absolute path, size, mtime and a hash of its content"""
+    sha = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return dict(_stat_fingerprint(csv_path), sha256=sha.hexdigest())
+
+
+def _cache_file(csv_path):
+    """One cache file per source path; a changed export overwrites its entry"""
+    key = hashlib.sha1(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f'{key}.npz')
+
+
+def _read_cache(cache_file):
+    """(CallData, meta) from a cache file of the current layout, else None"""
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file, allow_pickle=False) as cached:
+            meta = json.loads(str(cached['meta']))
+            if meta['fingerprint']['version'] != CACHE_VERSION:
+                return None
+            codes = {name: cached[name] for name in CATEGORY_COLUMNS}
+            agent_state = [tuple(entry) for entry in meta['agent_totals']]
+            data = CallData(cached['extension'], cached['epoch'], cached['duration'],
+                            cached['clock_hour'], codes, meta['categories'], agent_state)
+            return data, meta
+    except (OSError, ValueError, KeyError):
+        # Unreadable or from an older layout - treat as a miss and rebuild
+        return None
+
+
+def _write_cache(cache_file, fingerprint, data, checkpoint):
+    """Write the parsed columns atomically (uncompressed, so loads are a straight read)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = {
+        'fingerprint': fingerprint,
+        'checkpoint': checkpoint,
+        'categories': data.categories,
+        'agent_totals': data.agent_totals()
+    }
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), extension=data.extension,
+                 epoch=data.epoch, duration=data.duration, clock_hour=data.clock_hour,
+                 **{name: data.codes(name) for name in CATEGORY_COLUMNS})
+    os.replace(tmp_file, cache_file)
+
+
+def drop_cache(csv_path):
+    """Forget the cached parse of an export, so its next load parses the file again"""
+    try:
+        os.remove(_cache_file(csv_path))
+    except FileNotFoundError:
+        pass
+
+
+def parse_call_data(csv_path):
+    """Parse a call-data export into CallData (rows without an 'Ext NNNN' caller are dropped)"""
+    return _with_tail(*_parse_export(csv_path))
+
+
+def load_call_data(csv_path, use_cache=True, incremental=False, fingerprint=None):
+    """Load a call-data export, reusing the cached parse while the file is unchanged
+
+    fingerprint is the export's file_fingerprint, if the caller has just taken
+    it (it is taken here otherwise).
+
+    With incremental=True the export is never hashed or re-read from byte 0.
+    The cache is trusted while the file's size and mtime are unchanged and its
+    header and last checkpointed row still hash as they did; a grown export has
+    only the rows appended after the checkpoint parsed and folded into the
+    cached columns and per-agent totals. Truncated or rewritten exports
+    (header or last checkpointed row changed) fall back to a full rebuild.
+    """
+    if not use_cache:
+        return parse_call_data(csv_path)
+
+    cache_file = _cache_file(csv_path)
+    cached = _read_cache(cache_file)
+    if incremental:
+        return _load_incremental(csv_path, cache_file, cached)
+
+    if fingerprint is None:
+        fingerprint = file_fingerprint(csv_path)
+
+    if cached and cached[1]['fingerprint'] == fingerprint:
+        data, checkpoint = cached[0], cached[1]['checkpoint']
+        return _with_tail(data, checkpoint)
+
+    data, checkpoint = _parse_export(csv_path)
+    _write_cache(cache_file, fingerprint, data, checkpoint)
+    return _with_tail(data, checkpoint)
+
+
+def _load_incremental(csv_path, cache_file, cached):
+    """load_call_data(incremental=True): check the checkpoint, then parse only what was appended
+
+    The cache it writes is keyed on size and mtime alone (no content hash), so a
+    later non-incremental load re-parses the export once to re-key it.
+    """
+    fingerprint = _stat_fingerprint(csv_path)
+    if cached:
+        data, checkpoint = cached[0], cached[1]['checkpoint']
+        stored = cached[1]['fingerprint']
+        if all(stored.get(key) == value for key, value in fingerprint.items()):
+            with open(csv_path, 'rb') as f:
+                if _checkpointed_line(f, checkpoint) is not None:
+                    return _with_tail(data, checkpoint)
+        resumed = _resume_export(csv_path, data, checkpoint)
+    else:
+        resumed = None
+    data, checkpoint = resumed or _parse_export(csv_path)
+    _write_cache(cache_file, fingerprint, data, checkpoint)
+    return _with_tail(data, checkpoint)
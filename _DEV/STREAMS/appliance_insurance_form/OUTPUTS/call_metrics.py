@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Vectorised call metrics shared by the call reports
+Idle gaps between consecutive calls and an agent x date x hour metrics cube,
+computed for every agent at once
+"""
+
+import numpy as np
+
+# Ring time added to every call before the idle gap that follows it starts
+RING_SECONDS = 10
+
+# Ratings from best to worst (the CSS class is the lower-cased label)
+PERFORMANCE = ('Excellent', 'Good', 'Average', 'Poor')
+
+
+def _run_starts(keys):
+    """Start index of every run of equal values in a sorted key array"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+class IdleGaps:
+    """Idle periods between consecutive calls of each agent
+
+    A gap runs from the end of a call plus the ring time to the start of the
+    agent's next call. Only positive gaps between calls on the same day count.
+    Each period is attributed to the day and hour of the call before it, and
+    `within_hour` flags periods whose next call starts in that same hour.
+
+    Periods are held as parallel arrays sorted by (extension, start time):
+    extension, day (days since 1970-01-01), hour, seconds, within_hour.
+    """
+
+    def __init__(self, data, ring_seconds=RING_SECONDS):
+        # lexsort is stable, so calls at the same second keep file order
+        order = np.lexsort((data.epoch, data.extension))
+        ext = data.extension[order]
+        day = data.day[order]
+        hour = data.hour[order]
+        start = data.epoch[order]
+        end = start + data.duration[order] + ring_seconds
+
+        idle = start[1:] - end[:-1]
+        same_day = (ext[1:] == ext[:-1]) & (day[1:] == day[:-1]) & (day[:-1] >= 0)
+        keep = same_day & (idle > 0)
+
+        self.extension = ext[:-1][keep]
+        self.day = day[:-1][keep]
+        self.hour = hour[:-1][keep]
+        self.seconds = idle[keep]
+        self.within_hour = (hour[1:] == hour[:-1])[keep]
+
+    def seconds_for(self, ext, within_hour=False):
+        """Idle period lengths for one agent, in call order"""
+        mask = self.extension == int(ext)
+        if within_hour:
+            mask &= self.within_hour
+        return self.seconds[mask]
+
+
+class MetricsCube:
+    """Dense agent x date x hour-of-day call totals, built once per dataset
+
+    Axes: `extensions` (sorted), `days` (days since 1970-01-01 with a timed call)
+    and the 24 hours of the day. Cell measures, shape (agents, days, 24):
+        calls, answered, talk                   calls starting in the hour
+        idle, idle_count, idle_max              same-day idle periods after calls in the hour
+        hour_idle, hour_idle_count, hour_idle_max
+                                                those whose next call starts in the same hour
+    Day planes, shape (agents, days): first_start and last_end (epoch seconds;
+    last_end is the end of the first call at the day's last start time) and
+    day_of_week (code of the agent's first call that day, -1 if none).
+    Calls without a time cannot be placed on the date axis; they are kept in
+    untimed_calls, untimed_answered and untimed_talk, shape (agents, day-of-week codes).
+    Margins from one column alone, so a bad Date doesn't lose a call its hour
+    (or a bad Time its date): clock_calls and clock_talk, shape (agents, 24), by
+    the Time column's hour; date_calls and date_talk, shape (agents, date codes),
+    by the raw Date string; weekday_calls and weekday_talk, shape (agents,
+    day-of-week codes), by the Day Of Week column.
+    Every report table is a slice or reduction of these arrays.
+    """
+
+    def __init__(self, data, ring_seconds=RING_SECONDS):
+        self.categories = data.categories
+        self.extensions, first, agent = np.unique(data.extension, return_index=True,
+                                                  return_inverse=True)
+        # Agent indices in order of first appearance in the export
+        self.first_seen = np.argsort(first, kind='stable')
+
+        timed = data.has_time
+        self.days, day = np.unique(data.day[timed], return_inverse=True)
+        shape = (len(self.extensions), len(self.days), 24)
+        agent_t = agent[timed]
+        cells = np.ravel_multi_index((agent_t, day, data.hour[timed]), shape)
+        answered = data.answered
+        self.calls = _cell_sum(cells, None, shape)
+        self.answered = _cell_sum(cells, answered[timed], shape)
+        self.talk = _cell_sum(cells, data.duration[timed], shape)
+
+        # Idle periods are sorted by (extension, day, hour), so their cells are too
+        self.idle_gaps = IdleGaps(data, ring_seconds)
+        gaps = self.idle_gaps
+        gap_cells = np.ravel_multi_index((np.searchsorted(self.extensions, gaps.extension),
+                                          np.searchsorted(self.days, gaps.day),
+                                          gaps.hour), shape)
+        self.idle = _cell_sum(gap_cells, gaps.seconds, shape)
+        self.idle_count = _cell_sum(gap_cells, None, shape)
+        self.idle_max = _cell_max(gap_cells, gaps.seconds, shape)
+        hour_cells = gap_cells[gaps.within_hour]
+        hour_seconds = gaps.seconds[gaps.within_hour]
+        self.hour_idle = _cell_sum(hour_cells, hour_seconds, shape)
+        self.hour_idle_count = _cell_sum(hour_cells, None, shape)
+        self.hour_idle_max = _cell_max(hour_cells, hour_seconds, shape)
+
+        # Day planes from the calls sorted by agent, day and start (stable for ties)
+        epoch = data.epoch[timed]
+        duration = data.duration[timed].astype(np.int64)
+        day_of_week = data.day_of_week[timed]
+        order = np.lexsort((epoch, day, agent_t))
+        agent_day = (agent_t * len(self.days) + day)[order]
+        epoch = epoch[order]
+        starts = _run_starts(agent_day)
+        ends = np.append(starts[1:], len(epoch))[:len(starts)]
+        new_time = np.ones(len(epoch), dtype=bool)
+        new_time[1:] = epoch[1:] != epoch[:-1]
+        new_time[starts] = True
+        tie_first = np.maximum.accumulate(np.where(new_time, np.arange(len(epoch)), 0))
+        last = tie_first[ends - 1]
+
+        self.first_start = np.zeros(shape[:2], dtype=np.int64)
+        self.last_end = np.zeros(shape[:2], dtype=np.int64)
+        self.day_of_week = np.full(shape[:2], -1, dtype=np.int64)
+        self.first_start.flat[agent_day[starts]] = epoch[starts]
+        self.last_end.flat[agent_day[starts]] = epoch[last] + duration[order][last]
+        self.day_of_week.flat[agent_day[starts]] = day_of_week[order][starts]
+
+        untimed = ~timed
+        untimed_shape = (len(self.extensions), len(data.categories['day_of_week']))
+        untimed_cells = np.ravel_multi_index((agent[untimed], data.day_of_week[untimed]),
+                                             untimed_shape)
+        self.untimed_calls = _cell_sum(untimed_cells, None, untimed_shape)
+        self.untimed_answered = _cell_sum(untimed_cells, answered[untimed], untimed_shape)
+        self.untimed_talk = _cell_sum(untimed_cells, data.duration[untimed], untimed_shape)
+
+        has_hour = data.clock_hour >= 0
+        clock_shape = (len(self.extensions), 24)
+        clock_cells = np.ravel_multi_index((agent[has_hour], data.clock_hour[has_hour]), clock_shape)
+        self.clock_calls = _cell_sum(clock_cells, None, clock_shape)
+        self.clock_talk = _cell_sum(clock_cells, data.duration[has_hour], clock_shape)
+        date_shape = (len(self.extensions), len(data.categories['date']))
+        date_cells = np.ravel_multi_index((agent, data.date), date_shape)
+        self.date_calls = _cell_sum(date_cells, None, date_shape)
+        self.date_talk = _cell_sum(date_cells, data.duration, date_shape)
+        weekday_cells = np.ravel_multi_index((agent, data.day_of_week), untimed_shape)
+        self.weekday_calls = _cell_sum(weekday_cells, None, untimed_shape)
+        self.weekday_talk = _cell_sum(weekday_cells, data.duration, untimed_shape)
+
+    def agent(self, ext):
+        """Index of an extension on the agent axis (None if it made no calls)"""
+        i = int(np.searchsorted(self.extensions, int(ext)))
+        if i < len(self.extensions) and self.extensions[i] == int(ext):
+            return i
+        return None
+
+    def agent_totals(self):
+        """(extension, calls, talk seconds, answered) per agent, in order of first appearance"""
+        calls = self.calls.sum(axis=(1, 2)) + self.untimed_calls.sum(axis=1)
+        talk = self.talk.sum(axis=(1, 2)) + self.untimed_talk.sum(axis=1)
+        answered = self.answered.sum(axis=(1, 2)) + self.untimed_answered.sum(axis=1)
+        return [(int(self.extensions[a]), int(calls[a]), int(talk[a]), int(answered[a]))
+                for a in self.first_seen]
+
+    def hour_cells(self, hours=range(24)):
+        """Per (extension, day, hour) rows for every cell with calls, as parallel arrays
+
+        Idle columns count only periods whose next call starts in the same hour.
+        """
+        hour_mask = np.zeros(24, dtype=bool)
+        hour_mask[list(hours)] = True
+        a, d, h = np.nonzero((self.calls > 0) & hour_mask)
+        rows = {'extension': self.extensions[a], 'day': self.days[d], 'hour': h}
+        rows.update(_cell_rows(self.calls[a, d, h], self.answered[a, d, h], self.talk[a, d, h],
+                               self.hour_idle[a, d, h], self.hour_idle_count[a, d, h],
+                               self.hour_idle_max[a, d, h]))
+        rows['day_of_week'] = self.day_of_week[a, d]
+        return rows
+
+    def day_cells(self):
+        """Per (extension, day) rows for every day an agent made timed calls, as parallel arrays"""
+        calls = self.calls.sum(axis=2)
+        a, d = np.nonzero(calls)
+        rows = {'extension': self.extensions[a], 'day': self.days[d]}
+        rows.update(_cell_rows(calls[a, d], self.answered.sum(axis=2)[a, d],
+                               self.talk.sum(axis=2)[a, d], self.idle.sum(axis=2)[a, d],
+                               self.idle_count.sum(axis=2)[a, d],
+                               self.idle_max.max(axis=2)[a, d]))
+        rows['day_of_week'] = self.day_of_week[a, d]
+        rows['first_start'] = self.first_start[a, d]
+        rows['last_end'] = self.last_end[a, d]
+        return rows
+
+
+def _cell_sum(cells, weights, shape):
+    """Sum weights (or count rows) per flat cell index into a dense int64 array"""
+    size = int(np.prod(shape))
+    totals = np.bincount(cells, weights=weights, minlength=size)
+    return totals.astype(np.int64).reshape(shape)
+
+
+def _cell_max(cells, values, shape):
+    """Largest value per flat cell index (cells sorted), 0 where a cell has none"""
+    peaks = np.zeros(shape, dtype=np.int64)
+    starts = _run_starts(cells)
+    if len(starts):
+        peaks.flat[cells[starts]] = np.maximum.reduceat(values, starts)
+    return peaks
+
+
+def _cell_rows(calls, answered, talk, idle, idle_count, idle_max):
+    """Report columns shared by hourly and daily rows"""
+    gaps = np.maximum(idle_count, 1)
+    return {
+        'total_calls': calls,
+        'answered': answered,
+        'unanswered': calls - answered,
+        'answer_rate': answered / calls * 100,
+        'total_duration': talk,
+        'avg_duration': talk / calls,
+        'total_idle': idle,
+        'avg_idle': np.where(idle_count > 0, idle / gaps, 0),
+        'max_idle': idle_max,
+        'idle_count': idle_count
+    }
+
+
+def _rate(conditions):
+    return np.select(conditions, PERFORMANCE[:-1], PERFORMANCE[-1])
+
+
+def rate_hours(total_calls, avg_idle):
+    """Rating per hour from calls taken and the average idle gap"""
+    return _rate([(total_calls >= 10) & (avg_idle < 300),
+                  (total_calls >= 7) & (avg_idle < 600),
+                  total_calls >= 4])
+
+
+def rate_days(calls_per_hour, productive_pct):
+    """Rating per day from calls per working hour and productive percentage"""
+    return _rate([(calls_per_hour >= 8) & (productive_pct >= 30),
+                  (calls_per_hour >= 6) & (productive_pct >= 20),
+                  calls_per_hour >= 4])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Cross-sheet customer deduplication for the DDS merge
+Each row yields hash keys from its normalized bank details, phone number,
+name and postcode; rows sharing any key are joined with union-find, so the
+whole catalogue clusters in one pass over the keys (near-linear time) and
+every row gets a canonical customer ID
+"""
+
+import hashlib
+
+from match_tiers import bank_key, digits
+from name_table import normalize_name, split_name
+
+
+def normalize_phone(phone):
+    """UK number as 11 digits starting 0 (from 07..., 7... or 447...), or None"""
+    number = digits(phone)
+    if number.startswith('44') and len(number) == 12:
+        number = '0' + number[2:]
+    elif len(number) == 10 and not number.startswith('0'):
+        number = '0' + number
+    return number if len(number) == 11 and number.startswith('0') else None
+
+
+def customer_keys(phone, name, postcode, sort_code, account_number):
+    """Keys that identify a customer across sheets
+
+    The same bank account is the same payer; a phone number or postcode is
+    only a match together with the first and last name, since households share
+    them (Mr and Mrs Smith on one landline stay two customers).
+    """
+    keys = []
+    bank = bank_key(sort_code, account_number)
+    if bank:
+        keys.append('bank:' + ':'.join(bank))
+    full = normalize_name(name)
+    first, last = split_name(full)
+    number = normalize_phone(phone)
+    if number and first:
+        keys.append(f'phone:{number}:{first}:{last}')
+    postcode = ''.join((postcode or '').split()).upper()
+    if postcode and full:
+        keys.append(f'name:{full}:{postcode}')
+    return keys
+
+
+class CustomerClusters:
+    """Union-find over rows, joined through the keys they share"""
+
+    def __init__(self):
+        self.parent = []
+        self.size = []
+        self.owner = {}  # key -> first row that had it
+        self.keys = []   # smallest key of each row (for a stable ID)
+
+    def _find(self, row):
+        root = row
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[row] != root:
+            self.parent[row], row = root, self.parent[row]
+        return root
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def add(self, keys, fallback):
+        """Add a row with its keys; a row without any is identified by fallback
+        (e.g. its full contents), so only exact copies of it join it"""
+        row = len(self.parent)
+        self.parent.append(row)
+        self.size.append(1)
+        keys = keys or ['row:' + fallback]
+        self.keys.append(min(keys))
+        for key in keys:
+            other = self.owner.setdefault(key, row)
+            if other != row:
+                self._union(row, other)
+        return row
+
+    def ids(self):
+        """Canonical customer ID per row, in the order rows were added
+
+        The ID hashes the smallest key in the cluster, so it doesn't depend
+        on sheet or row order.
+        """
+        smallest = {}
+        roots = [self._find(row) for row in range(len(self.parent))]
+        for root, key in zip(roots, self.keys):
+            if root not in smallest or key < smallest[root]:
+                smallest[root] = key
+        ids = {root: 'C' + hashlib.blake2b(key.encode('utf-8'), digest_size=5).hexdigest().upper()
+               for root, key in smallest.items()}
+        return [ids[root] for root in roots]
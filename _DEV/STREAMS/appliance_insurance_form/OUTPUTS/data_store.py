@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Local SQLite store for the call and DDS data
+Call exports, the transactions export and matched DDS customers are bulk-loaded
+into one database (.data_store/data.sqlite) with indexes on the lookups the
+reports and the matcher make - calls by (extension, time), customers and
+transactions by name key, DD Reference and postcode - so a report can pull
+just the rows it needs and have SQL do the grouping, and ad-hoc questions
+("Ext 1002 last Tuesday") don't need a re-parse of the CSVs
+
+    python3 data_store.py load
+    python3 data_store.py calls --ext 1002 --day tuesday
+    python3 data_store.py sql "SELECT ..."
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from call_data import CATEGORY_COLUMNS, EPOCH, NO_TIME, CallData, file_fingerprint, load_call_data
+from money import parse_pence
+from name_table import NameTable
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data_store', 'data.sqlite')
+
+# Bump when the schema changes; an older database is rebuilt
+SCHEMA_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    fingerprint TEXT,
+    columns TEXT,               -- a CSV source's header, as a JSON list
+    loaded INTEGER NOT NULL     -- load sequence number: the highest was loaded (or found current) last
+);
+
+-- Calls keep CallData's category codes; call_labels decodes them per source
+CREATE TABLE IF NOT EXISTS calls (
+    source INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    extension INTEGER NOT NULL,
+    epoch INTEGER,              -- wall-clock seconds since 1970-01-01, NULL if the time didn't parse
+    duration INTEGER NOT NULL,
+    clock_hour INTEGER NOT NULL,    -- hour of the Time column alone, -1 if it has none
+    call_type INTEGER NOT NULL,
+    call_result INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    date INTEGER NOT NULL,          -- code of the raw Date string
+    PRIMARY KEY (source, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS calls_by_extension ON calls (source, extension, epoch);
+
+CREATE TABLE IF NOT EXISTS call_labels (
+    source INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (source, name, code)
+) WITHOUT ROWID;
+
+CREATE VIEW IF NOT EXISTS call_log AS
+SELECT c.source, c.row, c.extension, datetime(c.epoch, 'unixepoch') AS started, c.epoch, c.duration,
+       t.label AS call_type, r.label AS call_result, d.label AS day_of_week, g.label AS date
+FROM calls c
+JOIN call_labels t ON t.source = c.source AND t.name = 'call_type' AND t.code = c.call_type
+JOIN call_labels r ON r.source = c.source AND r.name = 'call_result' AND r.code = c.call_result
+JOIN call_labels d ON d.source = c.source AND d.name = 'day_of_week' AND d.code = c.day_of_week
+JOIN call_labels g ON g.source = c.source AND g.name = 'date' AND g.code = c.date;
+
+-- name_key is the normalized full name, last_name its last word (as the matcher sees them);
+-- amounts are whole pence; data holds the full CSV row as JSON
+CREATE TABLE IF NOT EXISTS transactions (
+    source INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    account_name TEXT,
+    name_key TEXT,
+    last_name TEXT,
+    dd_reference TEXT,
+    amount INTEGER,
+    collection_date TEXT,
+    bacs_code TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transactions_by_reference ON transactions (dd_reference);
+CREATE INDEX IF NOT EXISTS transactions_by_name ON transactions (name_key);
+CREATE INDEX IF NOT EXISTS transactions_by_last_name ON transactions (last_name);
+
+CREATE TABLE IF NOT EXISTS customers (
+    source INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    name TEXT,
+    name_key TEXT,
+    last_name TEXT,
+    postcode TEXT,              -- upper case, no spaces
+    customer_id TEXT,
+    dd_reference TEXT,          -- Matched DD Reference, if matched
+    amount INTEGER,             -- Total Cost
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS customers_by_name ON customers (name_key);
+CREATE INDEX IF NOT EXISTS customers_by_last_name ON customers (last_name);
+CREATE INDEX IF NOT EXISTS customers_by_postcode ON customers (postcode);
+CREATE INDEX IF NOT EXISTS customers_by_reference ON customers (dd_reference);
+CREATE INDEX IF NOT EXISTS customers_by_id ON customers (customer_id);
+"""
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def connect(db_file=DB_FILE):
+    """Open (creating if needed) the store; an older schema is dropped and rebuilt"""
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    # Bulk loads: one writer, and a crash only loses the load in progress
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        tables = conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view') "
+                              "AND name NOT LIKE 'sqlite_%'").fetchall()
+        for kind, name in tables:
+            conn.execute(f'DROP {kind.upper()} IF EXISTS {name}')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _source(conn, kind, path, fingerprint):
+    """(source id, current): current when path was already loaded with this fingerprint.
+    Otherwise the source's old rows are cleared, ready for a reload. Either way the
+    source becomes the last loaded"""
+    fingerprint = json.dumps(fingerprint, sort_keys=True) if fingerprint is not None else None
+    loaded = conn.execute('SELECT COALESCE(MAX(loaded), 0) + 1 FROM sources').fetchone()[0]
+    found = conn.execute('SELECT id, fingerprint FROM sources WHERE path = ?', (path,)).fetchone()
+    if found and fingerprint is not None and found[1] == fingerprint:
+        conn.execute('UPDATE sources SET loaded = ? WHERE id = ?', (loaded, found[0]))
+        return found[0], True
+    if found:
+        source = found[0]
+        for table in ('calls', 'call_labels', 'transactions', 'customers'):
+            conn.execute(f'DELETE FROM {table} WHERE source = ?', (source,))
+        conn.execute('UPDATE sources SET kind = ?, fingerprint = ?, loaded = ? WHERE id = ?',
+                     (kind, fingerprint, loaded, source))
+    else:
+        source = conn.execute('INSERT INTO sources (kind, path, fingerprint, loaded) VALUES (?, ?, ?, ?)',
+                              (kind, path, fingerprint, loaded)).lastrowid
+    return source, False
+
+
+def source_id(conn, path):
+    """Id of a loaded source (a file's absolute path, or a name for in-memory tables), or None"""
+    found = conn.execute('SELECT id FROM sources WHERE path = ?', (path,)).fetchone()
+    return found[0] if found else None
+
+
+def load_calls(conn, csv_path):
+    """Load a call-data export (parsed by the shared loader) unless it is already loaded
+    unchanged; returns its source id"""
+    path = os.path.abspath(csv_path)
+    with conn:
+        fingerprint = file_fingerprint(csv_path)
+        source, current = _source(conn, 'calls', path, fingerprint)
+        if current:
+            return source
+        # Hand over the fingerprint so the loader doesn't hash the file a second time
+        data = load_call_data(csv_path, fingerprint=fingerprint)
+        epoch = data.epoch.astype(object)
+        epoch[data.epoch == NO_TIME] = None
+        conn.executemany('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         zip([source] * len(data), range(len(data)), data.extension.tolist(), epoch.tolist(),
+                             data.duration.tolist(), data.clock_hour.tolist(), data.call_type.tolist(),
+                             data.call_result.tolist(), data.day_of_week.tolist(), data.date.tolist()))
+        conn.executemany('INSERT INTO call_labels VALUES (?, ?, ?, ?)',
+                         [(source, name, code, label) for name in CATEGORY_COLUMNS
+                          for code, label in enumerate(data.categories[name])])
+    return source
+
+
+def select_calls(conn, source, extensions=None, start=None, end=None):
+    """CallData of a loaded export's calls, filtered in SQL: only the given extensions,
+    and only calls starting in [start, end) (epoch seconds) if either is given
+
+    Rows keep their file order and the export's category codes, so reports
+    built on the result match those built on load_call_data.
+    """
+    query = ['SELECT extension, COALESCE(epoch, ?), duration, clock_hour, call_type, call_result, day_of_week, '
+             'date FROM calls WHERE source = ?']
+    params = [NO_TIME, source]
+    if extensions is not None:
+        extensions = [int(ext) for ext in extensions]
+        query.append(f"AND extension IN ({', '.join('?' * len(extensions))})")
+        params.extend(extensions)
+    if start is not None:
+        query.append('AND epoch >= ?')
+        params.append(start)
+    if end is not None:
+        query.append('AND epoch < ?')
+        params.append(end)
+    query.append('ORDER BY row')
+    width = 4 + len(CATEGORY_COLUMNS)
+    columns = np.array(conn.execute(' '.join(query), params).fetchall(), dtype=np.int64).reshape(-1, width).T
+
+    categories = {name: [] for name in CATEGORY_COLUMNS}
+    for name, label in conn.execute('SELECT name, label FROM call_labels WHERE source = ? ORDER BY name, code',
+                                    (source,)):
+        categories[name].append(label)
+    codes = {name: columns[4 + i].astype(np.int16) for i, name in enumerate(CATEGORY_COLUMNS)}
+    return CallData(columns[0].astype(np.int16), columns[1], columns[2].astype(np.int32),
+                    columns[3].astype(np.int8), codes, categories)
+
+
+def agent_totals(conn, source):
+    """(extension, calls, talk seconds, answered) per agent, grouped in SQL, in order of first
+    appearance (as CallData.agent_totals)"""
+    return conn.execute("""
+        SELECT c.extension, COUNT(*), SUM(c.duration), SUM(l.label IS NOT NULL)
+        FROM calls c
+        LEFT JOIN call_labels l ON l.source = c.source AND l.name = 'call_result'
+                               AND l.code = c.call_result AND l.label = 'Answered'
+        WHERE c.source = ?
+        GROUP BY c.extension
+        ORDER BY MIN(c.row)
+    """, (source,)).fetchall()
+
+
+def load_transactions(conn, csv_path):
+    """Load the transactions export unless it is already loaded unchanged; returns its source id"""
+    path = os.path.abspath(csv_path)
+    with conn:
+        source, current = _source(conn, 'transactions', path, file_fingerprint(csv_path))
+        if current:
+            return source
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            rows = list(reader)
+        conn.execute('UPDATE sources SET columns = ? WHERE id = ?', (json.dumps(reader.fieldnames), source))
+        names = NameTable(row.get('Account Name', '') for row in rows)
+        amounts = parse_pence(row.get('Amount', '0') for row in rows).tolist()
+        conn.executemany('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         ((source, i, row.get('Account Name', ''), names.full[i], names.last[i],
+                           (row.get('DD Reference') or '').strip(), amounts[i], row.get('Collection Date', ''),
+                           (row.get('Bacs Code') or '').strip().upper(), json.dumps(row))
+                          for i, row in enumerate(rows)))
+    return source
+
+
+def select_transactions(conn, source, exclude_bacs=('0N',)):
+    """(transactions, fieldnames, excluded count) of a loaded export in file order, rows with
+    the given Bacs Codes filtered out in SQL"""
+    fieldnames = json.loads(conn.execute('SELECT columns FROM sources WHERE id = ?', (source,)).fetchone()[0])
+    marks = ', '.join('?' * len(exclude_bacs))
+    rows = [json.loads(data) for data, in conn.execute(
+        f'SELECT data FROM transactions WHERE source = ? AND bacs_code NOT IN ({marks}) ORDER BY row',
+        (source, *exclude_bacs))]
+    excluded = conn.execute(f'SELECT COUNT(*) FROM transactions WHERE source = ? AND bacs_code IN ({marks})',
+                            (source, *exclude_bacs)).fetchone()[0]
+    return rows, fieldnames, excluded
+
+
+def store_customers(conn, name, rows):
+    """Replace the customer table named name (e.g. 'DDS_MATCHED') with rows (dicts)"""
+    with conn:
+        source, _ = _source(conn, 'customers', name, None)
+        names = NameTable(row.get('Name', '') for row in rows)
+        amounts = parse_pence(row.get('Total Cost', '0') for row in rows).tolist()
+        conn.executemany('INSERT INTO customers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         ((source, i, row.get('Name', ''), names.full[i], names.last[i],
+                           ''.join((row.get('Postcode') or '').split()).upper(),
+                           row.get('Customer ID', ''), (row.get('Matched DD Reference') or '').strip(),
+                           amounts[i], json.dumps(row))
+                          for i, row in enumerate(rows)))
+    return source
+
+
+def day_range(day, latest):
+    """[start, end) epoch seconds of a day given as YYYY-MM-DD, 'today', 'yesterday' or a weekday
+    name (the last such day on or before latest, the newest call's epoch)"""
+    latest_day = latest // 86400
+    day = day.strip().lower()
+    if day in DAY_NAMES:
+        # 1970-01-01 was a Thursday
+        back = ((latest_day + 3) % 7 - DAY_NAMES.index(day)) % 7
+        start_day = latest_day - back
+    elif day in ('today', 'yesterday'):
+        start_day = latest_day - (day == 'yesterday')
+    else:
+        start_day = (np.datetime64(day, 'D') - np.datetime64('1970-01-01', 'D')).astype(int)
+    return int(start_day) * 86400, int(start_day + 1) * 86400
+
+
+def main():
+    downloads_dir = os.path.expanduser('~/Downloads')
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Load call and DDS data into the local SQLite store and query it')
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('load', help='load (or refresh) the call exports, transactions and matched customers')
+    load.add_argument('files', nargs='*', help="call-data exports (default: the ones the reports read)")
+    calls = commands.add_parser('calls', help="one agent's calls, e.g. --ext 1002 --day tuesday")
+    calls.add_argument('--ext', type=int, required=True)
+    calls.add_argument('--day', help="YYYY-MM-DD, today, yesterday or a weekday (the last one in the export)")
+    calls.add_argument('--export', help='call-data export to query (default: the last one loaded)')
+    sql = commands.add_parser('sql', help='run a query and print the rows')
+    sql.add_argument('query')
+    args = parser.parse_args()
+
+    conn = connect()
+    started = time.perf_counter()
+
+    if args.command == 'load':
+        exports = args.files or [os.path.join(downloads_dir, 'Untitled spreadsheet - call-data (1) (2).csv'),
+                                 os.path.join(downloads_dir, 'call-data (1).csv')]
+        for path in exports:
+            if os.path.exists(path):
+                source = load_calls(conn, path)
+                count = conn.execute('SELECT COUNT(*) FROM calls WHERE source = ?', (source,)).fetchone()[0]
+                print(f"📞 {os.path.basename(path)}: {count} calls")
+        transactions_file = os.path.join(downloads_dir, 'DEBIT DIRECT TRANSACTIONS - Transactions (1) (1).csv')
+        if os.path.exists(transactions_file):
+            source = load_transactions(conn, transactions_file)
+            count = conn.execute('SELECT COUNT(*) FROM transactions WHERE source = ?', (source,)).fetchone()[0]
+            print(f"💳 {os.path.basename(transactions_file)}: {count} transactions")
+        matched_file = os.path.join(output_dir, 'DDS_MATCHED.csv')
+        if os.path.exists(matched_file):
+            with open(matched_file, 'r', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            store_customers(conn, 'DDS_MATCHED', rows)
+            print(f"👥 DDS_MATCHED.csv: {len(rows)} customers")
+        print(f"\n✅ Loaded in {time.perf_counter() - started:.2f} s → {DB_FILE}")
+
+    elif args.command == 'calls':
+        if args.export:
+            source = source_id(conn, os.path.abspath(args.export))
+        else:
+            found = conn.execute("SELECT id FROM sources WHERE kind = 'calls' ORDER BY loaded DESC LIMIT 1").fetchone()
+            source = found[0] if found else None
+        if source is None:
+            parser.error('no call export loaded - run: data_store.py load')
+        start = end = None
+        if args.day:
+            latest = conn.execute('SELECT MAX(epoch) FROM calls WHERE source = ?', (source,)).fetchone()[0] or 0
+            start, end = day_range(args.day, latest)
+        data = select_calls(conn, source, [args.ext], start, end)
+        elapsed = time.perf_counter() - started
+
+        when = f" on {(EPOCH + timedelta(seconds=start)).strftime('%a %d %b %Y')}" if start is not None else ''
+        print(f"📞 Ext {args.ext}{when}: {len(data)} calls, {int(data.duration.sum())} s talk, "
+              f"{int(data.answered.sum())} answered ({elapsed * 1000:.1f} ms)\n")
+        results = data.labels('call_result')
+        types = data.labels('call_type')
+        for i in range(len(data)):
+            started_at = ((EPOCH + timedelta(seconds=int(data.epoch[i]))).strftime('%d %b %Y %H:%M:%S')
+                          if data.epoch[i] != NO_TIME else '(no time)')
+            print(f"   {started_at}  {int(data.duration[i]):>6d} s  {results[i]:<12} {types[i]}")
+
+    else:
+        cursor = conn.execute(args.query)
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        if cursor.description:
+            print('\t'.join(column[0] for column in cursor.description))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value) for value in row))
+        print(f"\n({len(rows)} rows, {elapsed * 1000:.1f} ms)")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+End-to-end DDS run: merge -> match -> group in one command
+Each stage hands its table to the next in memory instead of writing and
+re-parsing DDS_COMBINED.csv / DDS_MATCHED.csv (written only with
+--write-intermediate); money columns travel alongside the text already parsed
+to pence. Stage outputs are cached in .dds_pipeline/ under a hash of the
+stage's inputs (source files, upstream stage, options, the match store and the
+scripts' code), so a stage whose inputs haven't changed is skipped
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import data_store
+from group_by_customer import group_records, print_summary, write_grouped
+from match_store import write_store
+from match_transactions import (STORE_FILE, TRANSACTIONS_EXPORT, add_match_arguments, check_match_arguments,
+                                load_transactions, match_customers, print_match_summary)
+from merge_dds_files import merge_table, sheet_files
+from money import parse_pence
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SCRIPT_DIR, '.dds_pipeline')
+# Digests of the match store as the match stage last read it and as it then wrote it
+STORE_MARK = os.path.join(CACHE_DIR, 'match-store.json')
+# Bump when the cached layout changes so old cache files are ignored
+CACHE_VERSION = 2
+
+# Stages in order, each fed the table of the one before it
+STAGES = ['merge', 'match', 'group']
+
+# Matching options that change the matches (--workers doesn't)
+MATCH_SETTINGS = ['scorer', 'assignment', 'fuzzy_only', 'candidates', 'ngram', 'brute_force']
+
+# A stage's output: column names, rows (dicts keyed by column) and the money
+# columns parsed so far ({column: per-row amounts in pence})
+Table = namedtuple('Table', ['fieldnames', 'rows', 'pence'])
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, or None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def code_digest():
+    """Hash of the scripts next to this one, so a code change invalidates every stage"""
+    sha = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SCRIPT_DIR, '*.py'))):
+        sha.update(os.path.basename(path).encode('utf-8'))
+        sha.update(file_digest(path).encode('ascii'))
+    return sha.hexdigest()
+
+
+def store_digest():
+    """Digest of the match store for the match stage's key: what the stage last read
+    while the store still holds just what it then wrote, so the stage's own write
+    doesn't invalidate it, else the store's current content"""
+    digest = file_digest(STORE_FILE)
+    try:
+        with open(STORE_MARK, 'r', encoding='utf-8') as f:
+            mark = json.load(f)
+    except (OSError, ValueError):
+        return digest
+    return mark['read'] if mark.get('written') == digest else digest
+
+
+def mark_store(read_digest):
+    """Record the store the match stage was keyed on and the one it has just written"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(STORE_MARK, 'w', encoding='utf-8') as f:
+        json.dump({'read': read_digest, 'written': file_digest(STORE_FILE)}, f)
+
+
+def stage_key(*parts):
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:24]
+
+
+def _cache_file(stage, key):
+    return os.path.join(CACHE_DIR, f'{stage}-{key}.json')
+
+
+def read_cached(stage, key):
+    """(Table, info) cached for a stage under key, else None"""
+    try:
+        with open(_cache_file(stage, key), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['version'] != CACHE_VERSION:
+            return None
+        fieldnames = cached['fieldnames']
+        return (Table(fieldnames, [dict(zip(fieldnames, row)) for row in cached['rows']], cached['pence']),
+                cached['info'])
+    except (OSError, ValueError, KeyError):
+        # Missing or unreadable - run the stage
+        return None
+
+
+def write_cached(stage, key, table, info):
+    """Cache a stage's output atomically, replacing what it cached for older inputs"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_file = _cache_file(stage, key)
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'info': info, 'fieldnames': table.fieldnames,
+                   'rows': [[row.get(name, '') for name in table.fieldnames] for row in table.rows],
+                   'pence': table.pence}, f)
+    os.replace(tmp_file, cache_file)
+    for old_file in glob.glob(os.path.join(CACHE_DIR, f'{stage}-*.json')):
+        if old_file != cache_file:
+            os.remove(old_file)
+
+
+def write_table(output_file, table):
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=table.fieldnames)
+        writer.writeheader()
+        writer.writerows(table.rows)
+    print(f"📄 Wrote {output_file}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge the DDS NEED sheets, match them to the transactions '
+                                                 'and group the matches by customer, in one run')
+    parser.add_argument('--glob', metavar='PATTERN',
+                        help="merge every CSV matching PATTERN instead of the usual three sheets "
+                             "(as merge_dds_files.py --glob)")
+    parser.add_argument('--write-intermediate', action='store_true',
+                        help='also write DDS_COMBINED.csv and DDS_MATCHED.csv')
+    parser.add_argument('--rerun', action='store_true',
+                        help='run every stage even if its inputs are unchanged (e.g. after editing '
+                             '.dds_sources/registry.json)')
+    add_match_arguments(parser)
+    args = parser.parse_args()
+    check_match_arguments(parser, args)
+
+    files = sheet_files(args.glob)
+    transactions_file = os.path.join(os.path.expanduser('~/Downloads'), TRANSACTIONS_EXPORT)
+
+    # Keys chain through the stages, so each is known before anything runs
+    code = code_digest()
+    keys = {'merge': stage_key(CACHE_VERSION, 'merge', code, [(path, file_digest(path)) for path in files])}
+    # Matching reads the store of earlier matches, so a changed store is a changed input
+    # (but not the store this stage writes itself)
+    read_store = store_digest()
+    keys['match'] = stage_key('match', keys['merge'], file_digest(transactions_file), read_store,
+                              {name: getattr(args, name) for name in MATCH_SETTINGS})
+    keys['group'] = stage_key('group', keys['match'])
+    # --rebuild rematches without the stored matches, which can change them for the same inputs
+    force = {'merge': args.rerun, 'match': args.rerun or args.rebuild, 'group': args.rerun or args.rebuild}
+
+    stages = {}
+    store = []
+
+    def table(stage):
+        """(Table, info) of a stage, the first time it's needed: from the cache if its inputs
+        are unchanged, else run on the previous stage's table and cached"""
+        if stage not in stages:
+            cached = None if force[stage] else read_cached(stage, keys[stage])
+            if cached:
+                print(f"⏭️  {stage}: inputs unchanged, reusing {len(cached[0].rows)} cached rows\n")
+            else:
+                position = STAGES.index(stage)
+                previous = table(STAGES[position - 1])[0] if position else None
+                print(f"▶️  {stage}\n")
+                cached = computes[stage](previous)
+                write_cached(stage, keys[stage], *cached)
+            stages[stage] = cached
+        return stages[stage]
+
+    def merge(_):
+        fieldnames, rows = merge_table(files)
+        print(f"✅ Combined {len(rows)} rows, "
+              f"{len(set(row[-1] for row in rows))} distinct customers after deduplication\n")
+        cost = fieldnames.index('Total Cost')
+        pence = {'Total Cost': parse_pence(row[cost] for row in rows).tolist()}
+        return Table(fieldnames, [dict(zip(fieldnames, row)) for row in rows], pence), {}
+
+    def match(merged):
+        transactions, transaction_fields = load_transactions(transactions_file, args.db)
+        # The matcher adds its columns to the merged rows in place
+        pence = dict(merged.pence)
+        fieldnames, tier_of, matched_count, state = match_customers(merged.rows, merged.fieldnames, transactions,
+                                                                    transaction_fields, args, STORE_FILE, pence)
+        store.append(state)
+        print_match_summary(merged.rows, transactions, matched_count, tier_of)
+        print()
+        return Table(fieldnames, merged.rows, pence), {}
+
+    def group(matched):
+        output_rows, unique, multiple, records_count, samples = group_records(matched.fieldnames, matched.rows,
+                                                                              matched.pence)
+        print(f"📊 Found {unique} unique customers")
+        print(f"📝 Total records: {records_count}\n")
+        return Table(matched.fieldnames, output_rows, {}), {'unique': unique, 'multiple': multiple, 'samples': samples}
+
+    computes = {'merge': merge, 'match': match, 'group': group}
+
+    print("🔄 Running the DDS pipeline: merge → match → group\n")
+
+    if args.write_intermediate:
+        write_table(os.path.join(SCRIPT_DIR, 'DDS_COMBINED.csv'), table('merge')[0])
+        write_table(os.path.join(SCRIPT_DIR, 'DDS_MATCHED.csv'), table('match')[0])
+    grouped, info = table('group')
+    # Matches carry forward to the next run only once they have been used
+    for state in store:
+        write_store(STORE_FILE, *state)
+        mark_store(read_store)
+    # Outside the cached stage, so a cached match still reaches the database
+    if args.db:
+        conn = data_store.connect()
+        data_store.store_customers(conn, 'DDS_MATCHED', table('match')[0].rows)
+        conn.close()
+
+    output_file = os.path.join(SCRIPT_DIR, 'DDS_GROUPED_BY_CUSTOMER.csv')
+    print(f"💾 Writing grouped data...\n")
+    write_grouped(output_file, grouped.fieldnames, grouped.rows)
+    print_summary(output_file, os.path.expanduser('~/Downloads'), info['unique'], info['multiple'],
+                  len(grouped.rows), info['samples'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Source registry for DDS NEED sheets
+Works out how a sheet's columns map onto the unified DDS columns: known
+sheets by name, anything else by fingerprinting its header row (or, for a
+headerless sheet, the kinds of value in its first rows) and inferring the
+mapping from header spellings and cell contents. Layouts are cached by
+fingerprint in .dds_sources/registry.json, so a sheet laid out like one seen
+before (known sheets included) skips detection; entries there can be edited
+by hand to correct a guess
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dds_sources', 'registry.json')
+# Bump when detection changes so cached guesses are redone
+REGISTRY_VERSION = 1
+
+# Rows read to fingerprint a headerless sheet and to infer column contents
+SAMPLE_ROWS = 50
+
+# Sheets with a fixed layout: name -> (has header row, mapping). Mapping keys are
+# header names, or column positions (ints) for data without a usable header
+KNOWN_SOURCES = {
+    'Active Swap': (True, {
+        0: 'Phone Numbers',  # First column is phone data
+        'Name': 'Name',
+        'Address': 'Address',
+        'Area': 'Area',
+        'Postcode': 'Postcode',
+        'Email': 'Email',
+        'Plan': 'Plan',
+        'TMP': 'Total Cost',
+        'Sort Code': 'Sort Code',
+        'Account number': 'Account number',
+        'First DD Date': 'DD Date',
+        'Notes': 'Notes'
+    }),
+    'Tuesday 11th': (False, {
+        # No headers, so map by position
+        0: 'Plan number',
+        1: 'Name',
+        2: 'Address',
+        3: 'Postcode',
+        4: 'Email',
+        5: 'Plan',
+        6: 'Total Cost',
+        7: 'Sort Code',
+        8: 'Account number',
+        9: 'DD Date',
+        10: 'Notes',
+        11: 'Agents'
+    }),
+    'Sales': (True, {
+        'Plan number': 'Plan number',
+        'Phone Numbers': 'Phone Numbers',
+        'Name': 'Name',
+        'Adress': 'Address',  # Fix spelling
+        'Postcode': 'Postcode',
+        'Email': 'Email',
+        'Plan': 'Plan',
+        'Total Cost': 'Total Cost',
+        'Sort Code': 'Sort Code',
+        'Account number': 'Account number',
+        'DD Date': 'DD Date',
+        'Notes - e.g. whats covered': 'Notes',
+        'Agents': 'Agents'
+    })
+}
+
+# Bank detail header spellings (as header_key gives them), shared with the exact-join tiers
+SORT_CODE_HEADERS = ('sortcode', 'banksortcode')
+ACCOUNT_NUMBER_HEADERS = ('accountnumber', 'accountno', 'bankaccountnumber')
+
+# Header spellings (lowercase, letters and digits only) -> unified column
+HEADER_ALIASES = {
+    'plannumber': 'Plan number', 'planno': 'Plan number', 'policynumber': 'Plan number',
+    'phonenumbers': 'Phone Numbers', 'phonenumber': 'Phone Numbers', 'phone': 'Phone Numbers',
+    'mobile': 'Phone Numbers', 'telephone': 'Phone Numbers',
+    'name': 'Name', 'customername': 'Name', 'fullname': 'Name',
+    'address': 'Address', 'adress': 'Address', 'addressline1': 'Address',
+    'area': 'Area', 'town': 'Area', 'city': 'Area',
+    'postcode': 'Postcode', 'postalcode': 'Postcode',
+    'email': 'Email', 'emailaddress': 'Email',
+    'plan': 'Plan', 'product': 'Plan',
+    'totalcost': 'Total Cost', 'tmp': 'Total Cost', 'cost': 'Total Cost', 'monthlypremium': 'Total Cost',
+    **dict.fromkeys(SORT_CODE_HEADERS, 'Sort Code'),
+    **dict.fromkeys(ACCOUNT_NUMBER_HEADERS, 'Account number'),
+    'dddate': 'DD Date', 'firstdddate': 'DD Date', 'ddstartdate': 'DD Date',
+    'notes': 'Notes', 'notesegwhatscovered': 'Notes',
+    'agents': 'Agents', 'agent': 'Agents'
+}
+
+# Cell patterns, tried in order; the first that matches is the cell's kind
+VALUE_KINDS = [
+    ('email', re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')),
+    ('postcode', re.compile(r'^[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}$', re.I)),
+    ('sort code', re.compile(r'^\d{2}-\d{2}-\d{2}$|^\d{6}$')),
+    # Spreadsheets drop the leading zero, so 7 digits too
+    ('account number', re.compile(r'^\d{7,8}$')),
+    # 07..., 7... or 447... (with or without + and spaces)
+    ('phone', re.compile(r'^(\+?44|0)?\s?[1-9][\d\s]{8,12}$')),
+    ('money', re.compile(r'^£?\s?\d{1,3}(,\d{3})*(\.\d{1,2})?$')),
+    ('date', re.compile(r'^\d{1,2}[/.-]\d{1,2}([/.-]\d{2,4})?$|^\d{1,2}(st|nd|rd|th)\b', re.I)),
+    # e.g. NDAC21790APP
+    ('plan number', re.compile(r'^[A-Z]{2,}\d{3,}[A-Z]*$', re.I)),
+    ('name', re.compile(r"^[A-Za-z][A-Za-z.'-]*(\s+[A-Za-z][A-Za-z.'-]*){1,3}$")),
+    ('address', re.compile(r'^\d+[A-Za-z]?,?\s+\S+'))
+]
+
+# Unified column for each value kind (the first column of a kind gets it)
+KIND_COLUMNS = {
+    'email': 'Email',
+    'postcode': 'Postcode',
+    'sort code': 'Sort Code',
+    'account number': 'Account number',
+    'phone': 'Phone Numbers',
+    'money': 'Total Cost',
+    'date': 'DD Date',
+    'plan number': 'Plan number',
+    'name': 'Name',
+    'address': 'Address'
+}
+
+
+def header_key(header):
+    """Header folded for alias lookups: lowercase, letters and digits only"""
+    return ''.join(c for c in header.lower() if c.isalnum())
+
+
+def source_label(filepath):
+    """Sheet name from a file name: 'DDS NEED ! - Sales (1).csv' -> 'Sales'"""
+    label = os.path.splitext(os.path.basename(filepath))[0]
+    label = label.split(' - ', 1)[-1]
+    return re.sub(r'\s*\(\d+\)$', '', label).strip()
+
+
+def value_kind(value):
+    value = value.strip()
+    if not value:
+        return ''
+    for kind, pattern in VALUE_KINDS:
+        if pattern.match(value):
+            return kind
+    return 'text'
+
+
+def column_kinds(rows):
+    """Most common kind of non-empty cell in each column ('' for empty columns)"""
+    width = max((len(row) for row in rows), default=0)
+    kinds = []
+    for col_idx in range(width):
+        counts = Counter(value_kind(row[col_idx]) for row in rows if col_idx < len(row))
+        counts.pop('', None)
+        kinds.append(counts.most_common(1)[0][0] if counts else '')
+    return kinds
+
+
+def is_header_row(row):
+    """Whether a first row reads as column headers (at least two known header spellings)"""
+    return sum(header_key(cell) in HEADER_ALIASES for cell in row) >= 2
+
+
+def infer_mapping(first_row, sample):
+    """(has header row, mapping) guessed from a sheet's first row and a sample of its data
+
+    Header cells with a known spelling map by name; any other column maps by
+    position to the column its values look like, unless that column is taken.
+    """
+    has_headers = is_header_row(first_row)
+    rows = sample if has_headers else [first_row] + sample
+
+    mapping = {}
+    taken = set()
+    if has_headers:
+        for cell in first_row:
+            column = HEADER_ALIASES.get(header_key(cell))
+            if column and column not in taken:
+                mapping[cell.strip()] = column
+                taken.add(column)
+
+    for col_idx, kind in enumerate(column_kinds(rows)):
+        if has_headers and col_idx < len(first_row) and first_row[col_idx].strip() in mapping:
+            continue
+        column = KIND_COLUMNS.get(kind)
+        if column and column not in taken:
+            mapping[col_idx] = column
+            taken.add(column)
+    return has_headers, mapping
+
+
+def fingerprint(first_row, sample):
+    """Layout fingerprint: the header row's spellings, or for a headerless sheet the
+    kinds of value in each column of its first rows"""
+    if is_header_row(first_row):
+        layout = 'headers:' + '\x1f'.join(header_key(cell) for cell in first_row)
+    else:
+        layout = 'values:' + '\x1f'.join(column_kinds([first_row] + sample))
+    return hashlib.sha1(layout.encode('utf-8')).hexdigest()[:16]
+
+
+def _read_registry():
+    try:
+        with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+        if registry.get('version') == REGISTRY_VERSION:
+            return registry
+    except (OSError, ValueError):
+        # Missing or unreadable - start a fresh registry
+        pass
+    return {'version': REGISTRY_VERSION, 'layouts': {}}
+
+
+def _write_registry(registry):
+    os.makedirs(os.path.dirname(REGISTRY_FILE), exist_ok=True)
+    tmp_file = f'{REGISTRY_FILE}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp_file, REGISTRY_FILE)
+
+
+def detect_source(filepath):
+    """(label, has header row, mapping, how it was found) for a DDS NEED sheet
+
+    how is 'known' for a fixed-layout sheet, 'detected' for a layout seen for
+    the first time (now cached), or 'same as <sheet>' for a layout already in
+    the registry. Known sheets are registered too, so a new sheet laid out
+    like one of them gets its mapping.
+    """
+    label = source_label(filepath)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        first_row = next(reader, [])
+        sample = [row for _, row in zip(range(SAMPLE_ROWS), reader)]
+
+    key = fingerprint(first_row, sample)
+    registry = _read_registry()
+    entry = registry['layouts'].get(key)
+
+    if label in KNOWN_SOURCES:
+        has_headers, mapping = KNOWN_SOURCES[label]
+        how = 'known'
+    elif entry is not None:
+        has_headers = entry['has headers']
+        mapping = {source: column for source, column in entry['mapping']}
+        how = f"same as {entry['first seen in']}"
+    else:
+        has_headers, mapping = infer_mapping(first_row, sample)
+        how = 'detected'
+
+    if entry is None:
+        # JSON keys are strings, so positions and header names are stored as [key, column] pairs
+        registry['layouts'][key] = {'first seen in': label, 'has headers': has_headers,
+                                    'mapping': [[source, column] for source, column in mapping.items()]}
+        _write_registry(registry)
+    return label, has_headers, mapping, how
@@ -5,34 +5,19 @@ Hour-by-hour per day and day-by-day breakdown
 Working hours: 9am to their last call time (not fixed 5pm)
 """
 
+import argparse
+import os
+import tempfile
+from functools import partial
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from collections import defaultdict
 import json
 
-# Load the most recent data
-csv_path = '/Users/danielyoung/Downloads/call-data (1).csv'
-df = pd.read_csv(csv_path)
-
-# Combine Date and Time columns
-df['datetime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d %b %Y %H:%M:%S', errors='coerce')
-df['date'] = df['datetime'].dt.date
-df['hour'] = df['datetime'].dt.hour
-df['day_of_week'] = df['Day Of Week']
-
-# Get extension from 'From' column (e.g., "Ext 1001")
-df['extension'] = df['From'].str.extract(r'Ext (\d+)').astype(float)
-
-# Duration is already in seconds
-df['duration_seconds'] = pd.to_numeric(df['Duration (Seconds)'], errors='coerce').fillna(0)
-
-# Filter out rows without extension
-df = df[df['extension'].notna()]
-
-# Get all unique extensions and sort them
-all_extensions = sorted(df['extension'].unique())
-
-print(f"📊 Found {len(all_extensions)} agents: {', '.join([str(int(x)) for x in all_extensions])}")
+from agent_pool import map_agents
+from call_data import load_call_data
+from call_metrics import MetricsCube, rate_days, rate_hours
+from html_stream import read_chunks, spool_html, write_html
 
 def format_time(seconds):
     """Format seconds to HH:MM:SS or MM:SS"""
@@ -48,196 +33,75 @@ def format_time(seconds):
     else:
         return f"{int(seconds)}s"
 
-def analyze_by_hour_per_day(agent_df):
-    """Hour-by-hour analysis per day"""
-    hourly_stats = []
+def analyze_by_hour_per_day(cube, calls):
+    """Hour-by-hour analysis per day, for every agent (9am to 5pm cells of the cube)"""
+    # Idle time within each specific hour (10 seconds ring time per call)
+    hourly = pd.DataFrame(cube.hour_cells(range(9, 18)))
     
-    for date in sorted(agent_df['date'].unique()):
-        day_calls = agent_df[agent_df['date'] == date].sort_values('datetime')
-        
-        for hour in range(9, 18):  # 9am to 5pm
-            hour_calls = day_calls[day_calls['hour'] == hour]
-            
-            if len(hour_calls) == 0:
-                continue
-            
-            answered = len(hour_calls[hour_calls['Call Result'] == 'Answered'])
-            unanswered = len(hour_calls[hour_calls['Call Result'] != 'Answered'])
-            total_duration = hour_calls['duration_seconds'].sum()
-            avg_duration = total_duration / len(hour_calls) if len(hour_calls) > 0 else 0
-            
-            # Calculate idle time within this specific hour
-            # Account for 10 seconds ring time per call
-            total_idle = 0
-            idle_periods = []
-            
-            for i in range(len(hour_calls) - 1):
-                current = hour_calls.iloc[i]
-                next_call = hour_calls.iloc[i + 1]
-                
-                # Call duration + 10 seconds ring time
-                call_end_with_ring = current['datetime'] + timedelta(seconds=int(current['duration_seconds']) + 10)
-                next_start = next_call['datetime']
-                
-                if next_start.hour == hour:
-                    idle_seconds = (next_start - call_end_with_ring).total_seconds()
-                    if idle_seconds > 0:
-                        total_idle += idle_seconds
-                        idle_periods.append(idle_seconds)
-            
-            avg_idle = total_idle / len(idle_periods) if idle_periods else 0
-            max_idle = max(idle_periods) if idle_periods else 0
-            
-            calls_count = len(hour_calls)
-            if calls_count >= 10 and avg_idle < 300:
-                performance = 'Excellent'
-                perf_class = 'excellent'
-            elif calls_count >= 7 and avg_idle < 600:
-                performance = 'Good'
-                perf_class = 'good'
-            elif calls_count >= 4:
-                performance = 'Average'
-                perf_class = 'average'
-            else:
-                performance = 'Poor'
-                perf_class = 'poor'
-            
-            hourly_stats.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'day_of_week': hour_calls.iloc[0]['day_of_week'],
-                'hour': f"{hour:02d}:00-{hour:02d}:59",
-                'hour_num': hour,
-                'total_calls': len(hour_calls),
-                'answered': answered,
-                'unanswered': unanswered,
-                'answer_rate': (answered / len(hour_calls) * 100) if len(hour_calls) > 0 else 0,
-                'total_duration': total_duration,
-                'avg_duration': avg_duration,
-                'total_idle': total_idle,
-                'avg_idle': avg_idle,
-                'max_idle': max_idle,
-                'idle_count': len(idle_periods),
-                'performance': performance,
-                'perf_class': perf_class
-            })
+    hourly['date'] = pd.to_datetime(hourly['day'], unit='D').dt.strftime('%Y-%m-%d')
+    hourly['day_of_week'] = calls.labels('day_of_week', hourly['day_of_week'])
+    hourly['hour_label'] = [f"{hour:02d}:00-{hour:02d}:59" for hour in hourly['hour']]
     
-    return hourly_stats
+    hourly['performance'] = rate_hours(hourly['total_calls'], hourly['avg_idle'])
+    hourly['perf_class'] = hourly['performance'].str.lower()
+    
+    return hourly
 
-def analyze_by_day(agent_df):
-    """Day-by-day analysis with dynamic end time"""
-    daily_stats = []
+def analyze_by_day(cube, calls):
+    """Day-by-day analysis with dynamic end time, for every agent (cube summed over hours)"""
+    # Idle time (same-day gaps only, 10 seconds ring time per call)
+    daily = pd.DataFrame(cube.day_cells())
     
-    for date in sorted(agent_df['date'].unique()):
-        day_calls = agent_df[agent_df['date'] == date]
-        
-        answered = len(day_calls[day_calls['Call Result'] == 'Answered'])
-        unanswered = len(day_calls[day_calls['Call Result'] != 'Answered'])
-        total_duration = day_calls['duration_seconds'].sum()
-        avg_duration = total_duration / len(day_calls) if len(day_calls) > 0 else 0
-        
-        # Working hours: 9am to last call end time
-        first_call = day_calls['datetime'].min()
-        last_call = day_calls['datetime'].max()
-        last_call_duration = int(day_calls[day_calls['datetime'] == last_call]['duration_seconds'].iloc[0])
-        last_call_end = last_call + timedelta(seconds=last_call_duration)
-        
-        # Calculate expected working time from 9am to last call
-        date_9am = pd.Timestamp(date) + pd.Timedelta(hours=9)
-        working_seconds = (last_call_end - date_9am).total_seconds()
-        
-        # Calculate idle time (same-day gaps only)
-        day_calls_sorted = day_calls.sort_values('datetime')
-        total_idle = 0
-        idle_periods = []
-        
-        for i in range(len(day_calls_sorted) - 1):
-            current = day_calls_sorted.iloc[i]
-            next_call = day_calls_sorted.iloc[i + 1]
-            
-            # Call duration + 10 seconds ring time
-            call_end_with_ring = current['datetime'] + timedelta(seconds=int(current['duration_seconds']) + 10)
-            next_start = next_call['datetime']
-            
-            idle_seconds = (next_start - call_end_with_ring).total_seconds()
-            if idle_seconds > 0:
-                total_idle += idle_seconds
-                idle_periods.append(idle_seconds)
-        
-        avg_idle = total_idle / len(idle_periods) if idle_periods else 0
-        max_idle = max(idle_periods) if idle_periods else 0
-        
-        # Unaccounted time = working time - call time
-        unaccounted_time = working_seconds - total_duration
-        
-        # Productivity metrics
-        productive_pct = (total_duration / working_seconds * 100) if working_seconds > 0 else 0
-        idle_pct = (unaccounted_time / working_seconds * 100) if working_seconds > 0 else 0
-        
-        # Calls per hour based on actual working hours
-        working_hours = working_seconds / 3600
-        calls_per_hour = len(day_calls) / working_hours if working_hours > 0 else 0
-        
-        # Performance rating
-        if calls_per_hour >= 8 and productive_pct >= 30:
-            performance = 'Excellent'
-            perf_class = 'excellent'
-        elif calls_per_hour >= 6 and productive_pct >= 20:
-            performance = 'Good'
-            perf_class = 'good'
-        elif calls_per_hour >= 4:
-            performance = 'Average'
-            perf_class = 'average'
-        else:
-            performance = 'Poor'
-            perf_class = 'poor'
-        
-        # Check if started late
-        start_time = first_call.hour + first_call.minute/60
-        late_start = start_time > 9.25
-        
-        daily_stats.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'day_of_week': day_calls['day_of_week'].iloc[0],
-            'total_calls': len(day_calls),
-            'answered': answered,
-            'unanswered': unanswered,
-            'answer_rate': (answered / len(day_calls) * 100) if len(day_calls) > 0 else 0,
-            'total_duration': total_duration,
-            'avg_duration': avg_duration,
-            'working_seconds': working_seconds,
-            'unaccounted_time': unaccounted_time,
-            'total_idle': total_idle,
-            'avg_idle': avg_idle,
-            'max_idle': max_idle,
-            'productive_pct': productive_pct,
-            'idle_pct': idle_pct,
-            'calls_per_hour': calls_per_hour,
-            'first_call': first_call.strftime('%H:%M'),
-            'last_call': last_call_end.strftime('%H:%M'),
-            'late_start': late_start,
-            'performance': performance,
-            'perf_class': perf_class
-        })
+    daily['date'] = pd.to_datetime(daily['day'], unit='D').dt.strftime('%Y-%m-%d')
+    daily['day_of_week'] = calls.labels('day_of_week', daily['day_of_week'])
     
-    return daily_stats
+    # Working hours: 9am to last call end time
+    first_call = pd.to_datetime(daily['first_start'], unit='s')
+    last_call_end = pd.to_datetime(daily['last_end'], unit='s')
+    date_9am = daily['day'] * 86400 + 9 * 3600
+    working_seconds = (daily['last_end'] - date_9am).astype(float)
+    daily['working_seconds'] = working_seconds
+    
+    # Unaccounted time = working time - call time
+    daily['unaccounted_time'] = working_seconds - daily['total_duration']
+    
+    # Productivity metrics
+    working = working_seconds > 0
+    daily['productive_pct'] = (daily['total_duration'] / working_seconds * 100).where(working, 0)
+    daily['idle_pct'] = (daily['unaccounted_time'] / working_seconds * 100).where(working, 0)
+    
+    # Calls per hour based on actual working hours
+    working_hours = working_seconds / 3600
+    daily['calls_per_hour'] = (daily['total_calls'] / working_hours).where(working, 0)
+    
+    # Performance rating
+    daily['performance'] = rate_days(daily['calls_per_hour'], daily['productive_pct'])
+    daily['perf_class'] = daily['performance'].str.lower()
+    
+    # Check if started late
+    start_time = first_call.dt.hour + first_call.dt.minute/60
+    daily['late_start'] = start_time > 9.25
+    daily['first_call'] = first_call.dt.strftime('%H:%M')
+    daily['last_call'] = last_call_end.dt.strftime('%H:%M')
+    
+    return daily
 
 def generate_hourly_table(hourly_stats):
-    """Generate HTML table for hourly breakdown"""
-    rows = []
+    """Yield HTML rows for the hourly breakdown (rows of the grouped hourly frame)"""
     current_date = None
     
-    for stat in hourly_stats:
+    for stat in hourly_stats.to_dict('records'):
         if current_date != stat['date']:
             current_date = stat['date']
-            rows.append(f"""
+            yield f"""
             <tr style="background: #667eea; color: white;">
                 <td colspan="12"><strong>📅 {stat['date']} ({stat['day_of_week']})</strong></td>
             </tr>
-            """)
+            """
         
-        rows.append(f"""
+        yield f"""
         <tr class="{stat['perf_class']}">
-            <td><strong>{stat['hour']}</strong></td>
+            <td><strong>{stat['hour_label']}</strong></td>
             <td>{stat['total_calls']}</td>
             <td>{stat['answered']}</td>
             <td>{stat['unanswered']}</td>
@@ -250,19 +114,16 @@ def generate_hourly_table(hourly_stats):
             <td>{stat['idle_count']}</td>
             <td><span class="badge {stat['perf_class']}">{stat['performance']}</span></td>
         </tr>
-        """)
-    
-    return ''.join(rows)
+        """
 
 def generate_daily_table(daily_stats):
-    """Generate HTML table for daily breakdown"""
-    rows = []
-    for stat in daily_stats:
+    """Yield HTML rows for the daily breakdown (rows of the grouped daily frame)"""
+    for stat in daily_stats.to_dict('records'):
         time_warning = ''
         if stat['late_start']:
             time_warning += '⚠️ Late Start'
         
-        rows.append(f"""
+        yield f"""
         <tr class="{stat['perf_class']}">
             <td><strong>{stat['date']}</strong></td>
             <td>{stat['day_of_week']}</td>
@@ -281,177 +142,11 @@ def generate_daily_table(daily_stats):
             <td>{stat['calls_per_hour']:.1f}</td>
             <td><span class="badge {stat['perf_class']}">{stat['performance']}</span></td>
         </tr>
-        """)
-    
-    return ''.join(rows)
-
-# Generate analyses for all agents
-agent_data = {}
-for ext in all_extensions:
-    ext_int = int(ext)
-    agent_df = df[df['extension'] == ext].sort_values('datetime').reset_index(drop=True)
-    
-    if len(agent_df) == 0:
-        continue
-    
-    agent_data[ext_int] = {
-        'df': agent_df,
-        'hourly': analyze_by_hour_per_day(agent_df),
-        'daily': analyze_by_day(agent_df)
-    }
-    
-    print(f"   ✓ Processed Ext {ext_int}: {len(agent_df)} calls")
-
-# Generate comparison data
-comparison_stats = []
-for ext in sorted(agent_data.keys()):
-    data = agent_data[ext]
-    df_agent = data['df']
-    
-    total_calls = len(df_agent)
-    answered = len(df_agent[df_agent['Call Result'] == 'Answered'])
-    answer_rate = (answered / total_calls * 100) if total_calls > 0 else 0
-    
-    total_duration = df_agent['duration_seconds'].sum()
-    avg_duration = total_duration / total_calls if total_calls > 0 else 0
-    
-    # Calculate overall idle time
-    total_idle = 0
-    for i in range(len(df_agent) - 1):
-        current = df_agent.iloc[i]
-        next_call = df_agent.iloc[i + 1]
-        if current['date'] == next_call['date']:
-            call_end = current['datetime'] + timedelta(seconds=int(current['duration_seconds']) + 10)
-            idle_seconds = (next_call['datetime'] - call_end).total_seconds()
-            if idle_seconds > 0:
-                total_idle += idle_seconds
-    
-    avg_idle = total_idle / (total_calls - 1) if total_calls > 1 else 0
-    
-    # Working days
-    days = len(df_agent['date'].unique())
-    calls_per_day = total_calls / days if days > 0 else 0
-    
-    comparison_stats.append({
-        'ext': ext,
-        'total_calls': total_calls,
-        'answered': answered,
-        'answer_rate': answer_rate,
-        'total_duration': total_duration,
-        'avg_duration': avg_duration,
-        'avg_idle': avg_idle,
-        'days': days,
-        'calls_per_day': calls_per_day
-    })
-
-# Sort by total calls descending
-comparison_stats.sort(key=lambda x: x['total_calls'], reverse=True)
-
-# Generate tabs HTML
-tabs_html = ['<button class="tab active" onclick="showTab(\'comparison\')">📊 Comparison</button>']
-for ext in sorted(agent_data.keys()):
-    tabs_html.append(f'<button class="tab" onclick="showTab(\'ext{ext}\')">👤 Ext {ext}</button>')
-
-# Generate comparison table HTML
-def generate_comparison_table():
-    rows = []
-    rank = 1
-    for stat in comparison_stats:
-        # Performance class based on calls per day
-        if stat['calls_per_day'] >= 50:
-            perf_class = 'excellent'
-        elif stat['calls_per_day'] >= 35:
-            perf_class = 'good'
-        elif stat['calls_per_day'] >= 20:
-            perf_class = 'average'
-        else:
-            perf_class = 'poor'
-        
-        rows.append(f"""
-        <tr class="{perf_class}">
-            <td><strong>#{rank}</strong></td>
-            <td><strong>Ext {stat['ext']}</strong></td>
-            <td>{stat['total_calls']}</td>
-            <td>{stat['calls_per_day']:.1f}</td>
-            <td>{stat['answered']}</td>
-            <td>{stat['answer_rate']:.1f}%</td>
-            <td>{format_time(stat['total_duration'])}</td>
-            <td>{format_time(stat['avg_duration'])}</td>
-            <td>{format_time(stat['avg_idle'])}</td>
-            <td>{stat['days']}</td>
-        </tr>
-        """)
-        rank += 1
-    return ''.join(rows)
-
-comparison_html = f"""
-<div id="comparison" class="tab-content active">
-    <div class="section">
-        <h2>📊 All Agents Performance Comparison</h2>
-        <div class="warning">
-            <strong>📈 Ranked by Total Calls</strong><br>
-            Comparing all 16 agents across all metrics
-        </div>
-        
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="stat-label">Total Calls (All Agents)</div>
-                <div class="stat-value">{sum(s['total_calls'] for s in comparison_stats):,}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Average Calls Per Agent</div>
-                <div class="stat-value">{sum(s['total_calls'] for s in comparison_stats) / len(comparison_stats):.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Top Performer</div>
-                <div class="stat-value">Ext {comparison_stats[0]['ext']}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Overall Answer Rate</div>
-                <div class="stat-value">{sum(s['answered'] for s in comparison_stats) / sum(s['total_calls'] for s in comparison_stats) * 100:.1f}%</div>
-            </div>
-        </div>
-        
-        <table>
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Agent</th>
-                    <th>Total Calls</th>
-                    <th>Calls/Day</th>
-                    <th>Answered</th>
-                    <th>Answer %</th>
-                    <th>Total Talk Time</th>
-                    <th>Avg Talk Time</th>
-                    <th>Avg Idle Gap</th>
-                    <th>Days Worked</th>
-                </tr>
-            </thead>
-            <tbody>
-                {generate_comparison_table()}
-            </tbody>
-        </table>
-        
-        <div class="insight-box">
-            <h4>🏆 Performance Insights</h4>
-            <ul>
-                <li><strong>Highest Volume:</strong> Ext {comparison_stats[0]['ext']} with {comparison_stats[0]['total_calls']} calls ({comparison_stats[0]['calls_per_day']:.1f}/day)</li>
-                <li><strong>Lowest Volume:</strong> Ext {comparison_stats[-1]['ext']} with {comparison_stats[-1]['total_calls']} calls ({comparison_stats[-1]['calls_per_day']:.1f}/day)</li>
-                <li><strong>Best Answer Rate:</strong> Ext {max(comparison_stats, key=lambda x: x['answer_rate'])['ext']} at {max(comparison_stats, key=lambda x: x['answer_rate'])['answer_rate']:.1f}%</li>
-                <li><strong>Longest Avg Call:</strong> Ext {max(comparison_stats, key=lambda x: x['avg_duration'])['ext']} at {format_time(max(comparison_stats, key=lambda x: x['avg_duration'])['avg_duration'])}</li>
-                <li><strong>Shortest Avg Idle:</strong> Ext {min(comparison_stats, key=lambda x: x['avg_idle'])['ext']} at {format_time(min(comparison_stats, key=lambda x: x['avg_idle'])['avg_idle'])}</li>
-            </ul>
-        </div>
-    </div>
-</div>
-"""
+        """
 
-# Generate tab content HTML
-tab_content_html = [comparison_html]
-for ext in sorted(agent_data.keys()):
-    data = agent_data[ext]
-    
-    tab_content_html.append(f"""
+def generate_agent_tab(ext, hourly_stats, daily_stats):
+    """Yield the tab content HTML for one agent"""
+    yield f"""
     <div id="ext{ext}" class="tab-content">
         <div class="section">
             <h2>📈 Hour-by-Hour Breakdown - Ext {ext}</h2>
@@ -477,7 +172,9 @@ for ext in sorted(agent_data.keys()):
                     </tr>
                 </thead>
                 <tbody>
-                    {generate_hourly_table(data['hourly'])}
+                    """
+    yield from generate_hourly_table(hourly_stats)
+    yield f"""
                 </tbody>
             </table>
         </div>
@@ -510,15 +207,99 @@ for ext in sorted(agent_data.keys()):
                     </tr>
                 </thead>
                 <tbody>
-                    {generate_daily_table(data['daily'])}
+                    """
+    yield from generate_daily_table(daily_stats)
+    yield f"""
                 </tbody>
             </table>
         </div>
     </div>
-    """)
+    """
+
+def analyze_agents(calls, tab_dir):
+    """Comparison stats and tab HTML for every agent in a set of calls: {ext: {'stats', 'tab'}}
 
-# Generate full HTML
-html = f"""
+    Runs once per agent partition, possibly in a worker process; an agent's
+    results depend only on that agent's calls. Each tab is streamed to a
+    spool file in tab_dir and 'tab' holds its path, so rendered HTML is never kept in memory.
+    """
+    # Agent x date x hour totals (calls, talk, idle gaps with 10 seconds ring time);
+    # every table is a slice or reduction of it
+    cube = MetricsCube(calls)
+    hourly = analyze_by_hour_per_day(cube, calls)
+    daily = analyze_by_day(cube, calls)
+    
+    results = {}
+    for ext, total_calls, total_duration, answered in sorted(cube.agent_totals()):
+        a = cube.agent(ext)
+        answer_rate = (answered / total_calls * 100) if total_calls > 0 else 0
+        
+        avg_duration = total_duration / total_calls if total_calls > 0 else 0
+        
+        # Overall idle time (same-day gaps only)
+        total_idle = int(cube.idle[a].sum())
+        
+        avg_idle = total_idle / (total_calls - 1) if total_calls > 1 else 0
+        
+        # Working days
+        days = int(np.count_nonzero(cube.calls[a].sum(axis=1)))
+        calls_per_day = total_calls / days if days > 0 else 0
+        
+        results[ext] = {
+            'stats': {
+                'ext': ext,
+                'total_calls': total_calls,
+                'answered': answered,
+                'answer_rate': answer_rate,
+                'total_duration': total_duration,
+                'avg_duration': avg_duration,
+                'avg_idle': avg_idle,
+                'days': days,
+                'calls_per_day': calls_per_day
+            },
+            'tab': spool_html(generate_agent_tab(ext, hourly[hourly['extension'] == ext],
+                                                 daily[daily['extension'] == ext]), tab_dir)
+        }
+    
+    return results
+
+def generate_comparison_table(comparison_stats):
+    """Yield HTML rows for the agent comparison table"""
+    rank = 1
+    for stat in comparison_stats:
+        # Performance class based on calls per day
+        if stat['calls_per_day'] >= 50:
+            perf_class = 'excellent'
+        elif stat['calls_per_day'] >= 35:
+            perf_class = 'good'
+        elif stat['calls_per_day'] >= 20:
+            perf_class = 'average'
+        else:
+            perf_class = 'poor'
+        
+        yield f"""
+        <tr class="{perf_class}">
+            <td><strong>#{rank}</strong></td>
+            <td><strong>Ext {stat['ext']}</strong></td>
+            <td>{stat['total_calls']}</td>
+            <td>{stat['calls_per_day']:.1f}</td>
+            <td>{stat['answered']}</td>
+            <td>{stat['answer_rate']:.1f}%</td>
+            <td>{format_time(stat['total_duration'])}</td>
+            <td>{format_time(stat['avg_duration'])}</td>
+            <td>{format_time(stat['avg_idle'])}</td>
+            <td>{stat['days']}</td>
+        </tr>
+        """
+        rank += 1
+
+def generate_html(agent_data, comparison_stats):
+    """Generate the full HTML report, yielding it section by section
+
+    Each agent's tab content was spooled to a file by analyze_agents and is
+    copied through in chunks.
+    """
+    yield f"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -761,10 +542,82 @@ html = f"""
         </div>
         
         <div class="tabs">
-            {''.join(tabs_html)}
+            """
+    yield '<button class="tab active" onclick="showTab(\'comparison\')">📊 Comparison</button>'
+    for ext in agent_data:
+        yield f'<button class="tab" onclick="showTab(\'ext{ext}\')">👤 Ext {ext}</button>'
+    yield f"""
         </div>
         
-        {''.join(tab_content_html)}
+        """
+    
+    yield f"""
+<div id="comparison" class="tab-content active">
+    <div class="section">
+        <h2>📊 All Agents Performance Comparison</h2>
+        <div class="warning">
+            <strong>📈 Ranked by Total Calls</strong><br>
+            Comparing all 16 agents across all metrics
+        </div>
+        
+        <div class="stats-grid">
+            <div class="stat-card">
+                <div class="stat-label">Total Calls (All Agents)</div>
+                <div class="stat-value">{sum(s['total_calls'] for s in comparison_stats):,}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Average Calls Per Agent</div>
+                <div class="stat-value">{sum(s['total_calls'] for s in comparison_stats) / len(comparison_stats):.0f}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Top Performer</div>
+                <div class="stat-value">Ext {comparison_stats[0]['ext']}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Overall Answer Rate</div>
+                <div class="stat-value">{sum(s['answered'] for s in comparison_stats) / sum(s['total_calls'] for s in comparison_stats) * 100:.1f}%</div>
+            </div>
+        </div>
+        
+        <table>
+            <thead>
+                <tr>
+                    <th>Rank</th>
+                    <th>Agent</th>
+                    <th>Total Calls</th>
+                    <th>Calls/Day</th>
+                    <th>Answered</th>
+                    <th>Answer %</th>
+                    <th>Total Talk Time</th>
+                    <th>Avg Talk Time</th>
+                    <th>Avg Idle Gap</th>
+                    <th>Days Worked</th>
+                </tr>
+            </thead>
+            <tbody>
+                """
+    yield from generate_comparison_table(comparison_stats)
+    yield f"""
+            </tbody>
+        </table>
+        
+        <div class="insight-box">
+            <h4>🏆 Performance Insights</h4>
+            <ul>
+                <li><strong>Highest Volume:</strong> Ext {comparison_stats[0]['ext']} with {comparison_stats[0]['total_calls']} calls ({comparison_stats[0]['calls_per_day']:.1f}/day)</li>
+                <li><strong>Lowest Volume:</strong> Ext {comparison_stats[-1]['ext']} with {comparison_stats[-1]['total_calls']} calls ({comparison_stats[-1]['calls_per_day']:.1f}/day)</li>
+                <li><strong>Best Answer Rate:</strong> Ext {max(comparison_stats, key=lambda x: x['answer_rate'])['ext']} at {max(comparison_stats, key=lambda x: x['answer_rate'])['answer_rate']:.1f}%</li>
+                <li><strong>Longest Avg Call:</strong> Ext {max(comparison_stats, key=lambda x: x['avg_duration'])['ext']} at {format_time(max(comparison_stats, key=lambda x: x['avg_duration'])['avg_duration'])}</li>
+                <li><strong>Shortest Avg Idle:</strong> Ext {min(comparison_stats, key=lambda x: x['avg_idle'])['ext']} at {format_time(min(comparison_stats, key=lambda x: x['avg_idle'])['avg_idle'])}</li>
+            </ul>
+        </div>
+    </div>
+</div>
+"""
+    
+    for data in agent_data.values():
+        yield from read_chunks(data['tab'])
+    yield f"""
     </div>
     
     <script>
@@ -790,21 +643,57 @@ html = f"""
 </html>
 """
 
-# Save HTML
-output_path = '/Users/danielyoung/Desktop/PRODUCTION_READY_ULTIMATE_AI_WORKFLOW_SYSTEM/projects/test_project/_DEV/STREAMS/appliance_insurance_form/OUTPUTS/ALL_AGENTS_REPORT.html'
-downloads_path = '/Users/danielyoung/Downloads/ALL_AGENTS_REPORT.html'
-
-with open(output_path, 'w') as f:
-    f.write(html)
-
-with open(downloads_path, 'w') as f:
-    f.write(html)
+def main():
+    parser = argparse.ArgumentParser(description='Generate the all agents performance report')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only parse rows appended to the export since the last run')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='analyse agents in this many processes (output is the same for any count)')
+    parser.add_argument('--input', metavar='CSV',
+                        help="call-data export to report on (default: the one in Downloads)")
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='write the report only into DIR (default: OUTPUTS, with a copy in Downloads)')
+    args = parser.parse_args()
+    
+    # Load the most recent data
+    csv_path = args.input or '/Users/danielyoung/Downloads/call-data (1).csv'
+    
+    # Parsed once by the shared loader (rows without an extension dropped)
+    calls = load_call_data(csv_path, incremental=args.incremental)
+    
+    # Get all unique extensions and sort them
+    all_extensions = calls.extensions()
+    
+    print(f"📊 Found {len(all_extensions)} agents: {', '.join([str(int(x)) for x in all_extensions])}")
+    
+    # Spooled agent tabs go in a directory removed as a whole, even if an agent fails
+    output_path = '/Users/danielyoung/Desktop/PRODUCTION_READY_ULTIMATE_AI_WORKFLOW_SYSTEM/projects/test_project/_DEV/STREAMS/appliance_insurance_form/OUTPUTS/ALL_AGENTS_REPORT.html'
+    downloads_path = '/Users/danielyoung/Downloads/ALL_AGENTS_REPORT.html'
+    outputs = [output_path, downloads_path]
+    if args.output_dir:
+        outputs = [os.path.join(args.output_dir, 'ALL_AGENTS_REPORT.html')]
+    
+    with tempfile.TemporaryDirectory(prefix='agent-tabs-') as tab_dir:
+        # Generate analyses for all agents, merged in extension order
+        agent_data = map_agents(partial(analyze_agents, tab_dir=tab_dir), calls, workers=args.workers)
+        for ext, data in agent_data.items():
+            print(f"   ✓ Processed Ext {ext}: {data['stats']['total_calls']} calls")
+        
+        # Generate comparison data, sorted by total calls descending
+        comparison_stats = [data['stats'] for data in agent_data.values()]
+        comparison_stats.sort(key=lambda x: x['total_calls'], reverse=True)
+        
+        # Stream the HTML into the report and its copy in Downloads
+        write_html(outputs, generate_html(agent_data, comparison_stats))
+    
+    print("\n✅ All Agents Performance Report Generated!")
+    for path in outputs:
+        print(f"   📄 {path}")
+    print(f"\n📊 Report includes {len(agent_data)} agents with tabs for each")
+    print("   - Hour-by-hour breakdown per day")
+    print("   - Day-by-day summary")
+    print("   - Dynamic end time based on last call")
+    print("   - Start time fixed at 9am")
 
-print("\n✅ All Agents Performance Report Generated!")
-print(f"   📄 {output_path}")
-print(f"   📄 {downloads_path}")
-print(f"\n📊 Report includes {len(agent_data)} agents with tabs for each")
-print("   - Hour-by-hour breakdown per day")
-print("   - Day-by-day summary")
-print("   - Dynamic end time based on last call")
-print("   - Start time fixed at 9am")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Synthetic call-data exports for testing and benchmarking the call reports
+Writes CSVs in the phone system's export layout (From "Ext NNNN", Date
+"08 Jan 2026", Time, Duration, Call Result, ...) for a number of agents, days
+and calls per agent-hour. Output depends only on the arguments and the seed,
+and a shorter run is a prefix of a longer one with the same settings
+"""
+
+import argparse
+import csv
+import itertools
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EXPORT_COLUMNS = ['From', 'Call Type', 'To', 'Answered By', 'Date', 'Time', 'Day Of Week', 'Duration',
+                  'Duration (Seconds)', 'Call Result', 'Has Recording']
+
+# Working hours calls start in (9am to 5pm, as in the real exports)
+WORK_HOURS = range(9, 18)
+FIRST_EXTENSION = 1001
+START_DATE = '05 Jan 2026'
+
+# Mix of the real exports
+CALL_TYPES = (['Outbound', 'Inbound'], [0.67, 0.33])
+CALL_RESULTS = (['Answered', 'Busy', 'No Answer', 'Missed'], [0.41, 0.20, 0.20, 0.19])
+# Durations: mostly short, with spikes at the 2 and 5 minute marks; capped at 5 minutes
+MAX_DURATION = 300
+SPIKES = ([120, 300], [0.12, 0.13])
+MEAN_SHORT_DURATION = 20
+RECORDED = 0.996
+
+
+def day_calls(rng, day, agents, calls_per_hour):
+    """Rows of one day's calls, every agent working every hour at calls_per_hour
+    (Poisson) and the day's rows shuffled, as the export lists them"""
+    hours = len(WORK_HOURS)
+    counts = rng.poisson(calls_per_hour, size=agents * hours)
+    n = int(counts.sum())
+    cells = np.repeat(np.arange(agents * hours), counts)
+    extension = FIRST_EXTENSION + cells // hours
+    clock = (WORK_HOURS.start + cells % hours) * 3600 + rng.integers(0, 3600, n)
+
+    call_type = rng.choice(len(CALL_TYPES[0]), size=n, p=CALL_TYPES[1])
+    result = rng.choice(len(CALL_RESULTS[0]), size=n, p=CALL_RESULTS[1])
+    duration = np.minimum(rng.exponential(MEAN_SHORT_DURATION, n).astype(np.int64), MAX_DURATION)
+    spike = rng.random(n)
+    duration[spike < SPIKES[1][0]] = SPIKES[0][0]
+    duration[(spike >= SPIKES[1][0]) & (spike < sum(SPIKES[1]))] = SPIKES[0][1]
+    number = rng.integers(100_000_000, 1_000_000_000, n)
+    recorded = rng.random(n) < RECORDED
+    order = rng.permutation(n)
+
+    date_str = day.strftime('%d %b %Y')
+    weekday = day.strftime('%A')
+    call_types, results = CALL_TYPES[0], CALL_RESULTS[0]
+    return [[f'Ext {extension[i]}', call_types[call_type[i]], f'07{number[i]}', '', date_str,
+             f'{clock[i] // 3600:02d}:{clock[i] // 60 % 60:02d}:{clock[i] % 60:02d}', weekday,
+             f'{duration[i] // 60:02d}:{duration[i] % 60:02d}', str(duration[i]), results[result[i]],
+             'Yes' if recorded[i] else 'No']
+            for i in order.tolist()]
+
+
+def write_call_data(output_file, agents, days, calls_per_hour, seed=0, rows=None, start=START_DATE):
+    """Write a synthetic export; returns the number of rows written
+
+    With rows, writing stops after that many rows, going on past days if the
+    days given haven't produced them yet.
+    """
+    rng = np.random.default_rng(seed)
+    day = datetime.strptime(start, '%d %b %Y')
+    written = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for day_index in itertools.count():
+            if rows is None and day_index >= days:
+                break
+            calls = day_calls(rng, day + timedelta(days=day_index), agents, calls_per_hour)
+            if rows is not None:
+                calls = calls[:rows - written]
+            writer.writerows(calls)
+            written += len(calls)
+            if rows is not None and written >= rows:
+                break
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic call-data export')
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--agents', type=int, default=8, help=f'agents (extensions {FIRST_EXTENSION} upwards)')
+    parser.add_argument('--days', type=int, default=12, help=f'days of calls, from {START_DATE}')
+    parser.add_argument('--calls-per-hour', type=float, default=4, help='average calls per agent per working hour')
+    parser.add_argument('--rows', type=int, help='stop after this many rows (adding days if needed)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not 1 <= args.agents <= 10000 - FIRST_EXTENSION or args.calls_per_hour <= 0:
+        parser.error(f'--agents must be 1 to {10000 - FIRST_EXTENSION} and --calls-per-hour positive')
+
+    written = write_call_data(args.output, args.agents, args.days, args.calls_per_hour, args.seed, args.rows)
+    print(f"📞 Wrote {written} calls to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,37 +3,14 @@
 Generate detailed HTML call statistics report with idle time analysis
 """
 
-import csv
+import argparse
 import os
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 
-def parse_duration_seconds(duration_str):
-    """Parse duration in seconds"""
-    try:
-        return int(duration_str)
-    except:
-        return 0
-
-def extract_extension(from_field):
-    """Extract extension number from 'From' field"""
-    if not from_field:
-        return None
-    if 'Ext' in from_field:
-        parts = from_field.split()
-        for part in parts:
-            if part.isdigit():
-                return part
-    return None
-
-def parse_datetime(date_str, time_str):
-    """Parse date and time into datetime object"""
-    try:
-        # Format: "08 Jan 2026" and "13:19:41"
-        dt_str = f"{date_str} {time_str}"
-        return datetime.strptime(dt_str, "%d %b %Y %H:%M:%S")
-    except:
-        return None
+import data_store
+from call_data import load_call_data
+from call_metrics import MetricsCube
+from html_stream import write_html
 
 def format_seconds(seconds):
     """Format seconds into readable format"""
@@ -46,141 +23,80 @@ def format_seconds(seconds):
         mins = (seconds % 3600) // 60
         return f"{hours}h {mins}m"
 
-def calculate_idle_time(calls):
-    """Calculate idle time between calls (same day only)"""
-    if len(calls) < 2:
-        return []
-    
-    idle_times = []
-    for i in range(len(calls) - 1):
-        current_call = calls[i]
-        next_call = calls[i + 1]
-        
-        # Skip if different days
-        if current_call['date'] != next_call['date']:
-            continue
-        
-        # End of current call
-        end_time = current_call['datetime'] + timedelta(seconds=current_call['duration_seconds'])
-        # Start of next call
-        start_next = next_call['datetime']
-        
-        # Idle time
-        idle_seconds = (start_next - end_time).total_seconds()
-        
-        # Only count positive idle time (skip negative or zero)
-        if idle_seconds > 0:
-            idle_times.append({
-                'after_call': i,
-                'idle_seconds': idle_seconds,
-                'current_time': current_call['datetime'],
-                'next_time': next_call['datetime']
-            })
-    
-    return idle_times
-
 def main():
+    parser = argparse.ArgumentParser(description='Generate the HTML call statistics report for Ext 1001 and 1002')
+    parser.add_argument('--db', action='store_true',
+                        help='query the SQLite store (data_store.py) for just these agents\' calls and the '
+                             'per-agent totals, loading the export into it if it changed')
+    parser.add_argument('--input', metavar='CSV',
+                        help="call-data export to report on (default: the one in ~/Downloads)")
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='write the report only into DIR (default: next to this script, with a copy in Downloads)')
+    args = parser.parse_args()
+    
     downloads_dir = os.path.expanduser('~/Downloads')
     output_dir = os.path.dirname(os.path.abspath(__file__))
     
-    input_file = os.path.join(downloads_dir, 'Untitled spreadsheet - call-data (1) (2).csv')
-    output_file = os.path.join(output_dir, 'CALL_STATS_REPORT.html')
+    input_file = args.input or os.path.join(downloads_dir, 'Untitled spreadsheet - call-data (1) (2).csv')
+    output_file = os.path.join(args.output_dir or output_dir, 'CALL_STATS_REPORT.html')
     
     print("📊 Generating HTML Call Statistics Report...\n")
     
-    # Data structures
-    ext_1001_calls = []
-    ext_1002_calls = []
-    all_extensions = defaultdict(list)
-    
-    # Read call data
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            from_field = row.get('From', '')
-            ext = extract_extension(from_field)
-            
-            if ext:
-                dt = parse_datetime(row.get('Date', ''), row.get('Time', ''))
-                
-                call_data = {
-                    'extension': ext,
-                    'call_type': row.get('Call Type', ''),
-                    'to': row.get('To', ''),
-                    'answered_by': row.get('Answered By', ''),
-                    'date': row.get('Date', ''),
-                    'time': row.get('Time', ''),
-                    'day_of_week': row.get('Day Of Week', ''),
-                    'duration': row.get('Duration', ''),
-                    'duration_seconds': parse_duration_seconds(row.get('Duration (Seconds)', '0')),
-                    'call_result': row.get('Call Result', ''),
-                    'has_recording': row.get('Has Recording', ''),
-                    'datetime': dt
-                }
-                
-                all_extensions[ext].append(call_data)
-                
-                if ext == '1001':
-                    ext_1001_calls.append(call_data)
-                elif ext == '1002':
-                    ext_1002_calls.append(call_data)
-    
-    # Sort calls by datetime
-    ext_1001_calls.sort(key=lambda x: x['datetime'] if x['datetime'] else datetime.min)
-    ext_1002_calls.sort(key=lambda x: x['datetime'] if x['datetime'] else datetime.min)
-    
-    # Calculate idle times
-    idle_1001 = calculate_idle_time(ext_1001_calls)
-    idle_1002 = calculate_idle_time(ext_1002_calls)
+    # Read call data and total it per agent, date and hour
+    # (idle times between calls on the same day only, no ring time allowance)
+    if args.db:
+        conn = data_store.connect()
+        source = data_store.load_calls(conn, input_file)
+        data = data_store.select_calls(conn, source, [1001, 1002])
+        agent_totals = data_store.agent_totals(conn, source)
+        conn.close()
+    else:
+        data = load_call_data(input_file)
+        agent_totals = None
+    cube = MetricsCube(data, ring_seconds=0)
     
     print(f"✅ Processed data")
-    print(f"   Ext 1001: {len(ext_1001_calls)} calls, {len(idle_1001)} idle periods")
-    print(f"   Ext 1002: {len(ext_1002_calls)} calls, {len(idle_1002)} idle periods\n")
-    
-    # Generate HTML
-    html = generate_html(ext_1001_calls, ext_1002_calls, idle_1001, idle_1002, all_extensions)
+    for ext in (1001, 1002):
+        a = cube.agent(ext)
+        calls = int(cube.calls[a].sum() + cube.untimed_calls[a].sum()) if a is not None else 0
+        idle_periods = int(cube.idle_count[a].sum()) if a is not None else 0
+        print(f"   Ext {ext}: {calls} calls, {idle_periods} idle periods")
+    print()
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html)
-    
-    # Copy to Downloads
-    downloads_output = os.path.join(downloads_dir, 'CALL_STATS_REPORT.html')
-    with open(downloads_output, 'w', encoding='utf-8') as f:
-        f.write(html)
+    # Generate HTML, streamed into the report and its copy in Downloads
+    outputs = [output_file]
+    if not args.output_dir:
+        outputs.append(os.path.join(downloads_dir, 'CALL_STATS_REPORT.html'))
+    write_html(outputs, generate_html(cube, agent_totals))
     
     print(f"✅ HTML report generated!")
-    print(f"   📄 {output_file}")
-    print(f"   📄 {downloads_output}")
+    for path in outputs:
+        print(f"   📄 {path}")
+
+def generate_html(cube, agent_totals=None):
+    """Generate the HTML report, yielding it section by section
 
-def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
-    """Generate HTML report"""
+    agent_totals is the all-agent comparison (as cube.agent_totals(), which is
+    used if it's not given), for a cube built on just Ext 1001 and 1002.
+    """
     
-    # Calculate stats for both extensions
-    def calc_stats(calls, idle_times):
-        total_calls = len(calls)
-        if total_calls == 0:
+    # Calculate stats for both extensions from their slice of the cube
+    def calc_stats(ext):
+        a = cube.agent(ext)
+        if a is None:
             return {}
         
-        total_duration = sum(c['duration_seconds'] for c in calls)
-        answered = sum(1 for c in calls if c['call_result'] == 'Answered')
+        total_calls = int(cube.calls[a].sum() + cube.untimed_calls[a].sum())
+        total_duration = int(cube.talk[a].sum() + cube.untimed_talk[a].sum())
+        answered = int(cube.answered[a].sum() + cube.untimed_answered[a].sum())
         unanswered = total_calls - answered
         
         # Time analysis - calculate per day to avoid counting overnight as idle
-        by_date = defaultdict(list)
-        for call in calls:
-            by_date[call['date']].append(call)
-        
-        total_working_time = 0
-        for date, day_calls in by_date.items():
-            day_calls.sort(key=lambda x: x['datetime'])
-            first_call = day_calls[0]['datetime']
-            last_call = day_calls[-1]['datetime']
-            last_call_end = last_call + timedelta(seconds=day_calls[-1]['duration_seconds'])
-            day_working_time = (last_call_end - first_call).total_seconds()
-            total_working_time += day_working_time
-        
-        total_idle_time = sum(i['idle_seconds'] for i in idle_times if i['idle_seconds'] > 0)
+        worked = cube.calls[a].sum(axis=1) > 0
+        total_working_time = float((cube.last_end[a] - cube.first_start[a])[worked].sum())
+        
+        idle_count = int(cube.idle_count[a].sum())
+        total_idle_time = cube.idle[a].sum()
         total_active_time = total_duration
         
         # Productivity metrics
@@ -188,9 +104,9 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
         idle_pct = (total_idle_time / total_working_time * 100) if total_working_time > 0 else 0
         
         # Average idle time
-        avg_idle = total_idle_time / len(idle_times) if idle_times else 0
-        max_idle = max((i['idle_seconds'] for i in idle_times), default=0)
-        min_idle = min((i['idle_seconds'] for i in idle_times if i['idle_seconds'] > 0), default=0)
+        avg_idle = total_idle_time / idle_count if idle_count else 0
+        max_idle = cube.idle_max[a].max() if idle_count else 0
+        min_idle = cube.idle_gaps.seconds_for(ext).min() if idle_count else 0
         
         return {
             'total_calls': total_calls,
@@ -209,17 +125,13 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
             'min_idle': min_idle
         }
     
-    stats_1001 = calc_stats(calls_1001, idle_1001)
-    stats_1002 = calc_stats(calls_1002, idle_1002)
+    stats_1001 = calc_stats(1001)
+    stats_1002 = calc_stats(1002)
     
     # Generate comparison stats
     agent_stats = {}
-    for ext, calls in all_extensions.items():
-        total_calls = len(calls)
-        total_duration = sum(c['duration_seconds'] for c in calls)
-        answered = sum(1 for c in calls if c['call_result'] == 'Answered')
-        
-        agent_stats[ext] = {
+    for ext, total_calls, total_duration, answered in agent_totals or cube.agent_totals():
+        agent_stats[str(ext)] = {
             'calls': total_calls,
             'duration_min': total_duration / 60,
             'avg_duration': total_duration / total_calls if total_calls > 0 else 0,
@@ -227,7 +139,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
             'answer_rate': (answered / total_calls * 100) if total_calls > 0 else 0
         }
     
-    html = f"""
+    yield f"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -526,7 +438,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
     <div class="container">
         <h1>📊 Call Statistics Report</h1>
         <p class="subtitle">Extensions 1001 & 1002 - Performance Analysis</p>
-        <p class="subtitle">Period: January 5-8, 2026 | Total Agents: {len(all_extensions)}</p>
+        <p class="subtitle">Period: January 5-8, 2026 | Total Agents: {len(agent_stats)}</p>
         
         <div class="warning">
             <div class="warning-title">⚠️ Performance Alert</div>
@@ -540,7 +452,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
     # Extension 1001 Details
     if stats_1001:
         s = stats_1001
-        html += f"""
+        yield f"""
         <div class="section">
             <div class="section-title">Extension 1001 - Critical Analysis</div>
             
@@ -638,7 +550,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
     # Extension 1002 Details
     if stats_1002:
         s = stats_1002
-        html += f"""
+        yield f"""
         <div class="section">
             <div class="section-title">Extension 1002 - Critical Analysis</div>
             
@@ -734,7 +646,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
 """
 
     # Comparison Section
-    html += f"""
+    yield f"""
         <div class="section">
             <div class="comparison">
                 <div class="comparison-title">Head-to-Head Comparison</div>
@@ -773,7 +685,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
     # All Agents Comparison
     sorted_agents = sorted(agent_stats.items(), key=lambda x: x[1]['calls'], reverse=True)
     
-    html += """
+    yield """
         <div class="section">
             <div class="section-title">All Agents Comparison</div>
             <table>
@@ -797,7 +709,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
         status_badge = "badge-success" if ext not in ['1001', '1002'] and stats['answer_rate'] >= 80 else "badge-danger"
         status_text = "Acceptable" if stats['answer_rate'] >= 80 else "Needs Improvement" if stats['answer_rate'] >= 60 else "Poor"
         
-        html += f"""
+        yield f"""
                     <tr style="{highlight}">
                         <td>Ext {ext} {'⭐' if ext in ['1001', '1002'] else ''}</td>
                         <td>{stats['calls']}</td>
@@ -809,7 +721,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
                     </tr>
 """
     
-    html += """
+    yield """
                 </tbody>
             </table>
             
@@ -824,7 +736,7 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
         </div>
 """.format(stats_1001['productive_pct'], stats_1001['avg_idle'], stats_1002['productive_pct'], stats_1002['avg_idle'])
     
-    html += """
+    yield """
         <div class="section">
             <div class="section-title">Required Improvements</div>
             <div class="grid">
@@ -862,8 +774,6 @@ def generate_html(calls_1001, calls_1002, idle_1001, idle_1002, all_extensions):
 </body>
 </html>
 """
-    
-    return html
 
 if __name__ == '__main__':
     main()
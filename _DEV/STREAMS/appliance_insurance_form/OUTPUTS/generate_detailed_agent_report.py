@@ -4,238 +4,95 @@ Generate comprehensive HTML report with tabs for each agent
 Hour-by-hour and day-by-day breakdown with detailed analysis
 """
 
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from collections import defaultdict
 import json
 
-# Load the data
-csv_path = '/Users/danielyoung/Downloads/Untitled spreadsheet - call-data (1) (2).csv'
-df = pd.read_csv(csv_path)
+from call_data import load_call_data
+from call_metrics import MetricsCube, rate_days, rate_hours
+from html_stream import write_html
 
-# Combine Date and Time columns
-df['datetime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d %b %Y %H:%M:%S', errors='coerce')
-df['date'] = df['datetime'].dt.date
-df['hour'] = df['datetime'].dt.hour
-df['day_of_week'] = df['Day Of Week']
+parser = argparse.ArgumentParser(description='Generate the agent performance report for Ext 1001 and 1002')
+parser.add_argument('--input', metavar='CSV', help="call-data export to report on (default: the one in Downloads)")
+parser.add_argument('--output-dir', metavar='DIR',
+                    help='write the report only into DIR (default: OUTPUTS, with a copy in Downloads)')
+args = parser.parse_args()
 
-# Get extension from 'From' column (e.g., "Ext 1001")
-df['extension'] = df['From'].str.extract(r'Ext (\d+)').astype(float)
+# Load the data
+csv_path = args.input or '/Users/danielyoung/Downloads/Untitled spreadsheet - call-data (1) (2).csv'
 
-# Duration is already in seconds in 'Duration (Seconds)' column
-df['duration_seconds'] = pd.to_numeric(df['Duration (Seconds)'], errors='coerce').fillna(0)
+# Parsed once by the shared loader (rows without an extension dropped)
+calls = load_call_data(csv_path)
 
-# Filter for extensions 1001 and 1002
-df_1001 = df[df['extension'] == 1001].sort_values('datetime').reset_index(drop=True)
-df_1002 = df[df['extension'] == 1002].sort_values('datetime').reset_index(drop=True)
+# Agent x date x hour totals for all agents, built once. Idle time is measured
+# between consecutive calls on the same day and includes 10 seconds ring time per call
+cube = MetricsCube(calls)
 
-def calculate_idle_times(agent_df):
-    """Calculate idle time between consecutive calls on same day
-    Includes 10 seconds ring time per call"""
-    idle_data = []
+def analyze_by_hour(cube):
+    """Detailed hour-by-hour analysis - per day, every agent (9am to 5pm cells of the cube)"""
+    # Idle time between calls within each specific hour
+    # (10 seconds ring time per call)
+    hourly = pd.DataFrame(cube.hour_cells(range(9, 18)))
     
-    for i in range(len(agent_df) - 1):
-        current = agent_df.iloc[i]
-        next_call = agent_df.iloc[i + 1]
-        
-        # Skip if different days
-        if current['date'] != next_call['date']:
-            continue
-        
-        # End of current call + 10 seconds ring time
-        end_time_with_ring = current['datetime'] + timedelta(seconds=current['duration_seconds'] + 10)
-        # Start of next call
-        start_next = next_call['datetime']
-        
-        # Idle time (only after call duration + ring time)
-        idle_seconds = (start_next - end_time_with_ring).total_seconds()
-        
-        if idle_seconds > 0:
-            idle_data.append({
-                'datetime': current['datetime'],
-                'date': current['date'],
-                'hour': current['hour'],
-                'idle_seconds': idle_seconds,
-                'idle_minutes': idle_seconds / 60
-            })
+    hourly['date'] = pd.to_datetime(hourly['day'], unit='D').dt.strftime('%Y-%m-%d')
+    hourly['day_of_week'] = calls.labels('day_of_week', hourly['day_of_week'])
+    hourly['hour_label'] = [f"{hour:02d}:00-{hour:02d}:59" for hour in hourly['hour']]
     
-    return pd.DataFrame(idle_data)
-
-# Calculate idle times
-idle_1001 = calculate_idle_times(df_1001)
-idle_1002 = calculate_idle_times(df_1002)
+    # Performance rating
+    hourly['performance'] = rate_hours(hourly['total_calls'], hourly['avg_idle'])
+    hourly['perf_class'] = hourly['performance'].str.lower()
+    
+    return hourly
 
-def analyze_by_hour(agent_df, idle_df, agent_name):
-    """Detailed hour-by-hour analysis - per day"""
-    hourly_stats = []
+def analyze_by_day(cube):
+    """Detailed day-by-day analysis, every agent (cube summed over hours)"""
+    daily = pd.DataFrame(cube.day_cells())
     
-    # Group by date first, then analyze each hour within that day
-    for date in sorted(agent_df['date'].unique()):
-        day_calls = agent_df[agent_df['date'] == date].sort_values('datetime')
-        
-        # Analyze each hour of this specific day
-        for hour in range(9, 18):  # 9am to 5pm
-            hour_calls = day_calls[day_calls['hour'] == hour]
-            
-            if len(hour_calls) == 0:
-                continue
-            
-            answered = len(hour_calls[hour_calls['Call Result'] == 'Answered'])
-            unanswered = len(hour_calls[hour_calls['Call Result'] != 'Answered'])
-            total_duration = hour_calls['duration_seconds'].sum()
-            avg_duration = total_duration / len(hour_calls) if len(hour_calls) > 0 else 0
-            
-            # Calculate idle time between calls within this specific hour
-            # Account for 10 seconds ring time per call
-            total_idle = 0
-            idle_periods = []
-            
-            for i in range(len(hour_calls) - 1):
-                current = hour_calls.iloc[i]
-                next_call = hour_calls.iloc[i + 1]
-                
-                # Call starts at current['datetime']
-                # Add call duration + 10 seconds ring time
-                call_end_with_ring = current['datetime'] + timedelta(seconds=current['duration_seconds'] + 10)
-                # Start of next call
-                next_start = next_call['datetime']
-                
-                # Only count if next call is still in the same hour
-                if next_start.hour == hour:
-                    idle_seconds = (next_start - call_end_with_ring).total_seconds()
-                    if idle_seconds > 0:
-                        total_idle += idle_seconds
-                        idle_periods.append(idle_seconds)
-            
-            avg_idle = total_idle / len(idle_periods) if idle_periods else 0
-            max_idle = max(idle_periods) if idle_periods else 0
-            
-            # Performance rating
-            calls_count = len(hour_calls)
-            if calls_count >= 10 and avg_idle < 300:
-                performance = 'Excellent'
-                perf_class = 'excellent'
-            elif calls_count >= 7 and avg_idle < 600:
-                performance = 'Good'
-                perf_class = 'good'
-            elif calls_count >= 4:
-                performance = 'Average'
-                perf_class = 'average'
-            else:
-                performance = 'Poor'
-                perf_class = 'poor'
-            
-            hourly_stats.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'day_of_week': hour_calls.iloc[0]['day_of_week'],
-                'hour': f"{hour:02d}:00-{hour:02d}:59",
-                'hour_num': hour,
-                'total_calls': len(hour_calls),
-                'answered': answered,
-                'unanswered': unanswered,
-                'answer_rate': (answered / len(hour_calls) * 100) if len(hour_calls) > 0 else 0,
-                'total_duration': total_duration,
-                'avg_duration': avg_duration,
-                'total_idle': total_idle,
-                'avg_idle': avg_idle,
-                'max_idle': max_idle,
-                'idle_count': len(idle_periods),
-                'performance': performance,
-                'perf_class': perf_class
-            })
+    daily['date'] = pd.to_datetime(daily['day'], unit='D').dt.strftime('%Y-%m-%d')
+    daily['day_of_week'] = calls.labels('day_of_week', daily['day_of_week'])
     
-    return hourly_stats
-
-def analyze_by_day(agent_df, idle_df, agent_name):
-    """Detailed day-by-day analysis"""
-    daily_stats = []
+    # Expected working hours: 9am-5pm (8 hours) minus 30 min lunch = 7.5 hours = 27000 seconds
+    expected_working_seconds = 7.5 * 3600
+    daily['expected_working_seconds'] = expected_working_seconds
+    
+    # Calculate total unaccounted time (expected work time - call time)
+    daily['unaccounted_time'] = expected_working_seconds - daily['total_duration']
+    
+    # Working hours (actual span)
+    first_call = pd.to_datetime(daily['first_start'], unit='s')
+    last_call_end = pd.to_datetime(daily['last_end'], unit='s')
+    daily['actual_span'] = (last_call_end - first_call).dt.total_seconds()
     
-    for date in sorted(agent_df['date'].unique()):
-        day_calls = agent_df[agent_df['date'] == date]
-        day_idle = idle_df[idle_df['date'] == date]
-        
-        answered = len(day_calls[day_calls['Call Result'] == 'Answered'])
-        unanswered = len(day_calls[day_calls['Call Result'] != 'Answered'])
-        total_duration = day_calls['duration_seconds'].sum()
-        avg_duration = total_duration / len(day_calls) if len(day_calls) > 0 else 0
-        
-        total_idle = day_idle['idle_seconds'].sum() if len(day_idle) > 0 else 0
-        avg_idle = total_idle / len(day_idle) if len(day_idle) > 0 else 0
-        max_idle = day_idle['idle_seconds'].max() if len(day_idle) > 0 else 0
-        
-        # Expected working hours: 9am-5pm (8 hours) minus 30 min lunch = 7.5 hours = 27000 seconds
-        expected_working_seconds = 7.5 * 3600
-        
-        # Actual time on calls
-        actual_call_time = total_duration
-        
-        # Calculate total unaccounted time (expected work time - call time)
-        unaccounted_time = expected_working_seconds - actual_call_time
-        
-        # Working hours (actual span)
-        first_call = day_calls['datetime'].min()
-        last_call = day_calls['datetime'].max()
-        last_call_end = last_call + timedelta(seconds=day_calls[day_calls['datetime'] == last_call]['duration_seconds'].iloc[0])
-        actual_span = (last_call_end - first_call).total_seconds()
-        
-        # Productivity based on 7.5 hour work day
-        productive_pct = (total_duration / expected_working_seconds * 100) if expected_working_seconds > 0 else 0
-        idle_pct = (unaccounted_time / expected_working_seconds * 100) if expected_working_seconds > 0 else 0
-        
-        # Performance rating based on 7.5 hour day
-        calls_per_hour = len(day_calls) / 7.5
-        if calls_per_hour >= 8 and productive_pct >= 30:
-            performance = 'Excellent'
-            perf_class = 'excellent'
-        elif calls_per_hour >= 6 and productive_pct >= 20:
-            performance = 'Good'
-            perf_class = 'good'
-        elif calls_per_hour >= 4:
-            performance = 'Average'
-            perf_class = 'average'
-        else:
-            performance = 'Poor'
-            perf_class = 'poor'
-        
-        # Check if they started late or left early
-        start_time = first_call.hour + first_call.minute/60
-        end_time = last_call_end.hour + last_call_end.minute/60
-        late_start = start_time > 9.25  # More than 15 mins late
-        early_finish = end_time < 16.75  # Left more than 15 mins early
-        
-        daily_stats.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'day_of_week': day_calls['day_of_week'].iloc[0],
-            'total_calls': len(day_calls),
-            'answered': answered,
-            'unanswered': unanswered,
-            'answer_rate': (answered / len(day_calls) * 100) if len(day_calls) > 0 else 0,
-            'total_duration': total_duration,
-            'avg_duration': avg_duration,
-            'expected_working_seconds': expected_working_seconds,
-            'unaccounted_time': unaccounted_time,
-            'total_idle': total_idle,
-            'avg_idle': avg_idle,
-            'max_idle': max_idle,
-            'actual_span': actual_span,
-            'productive_pct': productive_pct,
-            'idle_pct': idle_pct,
-            'calls_per_hour': calls_per_hour,
-            'first_call': first_call.strftime('%H:%M'),
-            'last_call': last_call_end.strftime('%H:%M'),
-            'late_start': late_start,
-            'early_finish': early_finish,
-            'performance': performance,
-            'perf_class': perf_class
-        })
+    # Productivity based on 7.5 hour work day
+    daily['productive_pct'] = daily['total_duration'] / expected_working_seconds * 100
+    daily['idle_pct'] = daily['unaccounted_time'] / expected_working_seconds * 100
     
-    return daily_stats
+    # Performance rating based on 7.5 hour day
+    daily['calls_per_hour'] = daily['total_calls'] / 7.5
+    daily['performance'] = rate_days(daily['calls_per_hour'], daily['productive_pct'])
+    daily['perf_class'] = daily['performance'].str.lower()
+    
+    # Check if they started late or left early
+    start_time = first_call.dt.hour + first_call.dt.minute/60
+    end_time = last_call_end.dt.hour + last_call_end.dt.minute/60
+    daily['late_start'] = start_time > 9.25  # More than 15 mins late
+    daily['early_finish'] = end_time < 16.75  # Left more than 15 mins early
+    daily['first_call'] = first_call.dt.strftime('%H:%M')
+    daily['last_call'] = last_call_end.dt.strftime('%H:%M')
+    
+    return daily
 
 # Generate analyses
-hourly_1001 = analyze_by_hour(df_1001, idle_1001, '1001')
-hourly_1002 = analyze_by_hour(df_1002, idle_1002, '1002')
-daily_1001 = analyze_by_day(df_1001, idle_1001, '1001')
-daily_1002 = analyze_by_day(df_1002, idle_1002, '1002')
+hourly = analyze_by_hour(cube)
+daily = analyze_by_day(cube)
+hourly_1001 = hourly[hourly['extension'] == 1001]
+hourly_1002 = hourly[hourly['extension'] == 1002]
+daily_1001 = daily[daily['extension'] == 1001]
+daily_1002 = daily[daily['extension'] == 1002]
 
 def format_time(seconds):
     """Format seconds to HH:MM:SS or MM:SS"""
@@ -252,23 +109,22 @@ def format_time(seconds):
         return f"{int(seconds)}s"
 
 def generate_hourly_table(hourly_stats, agent_name):
-    """Generate HTML table for hourly breakdown"""
-    rows = []
+    """Yield HTML rows for the hourly breakdown (rows of the grouped hourly frame)"""
     current_date = None
     
-    for stat in hourly_stats:
+    for stat in hourly_stats.to_dict('records'):
         # Add date separator row when date changes
         if current_date != stat['date']:
             current_date = stat['date']
-            rows.append(f"""
+            yield f"""
             <tr style="background: #667eea; color: white;">
                 <td colspan="12"><strong>📅 {stat['date']} ({stat['day_of_week']})</strong></td>
             </tr>
-            """)
+            """
         
-        rows.append(f"""
+        yield f"""
         <tr class="{stat['perf_class']}">
-            <td><strong>{stat['hour']}</strong></td>
+            <td><strong>{stat['hour_label']}</strong></td>
             <td>{stat['total_calls']}</td>
             <td>{stat['answered']}</td>
             <td>{stat['unanswered']}</td>
@@ -281,14 +137,11 @@ def generate_hourly_table(hourly_stats, agent_name):
             <td>{stat['idle_count']}</td>
             <td><span class="badge {stat['perf_class']}">{stat['performance']}</span></td>
         </tr>
-        """)
-    
-    return ''.join(rows)
+        """
 
 def generate_daily_table(daily_stats, agent_name):
-    """Generate HTML table for daily breakdown"""
-    rows = []
-    for stat in daily_stats:
+    """Yield HTML rows for the daily breakdown (rows of the grouped daily frame)"""
+    for stat in daily_stats.to_dict('records'):
         # Add warning flags
         time_warning = ''
         if stat['late_start']:
@@ -296,7 +149,7 @@ def generate_daily_table(daily_stats, agent_name):
         if stat['early_finish']:
             time_warning += '⚠️ Early Finish'
         
-        rows.append(f"""
+        yield f"""
         <tr class="{stat['perf_class']}">
             <td><strong>{stat['date']}</strong></td>
             <td>{stat['day_of_week']}</td>
@@ -315,28 +168,27 @@ def generate_daily_table(daily_stats, agent_name):
             <td>{stat['calls_per_hour']:.1f}</td>
             <td><span class="badge {stat['perf_class']}">{stat['performance']}</span></td>
         </tr>
-        """)
-    
-    return ''.join(rows)
+        """
 
 def generate_comparison_section():
     """Generate side-by-side comparison"""
-    total_1001 = len(df_1001)
-    total_1002 = len(df_1002)
+    totals = {ext: (total_calls, total_duration)
+              for ext, total_calls, total_duration, answered in cube.agent_totals()}
+    a_1001 = cube.agent(1001)
+    a_1002 = cube.agent(1002)
     
-    avg_idle_1001 = idle_1001['idle_seconds'].mean() if len(idle_1001) > 0 else 0
-    avg_idle_1002 = idle_1002['idle_seconds'].mean() if len(idle_1002) > 0 else 0
+    total_1001, total_call_time_1001 = totals[1001]
+    total_1002, total_call_time_1002 = totals[1002]
     
-    avg_duration_1001 = df_1001['duration_seconds'].mean()
-    avg_duration_1002 = df_1002['duration_seconds'].mean()
+    avg_idle_1001 = cube.idle[a_1001].sum() / cube.idle_count[a_1001].sum() if cube.idle_count[a_1001].any() else 0
+    avg_idle_1002 = cube.idle[a_1002].sum() / cube.idle_count[a_1002].sum() if cube.idle_count[a_1002].any() else 0
     
-    # Calculate total time on calls
-    total_call_time_1001 = df_1001['duration_seconds'].sum()
-    total_call_time_1002 = df_1002['duration_seconds'].sum()
+    avg_duration_1001 = total_call_time_1001 / total_1001
+    avg_duration_1002 = total_call_time_1002 / total_1002
     
     # Calculate number of working days
-    days_1001 = len(df_1001['date'].unique())
-    days_1002 = len(df_1002['date'].unique())
+    days_1001 = int(np.count_nonzero(cube.calls[a_1001].sum(axis=1)))
+    days_1002 = int(np.count_nonzero(cube.calls[a_1002].sum(axis=1)))
     
     # Expected working time per day = 7.5 hours
     expected_per_day = 7.5 * 3600
@@ -417,7 +269,9 @@ def generate_comparison_section():
     """
 
 # Generate full HTML
-html = f"""
+def generate_html():
+    """Generate the full HTML report, yielding it section by section"""
+    yield f"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -689,7 +543,9 @@ html = f"""
         <div id="comparison" class="tab-content active">
             <div class="section">
                 <h2>Head-to-Head Comparison</h2>
-                {generate_comparison_section()}
+                """
+    yield generate_comparison_section()
+    yield f"""
             </div>
         </div>
         
@@ -718,7 +574,9 @@ html = f"""
                         </tr>
                     </thead>
                     <tbody>
-                        {generate_hourly_table(hourly_1001, '1001')}
+                        """
+    yield from generate_hourly_table(hourly_1001, '1001')
+    yield f"""
                     </tbody>
                 </table>
             </div>
@@ -751,7 +609,9 @@ html = f"""
                         </tr>
                     </thead>
                     <tbody>
-                        {generate_daily_table(daily_1001, '1001')}
+                        """
+    yield from generate_daily_table(daily_1001, '1001')
+    yield f"""
                     </tbody>
                 </table>
             </div>
@@ -782,7 +642,9 @@ html = f"""
                         </tr>
                     </thead>
                     <tbody>
-                        {generate_hourly_table(hourly_1002, '1002')}
+                        """
+    yield from generate_hourly_table(hourly_1002, '1002')
+    yield f"""
                     </tbody>
                 </table>
             </div>
@@ -815,7 +677,9 @@ html = f"""
                         </tr>
                     </thead>
                     <tbody>
-                        {generate_daily_table(daily_1002, '1002')}
+                        """
+    yield from generate_daily_table(daily_1002, '1002')
+    yield f"""
                     </tbody>
                 </table>
             </div>
@@ -843,19 +707,18 @@ html = f"""
 </html>
 """
 
-# Save HTML
+# Stream the HTML into the report and its copy in Downloads
 output_path = '/Users/danielyoung/Desktop/PRODUCTION_READY_ULTIMATE_AI_WORKFLOW_SYSTEM/projects/test_project/_DEV/STREAMS/appliance_insurance_form/OUTPUTS/AGENT_PERFORMANCE_REPORT.html'
 downloads_path = '/Users/danielyoung/Downloads/AGENT_PERFORMANCE_REPORT.html'
+outputs = [output_path, downloads_path]
+if args.output_dir:
+    outputs = [os.path.join(args.output_dir, 'AGENT_PERFORMANCE_REPORT.html')]
 
-with open(output_path, 'w') as f:
-    f.write(html)
-
-with open(downloads_path, 'w') as f:
-    f.write(html)
+write_html(outputs, generate_html())
 
 print("📊 Comprehensive Agent Performance Report Generated!")
-print(f"   📄 {output_path}")
-print(f"   📄 {downloads_path}")
+for path in outputs:
+    print(f"   📄 {path}")
 print("\n✅ Features:")
 print("   - Tabbed interface (Comparison, Ext 1001, Ext 1002)")
 print("   - Hour-by-hour breakdown with performance ratings")
@@ -3,53 +3,239 @@
 Group matched records by customer with totals
 """
 
+import argparse
 import csv
+import heapq
 import os
+import shutil
+import tempfile
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 
-def parse_amount(amount_str):
-    """Parse amount string to float"""
-    if not amount_str:
-        return 0.0
-    try:
-        amount_str = str(amount_str).replace('£', '').replace(',', '').strip()
-        return float(amount_str)
-    except:
-        return 0.0
+import numpy as np
 
-def main():
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    downloads_dir = os.path.expanduser('~/Downloads')
-    
-    input_file = os.path.join(output_dir, 'DDS_MATCHED.csv')
-    output_file = os.path.join(output_dir, 'DDS_GROUPED_BY_CUSTOMER.csv')
+from money import format_pence, parse_pence, to_pence
+
+# Rough in-memory cost of a buffered row beyond its text (list, key and str headers), for --memory-mb
+ROW_OVERHEAD = 120
+CELL_OVERHEAD = 56
+
+# Sorted runs merged at once; more than this are merged in rounds
+MERGE_FAN_IN = 64
+
+# Multi-record customers listed at the end
+SAMPLE_SIZE = 10
+
+# Columns totalled for each customer
+AMOUNT_COLUMNS = ['Total Cost', 'Matched Amount', 'Amount Difference']
+
+def write_run(items, path):
+    """Write (key, row) items to a run file, the key's parts first"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for key, row in items:
+            writer.writerow(list(key) + row)
+
+def read_run(path, key_width):
+    """(key, row) items back from a run file; the last key part is an int"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for record in csv.reader(f):
+            yield tuple(record[:key_width - 1]) + (int(record[key_width - 1]),), record[key_width:]
+
+def external_sort(items, key_width, budget, spill_dir):
+    """Yield (key, row) items sorted by key, holding about budget bytes of rows in memory
+
+    Keys are tuples of key_width parts: strings, then a unique int. Items are
+    sorted in runs that fit the budget, spilled to CSV files in a new directory
+    under spill_dir and merged k ways (in rounds of MERGE_FAN_IN runs).
+    """
+    spill_dir = tempfile.mkdtemp(dir=spill_dir)
+    runs = []
+    buffer = []
+    size = 0
+    for key, row in items:
+        buffer.append((key, row))
+        size += ROW_OVERHEAD + sum(len(part) + CELL_OVERHEAD for part in key[:-1]) + \
+            sum(len(cell) + CELL_OVERHEAD for cell in row)
+        if size >= budget:
+            buffer.sort(key=itemgetter(0))
+            runs.append(os.path.join(spill_dir, f'run{len(runs)}.csv'))
+            write_run(buffer, runs[-1])
+            buffer, size = [], 0
     
-    print("🔄 Grouping customers and calculating totals...\n")
+    buffer.sort(key=itemgetter(0))
+    if not runs:
+        yield from buffer
+        return
+    if buffer:
+        runs.append(os.path.join(spill_dir, f'run{len(runs)}.csv'))
+        write_run(buffer, runs[-1])
+    del buffer
     
-    # Read all records
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
+    round_number = 0
+    while len(runs) > MERGE_FAN_IN:
+        round_number += 1
+        merged = []
+        for start in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[start:start + MERGE_FAN_IN]
+            merged.append(os.path.join(spill_dir, f'merge{round_number}_{len(merged)}.csv'))
+            write_run(heapq.merge(*[read_run(path, key_width) for path in group], key=itemgetter(0)), merged[-1])
+            for path in group:
+                os.remove(path)
+        runs = merged
+    yield from heapq.merge(*[read_run(path, key_width) for path in runs], key=itemgetter(0))
+
+def group_external(input_file, output_file, budget):
+    """Streaming grouping: the same output as the in-memory grouping, with rows
+    held in memory only up to budget bytes
+
+    Rows are external-sorted by (customer, file position). With a Customer ID
+    column, groups are sorted again by their first record's name, as the
+    in-memory grouping orders them. Records, totals and separators are then
+    written in one pass. Returns (customers, customers with multiple records,
+    records, rows written, samples), samples being (name, records, total cost in
+    pence) for the multi-record customers listed at the end.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f, tempfile.TemporaryDirectory() as spill_dir:
+        reader = csv.reader(f)
+        fieldnames = next(reader)
+        width = len(fieldnames)
+        column = {name: i for i, name in reversed(list(enumerate(fieldnames)))}
+        name_idx = column.get('Name')
+        id_idx = column.get('Customer ID')
+        
+        def cells(row):
+            """Row padded (or cut) to the header's width"""
+            return row[:width] + [''] * (width - len(row))
+        
+        def keyed_rows():
+            for index, row in enumerate(reader):
+                row = cells(row)
+                customer_name = row[name_idx].strip() if name_idx is not None else ''
+                if customer_name:
+                    customer_key = (row[id_idx].strip() if id_idx is not None else '') or customer_name
+                    yield (customer_key, index), row
         
-        # Group by customer name
-        customers = defaultdict(list)
-        for row in reader:
-            customer_name = row.get('Name', '').strip()
-            if customer_name:
-                customers[customer_name].append(row)
+        ordered = external_sort(keyed_rows(), 2, budget // 2 if id_idx is not None else budget, spill_dir)
+        if id_idx is not None:
+            # Group order follows each customer's first record's name
+            def by_first_name(items):
+                for customer_key, records in groupby(items, key=lambda item: item[0][0]):
+                    first_name = None
+                    for (_, index), row in records:
+                        if first_name is None:
+                            first_name = row[name_idx].strip()
+                        yield (first_name, customer_key, index), row
+            ordered = ((key[1:], row) for key, row in external_sort(by_first_name(ordered), 3, budget // 2, spill_dir))
+        
+        amount_columns = [column.get(name) for name in AMOUNT_COLUMNS]
+        blank_row = [''] * width
+        unique = multiple = records_count = rows_written = 0
+        samples = []
+        
+        with open(output_file, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.writer(out)
+            writer.writerow(fieldnames)
+            for customer_key, records in groupby(ordered, key=lambda item: item[0][0]):
+                totals = [0, 0, 0]
+                count = 0
+                customer_name = first_index = None
+                for (_, index), row in records:
+                    if customer_name is None:
+                        customer_name, first_index = row[name_idx].strip(), index
+                    writer.writerow(row)
+                    for i, idx in enumerate(amount_columns):
+                        totals[i] += to_pence(row[idx] if idx is not None else '0')
+                    count += 1
+                
+                totals_row = list(blank_row)
+                totals_row[name_idx] = f">>> TOTAL FOR {customer_name} ({count} record{'s' if count > 1 else ''})"
+                for idx, total in zip(amount_columns, totals):
+                    if idx is not None:
+                        totals_row[idx] = format_pence(total)
+                writer.writerow(totals_row)
+                writer.writerow(blank_row)
+                
+                unique += 1
+                records_count += count
+                rows_written += count + 2
+                if count > 1:
+                    multiple += 1
+                    # Largest first, then first seen in the file (as the in-memory listing)
+                    entry = (count, -first_index, customer_name, totals[0])
+                    if len(samples) < SAMPLE_SIZE:
+                        heapq.heappush(samples, entry)
+                    elif entry > samples[0]:
+                        heapq.heapreplace(samples, entry)
     
-    print(f"📊 Found {len(customers)} unique customers")
-    print(f"📝 Total records: {sum(len(records) for records in customers.values())}\n")
+    samples = [(name, count, total) for count, _, name, total in sorted(samples, reverse=True)]
+    return unique, multiple, records_count, rows_written, samples
+
+def print_summary(output_file, downloads_dir, unique, multiple, rows_written, samples):
+    print(f"✅ Grouping complete!")
+    print(f"   👥 Unique customers: {unique}")
+    print(f"   📋 Customers with multiple records: {multiple}")
+    print(f"   📊 Total rows (including totals & blanks): {rows_written}")
+    print(f"\n📄 Output: {output_file}")
+    
+    # Copy to Downloads
+    downloads_output = os.path.join(downloads_dir, 'DDS_GROUPED_BY_CUSTOMER.csv')
+    shutil.copy(output_file, downloads_output)
+    print(f"📄 Also saved to: {downloads_output}")
+    
+    # Show some examples of customers with multiple records
+    print(f"\n📝 Sample customers with multiple records:")
+    for i, (name, count, total) in enumerate(samples, 1):
+        print(f"   {i:2d}. {name}: {count} records, Total: £{format_pence(total)}")
+
+def group_records(fieldnames, rows, pence=None):
+    """In-memory grouping of matched rows (dicts): (output rows with each customer's
+    totals row and blank separator, customers, customers with multiple records,
+    records, samples), samples as for group_external
+
+    pence optionally maps amount columns to their per-row amounts in pence,
+    already parsed; other amount columns are parsed from the rows.
+    """
+    pence = pence or {}
+    # Group by the Customer ID the merge gave each row (the same customer across
+    # sheets), or by customer name for files merged before IDs were added
+    customers = defaultdict(list)
+    positions = defaultdict(list)
+    for position, row in enumerate(rows):
+        customer_name = row.get('Name', '').strip()
+        if customer_name:
+            key = (row.get('Customer ID') or '').strip() or customer_name
+            customers[key].append(row)
+            positions[key].append(position)
     
     # Sort customers by name
-    sorted_customers = sorted(customers.keys())
+    sorted_customers = sorted(customers.keys(), key=lambda key: (customers[key][0]['Name'].strip(), key))
+    
+    # Parse each amount column once (in grouped order) and total it per customer in pence
+    grouped = [record for customer_key in sorted_customers for record in customers[customer_key]]
+    starts = np.cumsum([0] + [len(customers[customer_key]) for customer_key in sorted_customers[:-1]])
+    totals = {}
+    order = [position for customer_key in sorted_customers for position in positions[customer_key]]
+    for name in AMOUNT_COLUMNS:
+        if name in pence:
+            amounts = np.asarray(pence[name], dtype=np.int64)[order]
+        elif name in fieldnames:
+            amounts = parse_pence(map(itemgetter(name), grouped))
+        else:
+            amounts = np.zeros(len(grouped), dtype=np.int64)
+        totals[name] = np.add.reduceat(amounts, starts).tolist() if grouped else []
+    del grouped
     
     # Prepare output
     output_rows = []
     customers_with_multiple = 0
+    total_costs = {}
     
-    for customer_name in sorted_customers:
-        records = customers[customer_name]
+    for g, customer_key in enumerate(sorted_customers):
+        records = customers[customer_key]
+        customer_name = records[0]['Name'].strip()
+        total_costs[customer_key] = totals['Total Cost'][g]
         
         if len(records) > 1:
             customers_with_multiple += 1
@@ -58,17 +244,11 @@ def main():
         for record in records:
             output_rows.append(record)
         
-        # Calculate totals
-        total_cost = sum(parse_amount(r.get('Total Cost', '0')) for r in records)
-        total_matched_amount = sum(parse_amount(r.get('Matched Amount', '0')) for r in records)
-        total_difference = sum(parse_amount(r.get('Amount Difference', '0')) for r in records)
-        
         # Create totals row
         totals_row = {field: '' for field in fieldnames}
         totals_row['Name'] = f">>> TOTAL FOR {customer_name} ({len(records)} record{'s' if len(records) > 1 else ''})"
-        totals_row['Total Cost'] = f"{total_cost:.2f}"
-        totals_row['Matched Amount'] = f"{total_matched_amount:.2f}"
-        totals_row['Amount Difference'] = f"{total_difference:.2f}"
+        for name in AMOUNT_COLUMNS:
+            totals_row[name] = format_pence(totals[name][g])
         
         output_rows.append(totals_row)
         
@@ -76,33 +256,59 @@ def main():
         blank_row = {field: '' for field in fieldnames}
         output_rows.append(blank_row)
     
-    # Write output
-    print(f"💾 Writing grouped data...\n")
+    multi_customers = [(key, len(records)) for key, records in customers.items() if len(records) > 1]
+    multi_customers.sort(key=lambda x: x[1], reverse=True)
+    samples = [(customers[key][0]['Name'].strip(), count, total_costs[key])
+               for key, count in multi_customers[:SAMPLE_SIZE]]
+    records_count = sum(len(records) for records in customers.values())
+    return output_rows, len(customers), customers_with_multiple, records_count, samples
+
+def write_grouped(output_file, fieldnames, output_rows):
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(output_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description='Group matched records by customer with totals')
+    parser.add_argument('--memory-mb', type=float, metavar='MB',
+                        help='stream the grouping through an external sort that holds about this many MB '
+                             'of rows in memory, for inputs too large to load (fractions allowed, e.g. '
+                             '0.05 to force spilling on a small file)')
+    args = parser.parse_args()
+    if args.memory_mb is not None and args.memory_mb <= 0:
+        parser.error('--memory-mb must be positive')
     
-    print(f"✅ Grouping complete!")
-    print(f"   👥 Unique customers: {len(customers)}")
-    print(f"   📋 Customers with multiple records: {customers_with_multiple}")
-    print(f"   📊 Total rows (including totals & blanks): {len(output_rows)}")
-    print(f"\n📄 Output: {output_file}")
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    downloads_dir = os.path.expanduser('~/Downloads')
     
-    # Copy to Downloads
-    import shutil
-    downloads_output = os.path.join(downloads_dir, 'DDS_GROUPED_BY_CUSTOMER.csv')
-    shutil.copy(output_file, downloads_output)
-    print(f"📄 Also saved to: {downloads_output}")
+    input_file = os.path.join(output_dir, 'DDS_MATCHED.csv')
+    output_file = os.path.join(output_dir, 'DDS_GROUPED_BY_CUSTOMER.csv')
     
-    # Show some examples of customers with multiple records
-    print(f"\n📝 Sample customers with multiple records:")
-    multi_customers = [(name, len(records)) for name, records in customers.items() if len(records) > 1]
-    multi_customers.sort(key=lambda x: x[1], reverse=True)
+    print("🔄 Grouping customers and calculating totals...\n")
+    
+    if args.memory_mb:
+        print(f"💾 Writing grouped data (external sort, {args.memory_mb:g} MB budget)...")
+        unique, multiple, records_count, rows_written, samples = group_external(input_file, output_file,
+                                                                               int(args.memory_mb * (1 << 20)))
+        print(f"📊 Found {unique} unique customers")
+        print(f"📝 Total records: {records_count}\n")
+        print_summary(output_file, downloads_dir, unique, multiple, rows_written, samples)
+        return
     
-    for i, (name, count) in enumerate(multi_customers[:10], 1):
-        total = sum(parse_amount(r.get('Total Cost', '0')) for r in customers[name])
-        print(f"   {i:2d}. {name}: {count} records, Total: £{total:.2f}")
+    # Read all records
+    with open(input_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        output_rows, unique, multiple, records_count, samples = group_records(fieldnames, reader)
+    
+    print(f"📊 Found {unique} unique customers")
+    print(f"📝 Total records: {records_count}\n")
+    
+    # Write output
+    print(f"💾 Writing grouped data...\n")
+    write_grouped(output_file, fieldnames, output_rows)
+    print_summary(output_file, downloads_dir, unique, multiple, len(output_rows), samples)
 
 if __name__ == '__main__':
     main()
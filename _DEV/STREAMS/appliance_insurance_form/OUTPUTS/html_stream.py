@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Streaming HTML output for the call reports
+Report generators yield sections and table rows; they are written to every
+output file as they are produced, so a report is never held in memory whole
+"""
+
+import os
+import tempfile
+
+# Bytes buffered per output file before a write reaches disk
+BUFFER_SIZE = 64 * 1024
+
+
+class HtmlWriter:
+    """Buffered UTF-8 writer that copies every fragment to one or more files"""
+
+    def __init__(self, *paths):
+        self.files = []
+        try:
+            for path in paths:
+                self.files.append(open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE))
+        except OSError:
+            self.close()
+            raise
+
+    def write(self, fragment):
+        for f in self.files:
+            f.write(fragment)
+
+    def write_all(self, fragments):
+        """Write an iterable of fragments, flushing after the first so the page head lands at once"""
+        fragments = iter(fragments)
+        for fragment in fragments:
+            self.write(fragment)
+            self.flush()
+            break
+        for fragment in fragments:
+            self.write(fragment)
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_html(paths, fragments):
+    """Stream the fragments a report generator yields into each of the paths"""
+    with HtmlWriter(*paths) as out:
+        out.write_all(fragments)
+
+
+def spool_html(fragments, directory):
+    """Stream fragments into a new file in directory and return its path
+
+    directory should be one the caller removes as a whole (a
+    tempfile.TemporaryDirectory), so spooled files never outlive a failed run.
+    A file whose fragments fail part way is removed here.
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.html', dir=directory, delete=False) as f:
+        path = f.name
+    try:
+        write_html([path], fragments)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def read_chunks(path):
+    """Yield a spooled file's text in BUFFER_SIZE pieces"""
+    with open(path, encoding='utf-8') as f:
+        while True:
+            chunk = f.read(BUFFER_SIZE)
+            if not chunk:
+                break
+            yield chunk
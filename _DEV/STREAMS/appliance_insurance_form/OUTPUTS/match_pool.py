@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Score DDS customers against transactions over a pool of worker processes
+The normalized transaction names, DD References and amounts are encoded into
+shared memory once; each worker decodes them a single time and then scores
+whole chunks of customers, so only customer tokens and results are pickled
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from name_table import NameTable
+
+# Chunks handed out per worker, so a chunk of hard names doesn't leave cores idle
+CHUNKS_PER_WORKER = 4
+
+# Per-process cache of the decoded transactions and the state set up from them
+_worker_state = {}
+
+
+def map_customers(setup, func, items, transaction_names, dd_refs, amounts, context, workers=1):
+    """Run func over chunks of customer items: the merged {customer: result} dict
+
+    setup(transaction_names, dd_refs, amounts, context) builds what customers
+    are scored against; it runs once per worker process. func(state, chunk)
+    scores a list of items and returns a dict keyed by customer. Both must be
+    module-level functions so worker processes can import them, and a
+    customer's result must depend only on its own item, which makes the
+    output the same for any number of workers.
+    """
+    if workers <= 1 or len(items) <= 1:
+        return func(setup(transaction_names, dd_refs, amounts, context), items)
+
+    blocks = []
+    try:
+        spec = []
+        for column in (*_encode(transaction_names.full), *_encode(dd_refs), np.asarray(amounts, dtype=np.int64)):
+            block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(column.shape, column.dtype, buffer=block.buf)[:] = column
+            spec.append((block.name, column.shape, column.dtype.str))
+
+        bounds = np.linspace(0, len(items), workers * CHUNKS_PER_WORKER + 1).astype(int)
+        tasks = [(setup, func, spec, context, items[start:stop])
+                 for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for partial in pool.map(_run_chunk, tasks):
+                results.update(partial)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return results
+
+
+def _encode(strings):
+    """Strings as one UTF-8 byte array plus the offsets where each one starts and ends"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _decode(data, offsets):
+    raw = data.tobytes()
+    return [raw[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def _run_chunk(task):
+    """Worker: decode the shared transactions (once per process), set up and score a chunk"""
+    setup, func, spec, context, chunk = task
+    key = spec[0][0]
+    if key not in _worker_state:
+        columns = []
+        for block_name, shape, dtype in spec:
+            block = shared_memory.SharedMemory(name=block_name)
+            try:
+                columns.append(np.ndarray(shape, np.dtype(dtype), buffer=block.buf).copy())
+            finally:
+                block.close()
+        names, name_offsets, refs, ref_offsets, amounts = columns
+        transaction_names = NameTable.from_normalized(_decode(names, name_offsets))
+        _worker_state.clear()
+        _worker_state[key] = setup(transaction_names, _decode(refs, ref_offsets), amounts.tolist(), context)
+    return func(_worker_state[key], chunk)
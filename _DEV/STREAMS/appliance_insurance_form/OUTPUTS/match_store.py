@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Persisted match state for incremental DDS reconciliation
+Records each customer's key, row fingerprint and match (DD Reference, matched
+transaction, score, tier) plus the fingerprints of the transactions seen, so
+a rerun only scores what changed and keeps earlier assignments as they were
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from name_table import normalize_name
+
+# Bump when the stored layout changes so old stores are ignored
+STORE_VERSION = 2
+
+
+def row_fingerprint(row, fieldnames):
+    """Short hash of a CSV row's values, in column order"""
+    key = '\x1f'.join((row.get(name) or '').strip() for name in fieldnames)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def customer_key(row):
+    """What identifies a customer between DDS sheets: plan number, normalized name and postcode"""
+    return '|'.join([(row.get('Plan number') or '').strip(),
+                     normalize_name(row.get('Name', '')),
+                     ''.join((row.get('Postcode') or '').split()).upper()])
+
+
+def unique_keys(keys):
+    """Keys made unique by numbering repeats (key, key#2, key#3, ...) in file order"""
+    seen = Counter()
+    unique = []
+    for key in keys:
+        seen[key] += 1
+        unique.append(key if seen[key] == 1 else f'{key}#{seen[key]}')
+    return unique
+
+
+def read_store(store_file, settings):
+    """The stored state if it was written by this layout with the same settings, else None"""
+    if not os.path.exists(store_file):
+        return None
+    try:
+        with open(store_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['version'] != STORE_VERSION or state['settings'] != settings:
+            return None
+        return state
+    except (OSError, ValueError, KeyError):
+        # Unreadable or from an older layout - treat as missing and rebuild
+        return None
+
+
+def write_store(store_file, settings, customer_keys, customer_prints, transaction_prints, matches):
+    """Write the state atomically; matches maps customer -> stored match dict (absent if unmatched)"""
+    os.makedirs(os.path.dirname(store_file), exist_ok=True)
+    state = {
+        'version': STORE_VERSION,
+        'settings': settings,
+        'transactions': transaction_prints,
+        'customers': {key: {'fingerprint': fingerprint, 'match': matches.get(i)}
+                      for i, (key, fingerprint) in enumerate(zip(customer_keys, customer_prints))}
+    }
+    tmp_file = f'{store_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, store_file)
+
+
+def carry_forward(state, customer_keys, customer_prints, transaction_prints, dd_refs, customer_amounts, amounts,
+                  accept=None):
+    """What a rerun can reuse from the stored state: (kept, unmatched, fresh)
+
+    kept       {customer: (transaction, stored match)} for unchanged customers whose
+               matched transaction is still in the export, or if that row changed,
+               the one row under the same DD Reference closest in amount (a tie
+               is ambiguous and not kept); accept(customer, transaction, match), if
+               given, has the last word
+    unmatched  unchanged customers that matched nothing last time
+    fresh      boolean mask of the transactions those customers have not been scored
+               against: rows not seen before, and rows under a reference no longer kept
+
+    Customers in neither are matched from scratch.
+    """
+    by_ref = defaultdict(list)
+    by_print = {}
+    for idx, (dd_ref, fingerprint) in enumerate(zip(dd_refs, transaction_prints)):
+        if dd_ref:
+            by_ref[dd_ref].append(idx)
+        by_print.setdefault(fingerprint, idx)
+
+    stored = state['customers']
+    kept = {}
+    unmatched = []
+    for i, (key, fingerprint) in enumerate(zip(customer_keys, customer_prints)):
+        entry = stored.get(key)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            continue
+        match = entry['match']
+        if match is None:
+            unmatched.append(i)
+            continue
+        if match['transaction'] in by_print:
+            idx = by_print[match['transaction']]
+        elif match['dd_reference'] in by_ref:
+            # The matched row changed (e.g. a corrected amount): fall back to its reference
+            gaps = sorted((abs(customer_amounts[i] - amounts[idx]), idx) for idx in by_ref[match['dd_reference']])
+            if len(gaps) > 1 and gaps[0][0] == gaps[1][0]:
+                continue
+            idx = gaps[0][1]
+        else:
+            continue
+        if accept is None or accept(i, idx, match):
+            kept[i] = (idx, match)
+
+    seen = set(state['transactions'])
+    kept_refs = {match['dd_reference'] for _, match in kept.values()}
+    released = {entry['match']['dd_reference'] for entry in stored.values()
+                if entry['match'] and entry['match']['dd_reference']} - kept_refs
+    fresh = np.array([fingerprint not in seen or dd_ref in released
+                      for fingerprint, dd_ref in zip(transaction_prints, dd_refs)], dtype=bool)
+    return kept, unmatched, fresh
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Exact-join tiers for DDS matching
+Before any fuzzy scoring, customers are joined to transactions on keys that
+identify them outright: DD Reference or bank details wherever both files carry
+them, then normalized full name plus amount. Each join is a dict lookup per
+customer; only customers left over go on to the fuzzy scorer
+"""
+
+from collections import defaultdict
+
+from dds_sources import ACCOUNT_NUMBER_HEADERS, SORT_CODE_HEADERS, header_key
+
+# Match Tier values, in the order the tiers run
+TIER_DD_REFERENCE = 'DD Reference'
+TIER_BANK_DETAILS = 'Bank Details'
+TIER_NAME_AMOUNT = 'Name + Amount'
+TIER_FUZZY = 'Fuzzy Name'
+
+# Header spellings (as header_key gives them) recognised for the DD Reference join;
+# the bank detail spellings are dds_sources' own, so the two can't drift apart
+DD_REFERENCE_HEADERS = ('ddreference', 'ddref')
+
+
+def find_column(fieldnames, aliases):
+    """First header matching one of the aliases (ignoring case, spaces and punctuation), or None"""
+    for name in fieldnames or ():
+        if header_key(name) in aliases:
+            return name
+    return None
+
+
+def digits(value):
+    return ''.join(c for c in value or '' if c.isdigit())
+
+
+def bank_key(sort_code, account_number):
+    """(sort code, account number) as zero-padded digit strings, or None if either is blank"""
+    sort_code, account_number = digits(sort_code), digits(account_number)
+    if not sort_code.strip('0') or not account_number.strip('0'):
+        return None
+    return (sort_code.zfill(6), account_number.zfill(8))
+
+
+def exact_tiers(customers, customer_fields, transactions, transaction_fields,
+                customer_names, transaction_names, customer_amounts, amounts):
+    """(tier, customer keys, transaction keys) for each exact tier both files support
+
+    A key of None never joins (blank reference, missing bank details, no name).
+    """
+    tiers = []
+
+    customer_ref = find_column(customer_fields, DD_REFERENCE_HEADERS)
+    transaction_ref = find_column(transaction_fields, DD_REFERENCE_HEADERS)
+    if customer_ref and transaction_ref:
+        tiers.append((TIER_DD_REFERENCE,
+                      [(c.get(customer_ref) or '').strip() or None for c in customers],
+                      [(t.get(transaction_ref) or '').strip() or None for t in transactions]))
+
+    columns = [find_column(fields, aliases)
+               for fields in (customer_fields, transaction_fields)
+               for aliases in (SORT_CODE_HEADERS, ACCOUNT_NUMBER_HEADERS)]
+    if all(columns):
+        customer_sort, customer_account, transaction_sort, transaction_account = columns
+        tiers.append((TIER_BANK_DETAILS,
+                      [bank_key(c.get(customer_sort), c.get(customer_account)) for c in customers],
+                      [bank_key(t.get(transaction_sort), t.get(transaction_account)) for t in transactions]))
+
+    # Amounts are whole pence, so equal amounts always share a key
+    tiers.append((TIER_NAME_AMOUNT,
+                  [(full, amount) if full else None
+                   for full, amount in zip(customer_names.full, customer_amounts)],
+                  [(full, amount) if full else None
+                   for full, amount in zip(transaction_names.full, amounts)]))
+    return tiers
+
+
+def exact_join(customer_keys, transaction_keys, customer_amounts, amounts, dd_refs, used_dd_references):
+    """{customer: transaction} for customers whose key some transaction shares
+
+    Customers go in file order. Each takes the transaction with its key that
+    is closest in amount (then first in the file) and whose DD Reference is
+    still unclaimed, and claims that reference.
+    """
+    by_key = defaultdict(list)
+    for idx, key in enumerate(transaction_keys):
+        if key is not None:
+            by_key[key].append(idx)
+
+    joined = {}
+    for i, key in enumerate(customer_keys):
+        if key is None or key not in by_key:
+            continue
+        free = [idx for idx in by_key[key] if not (dd_refs[idx] and dd_refs[idx] in used_dd_references)]
+        if not free:
+            continue
+        idx = min(free, key=lambda idx: (abs(customer_amounts[i] - amounts[idx]), idx))
+        if dd_refs[idx]:
+            used_dd_references.add(dd_refs[idx])
+        joined[i] = idx
+    return joined
@@ -3,48 +3,43 @@
 Match DDS customers with transactions using fuzzy name matching
 """
 
+import argparse
 import csv
+import hashlib
 import os
 from difflib import SequenceMatcher
-from collections import defaultdict
-
-def normalize_name(name):
-    """Normalize name for matching: lowercase, remove extra spaces, punctuation"""
-    if not name:
-        return ""
-    # Remove common titles
-    titles = ['mr', 'mrs', 'ms', 'miss', 'dr', 'mr.', 'mrs.', 'ms.', 'miss.', 'dr.']
-    name = name.lower().strip()
-    
-    # Remove punctuation
-    name = name.replace('.', ' ').replace(',', ' ')
-    
-    # Remove titles
-    words = name.split()
-    words = [w for w in words if w not in titles]
-    
-    return ' '.join(words)
-
-def extract_first_last(name):
-    """Extract first and last name from full name"""
-    name = normalize_name(name)
-    if not name:
-        return ('', '')
-    
-    parts = name.split()
-    if len(parts) == 0:
-        return ('', '')
-    elif len(parts) == 1:
-        return (parts[0], '')
-    else:
-        # First word is first name, last word is last name
-        return (parts[0], parts[-1])
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import data_store
+from assignment import max_weight_matching
+from match_pool import map_customers
+from match_store import carry_forward, customer_key, read_store, row_fingerprint, unique_keys, write_store
+from match_tiers import TIER_FUZZY, exact_join, exact_tiers
+from money import format_pence, parse_pence, to_pence
+from name_blocking import BlockingIndex
+from name_similarity import lcs_match_score
+from name_table import NameTable, extract_first_last
+from ngram_join import TrigramIndex
+from top_candidates import TopCandidates
+
+# Transactions export, in ~/Downloads
+TRANSACTIONS_EXPORT = 'DEBIT DIRECT TRANSACTIONS - Transactions (1) (1).csv'
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.match_state', 'match_store.json')
+
+# Minimum name score for a transaction to count as a match
+MATCH_THRESHOLD = 0.6
+
+# Name scores are rounded to this many units per 1.0 for optimal assignment weights
+SCORE_UNITS = 10 ** 9
 
 def fuzzy_match_score(name1, name2):
     """Calculate fuzzy match score between two names (0-1)"""
-    first1, last1 = extract_first_last(name1)
-    first2, last2 = extract_first_last(name2)
-    
+    return token_match_score(*extract_first_last(name1), *extract_first_last(name2))
+
+def token_match_score(first1, last1, first2, last2):
+    """fuzzy_match_score for names already split into normalized first / last tokens"""
     # Match on first name and last name separately
     first_score = SequenceMatcher(None, first1, first2).ratio()
     last_score = SequenceMatcher(None, last1, last2).ratio()
@@ -52,37 +47,252 @@ def fuzzy_match_score(name1, name2):
     # Weight last name more heavily (60% last, 40% first)
     return (last_score * 0.6) + (first_score * 0.4)
 
-def parse_amount(amount_str):
-    """Parse amount string to float"""
-    if not amount_str:
-        return 0.0
-    try:
-        # Remove currency symbols and clean
-        amount_str = str(amount_str).replace('£', '').replace(',', '').strip()
-        return float(amount_str)
-    except:
-        return 0.0
+def sequence_score(first1, last1, first2, last2, floor):
+    """Exact token_match_score, or None when the LCS kernel shows the pair can't reach floor"""
+    if lcs_match_score(first1, last1, first2, last2, floor) is None:
+        return None
+    return token_match_score(first1, last1, first2, last2)
 
-def main():
-    downloads_dir = os.path.expanduser('~/Downloads')
-    output_dir = os.path.dirname(os.path.abspath(__file__))
+def unfiltered_score(first1, last1, first2, last2, floor):
+    """token_match_score of every pair, with no kernel cutoff (brute-force verification)"""
+    return token_match_score(first1, last1, first2, last2)
+
+# Scorers selectable with --scorer; each returns a score or None below floor
+SCORERS = {
+    # Current SequenceMatcher scores, skipping pairs the LCS kernel rules out
+    'sequence': sequence_score,
+    # LCS kernel alone: faster, within the tolerance documented in name_similarity
+    'lcs': lcs_match_score
+}
+
+def find_matches(first, last, customer_amount, candidates, transaction_data, top, used_dd_references=()):
+    """Score the candidate transactions against a customer's name tokens, pushing those
+    good enough onto top (a TopCandidates)"""
+    names, dd_refs, amounts, score = transaction_data
+    for idx in candidates:
+        idx = int(idx)
+        dd_ref = dd_refs[idx]
+        
+        # Skip if this DD Reference has already been matched
+        if dd_ref and dd_ref in used_dd_references:
+            continue
+        
+        # Calculate name match score (the scorer may give up below the weakest candidate kept)
+        floor = top.floor()
+        name_score = score(first, last, names.first[idx], names.last[idx], floor)
+        
+        # Only consider if name similarity is reasonable (>0.6)
+        if name_score is not None and name_score >= floor:
+            top.push(name_score, abs(customer_amount - amounts[idx]), idx)
+
+def customer_matches(first, last, customer_amount, index, transaction_data, k, used_dd_references=(),
+                     allowed=None):
+    """The k best transactions (all of them for k=None) scoring at least the threshold
+    against a customer's name tokens, as (score, amount_diff, index) tuples, best first
+
+    allowed, if given, is an array of the only transaction indices to consider.
+    """
+    top = TopCandidates(k, MATCH_THRESHOLD)
+    if index is None:
+        candidates = range(len(transaction_data[0])) if allowed is None else allowed
+        find_matches(first, last, customer_amount, candidates, transaction_data, top, used_dd_references)
+        return top.ranked()
     
-    # Input files
-    customers_file = os.path.join(output_dir, 'DDS_COMBINED.csv')
-    transactions_file = os.path.join(downloads_dir, 'DEBIT DIRECT TRANSACTIONS - Transactions (1) (1).csv')
-    output_file = os.path.join(output_dir, 'DDS_MATCHED.csv')
+    bounds, in_block = index.lookup(first, last)
+    if allowed is not None:
+        # Transactions not allowed are out of reach
+        reachable = np.zeros(len(bounds), dtype=bool)
+        reachable[allowed] = True
+        bounds = np.where(reachable, bounds, -1.0)
+    find_matches(first, last, customer_amount, np.flatnonzero(in_block & (bounds >= MATCH_THRESHOLD)),
+                 transaction_data, top, used_dd_references)
+    # Transactions outside the blocks only matter if they could displace a candidate kept
+    find_matches(first, last, customer_amount, np.flatnonzero(~in_block & (bounds >= top.floor())),
+                 transaction_data, top, used_dd_references)
+    return top.ranked()
+
+def matching_state(transaction_names, dd_refs, amounts, context):
+    """What a worker scores customers against: (index, transaction_data, k, used DD References)"""
+    score, blocked, k, used_dd_references = context
+    index = BlockingIndex(transaction_names.first, transaction_names.last) if blocked else None
+    return index, (transaction_names, dd_refs, amounts, score), k, used_dd_references
+
+def score_chunk(state, chunk):
+    """customer_matches for a chunk of (customer, first, last, amount, allowed) items, in a worker"""
+    index, transaction_data, k, used_dd_references = state
+    return {i: customer_matches(first, last, amount, index, transaction_data, k, used_dd_references, allowed)
+            for i, first, last, amount, allowed in chunk}
+
+def tie_break(customer, dd_ref):
+    """Stable 32-bit value for a customer row and DD Reference, used to choose
+    between equally good assignments without depending on row order"""
+    key = '\x1f'.join(str(value) for value in customer.values()) + '\x00' + dd_ref
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=4).digest(), 'big')
+
+def shortlist(match, ranked, dd_refs, k):
+    """The match followed by up to k-1 runner-ups from ranked, one per DD Reference
+    (never the match's own reference; transactions without one are all kept)"""
+    seen = {dd_refs[match[2]]}
+    runner_ups = []
+    for candidate in ranked:
+        dd_ref = dd_refs[candidate[2]]
+        if candidate == match or (dd_ref and dd_ref in seen):
+            continue
+        seen.add(dd_ref)
+        runner_ups.append(candidate)
+    return [match] + runner_ups[:k - 1]
+
+def greedy_assignment(customers, pending, customer_names, customer_amounts, index, transaction_data,
+                      used_dd_references, k, scored=None, allowed=None):
+    """Pending customers in file order each take their best match whose DD Reference is still free
+
+    allowed maps customers to an array of the only transactions they may match.
+    scored, if given, holds each customer's customer_matches computed up front
+    (by worker processes) against the references free before this walk; they
+    are filtered against the references claimed since, so the result is the same.
+    Returns {customer: up to k (score, amount_diff, index) candidates}, the match first.
+    """
+    dd_refs = transaction_data[1]
+    shortlists = {}
+    for i in pending:
+        ranked = None
+        if scored is not None:
+            ranked = [match for match in scored[i]
+                      if not (dd_refs[match[2]] and dd_refs[match[2]] in used_dd_references)]
+            # A full list that lost candidates may be hiding free ones beyond its k: score again
+            if len(ranked) < len(scored[i]) == k:
+                ranked = None
+        if ranked is None:
+            first, last = customer_names.tokens(i)
+            ranked = customer_matches(first, last, customer_amounts[i], index, transaction_data, k,
+                                      used_dd_references, (allowed or {}).get(i))
+        if not ranked:
+            continue
+        
+        # Mark DD Reference as used (if it exists)
+        dd_ref = dd_refs[ranked[0][2]]
+        if dd_ref:
+            used_dd_references.add(dd_ref)
+        shortlists[i] = shortlist(ranked[0], ranked, dd_refs, k)
+    return shortlists
+
+def optimal_assignment(customers, pending, customer_names, customer_amounts, index, transaction_data,
+                       used_dd_references, k, scored=None, allowed=None):
+    """Matches for the pending customers with the highest total name score (then smallest
+    total amount difference) that use each free DD Reference at most once, whatever the file order
+
+    allowed maps customers to an array of the only transactions they may match.
+    scored, if given, holds every candidate of each customer (customer_matches
+    with k=None), computed up front by worker processes.
+    Returns {customer: up to k (score, amount_diff, index) candidates}, the match first.
+    """
+    dd_refs = transaction_data[1]
+    rows = list(pending)
+    if scored is None:
+        candidates = [customer_matches(*customer_names.tokens(i), customer_amounts[i], index, transaction_data,
+                                       None, used_dd_references, (allowed or {}).get(i))
+                      for i in rows]
+    else:
+        candidates = [scored[i] for i in rows]
     
-    print("🔄 Matching customers with transactions...\n")
+    # Integer weights: name score first, then total amount difference (in pence), then tie_break
+    scale = max([diff for ranked in candidates for _, diff, _ in ranked] + [0]) * len(rows) + 1
+    tie_scale = len(rows) << 32
+    weight = lambda match, tie: (round(match[0] * SCORE_UNITS) * scale - match[1]) * tie_scale + tie
+    
+    # Graph: customer rows x DD References, each edge the customer's best transaction under that
+    # reference; transactions without a reference never conflict, so the best of those is a fallback
+    columns = {}
+    edges, fallback, choices = [], [], []
+    for i, ranked in zip(rows, candidates):
+        by_ref, free = {}, None
+        for match in ranked:
+            dd_ref = dd_refs[match[2]]
+            if not dd_ref:
+                if free is None:
+                    free = match
+            elif dd_ref not in by_ref:
+                by_ref[dd_ref] = match
+        edges.append([(columns.setdefault(ref, len(columns)), weight(match, tie_break(customers[i], ref)))
+                      for ref, match in by_ref.items()])
+        fallback.append(weight(free, tie_break(customers[i], '')) if free else 0)
+        choices.append((by_ref, free))
     
-    # Load transactions
+    refs = list(columns)
+    shortlists = {}
+    for i, column, ranked, (by_ref, free) in zip(rows, max_weight_matching(edges, len(refs), fallback),
+                                                 candidates, choices):
+        chosen = by_ref[refs[column]] if column >= 0 else free
+        if chosen:
+            shortlists[i] = shortlist(chosen, ranked, dd_refs, k)
+            if dd_refs[chosen[2]]:
+                used_dd_references.add(dd_refs[chosen[2]])
+    return shortlists
+
+def describe_candidate(transaction, name_score, amount):
+    """Runner-up as shown for review: DD Reference, account name, score and amount (in pence)"""
+    return (f"{transaction.get('DD Reference', '').strip() or '(no ref)'} "
+            f"{transaction.get('Account Name', '').strip()} "
+            f"({name_score:.2f}, £{format_pence(amount)})")
+
+ASSIGNMENTS = {
+    'greedy': greedy_assignment,
+    'optimal': optimal_assignment
+}
+
+def add_match_arguments(parser):
+    """The matching options, on parser (shared with the pipeline runner)"""
+    parser.add_argument('--brute-force', action='store_true',
+                        help='score every customer against every transaction instead of using the blocking index (slow; for verification)')
+    parser.add_argument('--scorer', choices=sorted(SCORERS), default='sequence',
+                        help="name scorer: 'sequence' gives the established SequenceMatcher scores, "
+                             "'lcs' the faster calibrated kernel")
+    parser.add_argument('--assignment', choices=sorted(ASSIGNMENTS), default='greedy',
+                        help="'greedy' lets customers take their best match in file order; 'optimal' maximises "
+                             "the total name score over all customers, independent of row order")
+    parser.add_argument('--fuzzy-only', action='store_true',
+                        help='skip the exact DD Reference / bank details / name + amount tiers and fuzzy match everyone')
+    parser.add_argument('--candidates', type=int, default=3,
+                        help='best candidates kept per fuzzy-matched customer; all but the match are listed as runner-ups')
+    parser.add_argument('--ngram', type=int, metavar='K',
+                        help="fuzzy score each customer only against its K nearest transaction names by "
+                             "character-trigram TF-IDF cosine (approximate; for very large reconciliations)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='score customers in this many processes (output is the same for any count)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='ignore the stored matches from the last run and match every customer from scratch')
+    parser.add_argument('--db', action='store_true',
+                        help='read the transactions through the SQLite store (data_store.py), loading the export '
+                             'into it if it changed, and store the matched customers there')
+    return parser
+
+def check_match_arguments(parser, args):
+    """Exit with a usage error for option combinations add_match_arguments allows but matching can't use"""
+    if args.candidates < 1:
+        parser.error('--candidates must be at least 1')
+    if args.ngram is not None and (args.ngram < 1 or args.brute_force):
+        parser.error('--ngram needs K of at least 1 and cannot be combined with --brute-force')
+
+def load_transactions(transactions_file, db=False):
+    """(transactions, fieldnames) from the transactions export, without New Instruction records
+    (with db, filtered in SQL from the SQLite store)"""
     print("📂 Loading transactions...")
+    if db:
+        conn = data_store.connect()
+        source = data_store.load_transactions(conn, transactions_file)
+        transactions, transaction_fields, excluded_count = data_store.select_transactions(conn, source)
+        conn.close()
+        print(f"   ✅ Loaded {len(transactions)} transactions")
+        print(f"   ❌ Excluded {excluded_count} new instruction records (Bacs Code: 0N)\n")
+        return transactions, transaction_fields
     transactions = []
     excluded_count = 0
     with open(transactions_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
+        transaction_fields = reader.fieldnames
         for row in reader:
             bacs_code = row.get('Bacs Code', '').strip().upper()
-            amount = parse_amount(row.get('Amount', '0'))
+            amount = to_pence(row.get('Amount', '0'))
             
             # Exclude "New Instruction" transactions (Bacs Code = "0N" and Amount = 0)
             if bacs_code == '0N' or (bacs_code == '0N' and amount == 0):
@@ -94,16 +304,46 @@ def main():
     print(f"   ✅ Loaded {len(transactions)} transactions")
     print(f"   ❌ Excluded {excluded_count} new instruction records (Bacs Code: 0N)\n")
     
-    # Load customers
-    print("📂 Loading customers...")
-    customers = []
-    with open(customers_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-        for row in reader:
-            customers.append(row)
+    return transactions, transaction_fields
+
+def match_customers(customers, fieldnames, transactions, transaction_fields, args, store_file, pence=None):
+    """Match customer rows (dicts) to transactions, adding the match columns to each row
+
+    args holds the matching options (add_match_arguments). Returns (fieldnames
+    with the match columns, {customer: tier} of the matched customers, matched
+    count, store state); pass the store state to write_store once the output is
+    safely written, so the next run carries these matches forward.
+
+    pence, if given, maps money columns to their per-row amounts in pence: a
+    'Total Cost' already parsed is used as is, and 'Matched Amount' and
+    'Amount Difference' are added for the new columns (0 where unmatched).
+    """
+    # Fingerprint the input rows (before match columns are added) to tell what changed since the last run
+    store_keys = unique_keys(customer_key(c) for c in customers)
+    customer_prints = [row_fingerprint(c, fieldnames) for c in customers]
+    transaction_prints = unique_keys(row_fingerprint(t, transaction_fields) for t in transactions)
+    # Stored matches only carry over between runs that would have matched the same way
+    # (--candidates changes the runner-up lists, --ngram which transactions a customer is scored against)
+    settings = {'scorer': args.scorer, 'assignment': args.assignment, 'fuzzy_only': args.fuzzy_only,
+                'candidates': args.candidates, 'ngram': args.ngram, 'threshold': MATCH_THRESHOLD}
     
-    print(f"   ✅ Loaded {len(customers)} customers\n")
+    # Normalize every name once; scoring works on the tokens
+    customer_names = NameTable(c.get('Name', '') for c in customers)
+    transaction_names = NameTable(t.get('Account Name', '') for t in transactions)
+    dd_refs = [t.get('DD Reference', '').strip() for t in transactions]
+    # Amounts in whole pence, each column parsed in one go
+    amounts = parse_pence(t.get('Amount', '0') for t in transactions).tolist()
+    
+    # Index transaction names by block so each customer is only scored against
+    # transactions that could reach the threshold (unless --ngram shortlists them instead)
+    blocked = not args.brute_force and args.ngram is None
+    index = None
+    if blocked:
+        index = BlockingIndex(transaction_names.first, transaction_names.last)
+    
+    score = SCORERS[args.scorer]
+    if args.brute_force and args.scorer == 'sequence':
+        score = unfiltered_score
     
     # New fieldnames with transaction columns
     new_fieldnames = list(fieldnames) + [
@@ -111,88 +351,189 @@ def main():
         'Matched Collection Date',
         'Matched Amount',
         'Amount Difference',
-        'Match Score'
+        'Match Score',
+        'Match Tier',
+        'Runner-up Candidates'
     ]
     
-    # Track which DD References have been used (not transaction index)
-    used_dd_references = set()
+    if pence is not None and 'Total Cost' in pence:
+        customer_amounts = pence['Total Cost']
+    else:
+        customer_amounts = parse_pence(c.get('Total Cost', '0') for c in customers).tolist()
+    matched_amounts = [0] * len(customers)
+    amount_differences = [0] * len(customers)
+    transaction_data = (transaction_names, dd_refs, amounts, score)
     
     print("🔍 Matching customers to transactions...\n")
     print("⚠️  Each DD Reference will be matched to only ONE customer\n")
-    matched_count = 0
     
-    # Match each customer
-    for customer in customers:
-        customer_name = customer.get('Name', '')
-        customer_amount = parse_amount(customer.get('Total Cost', '0'))
-        
-        if not customer_name.strip():
-            # No name, can't match
-            customer['Matched DD Reference'] = ''
-            customer['Matched Collection Date'] = ''
-            customer['Matched Amount'] = ''
-            customer['Amount Difference'] = ''
-            customer['Match Score'] = ''
-            continue
-        
-        # Find all potential matches
-        matches = []
-        for idx, transaction in enumerate(transactions):
-            dd_ref = transaction.get('DD Reference', '').strip()
-            
-            # Skip if this DD Reference has already been matched
-            if dd_ref and dd_ref in used_dd_references:
-                continue
-            
-            transaction_name = transaction.get('Account Name', '')
-            transaction_amount = parse_amount(transaction.get('Amount', '0'))
-            
-            # Calculate name match score
-            name_score = fuzzy_match_score(customer_name, transaction_name)
-            
-            # Only consider if name similarity is reasonable (>0.6)
-            if name_score >= 0.6:
-                # Calculate amount difference
-                amount_diff = abs(customer_amount - transaction_amount)
-                
-                matches.append({
-                    'index': idx,
-                    'dd_ref': dd_ref,
-                    'name_score': name_score,
-                    'amount_diff': amount_diff,
-                    'transaction': transaction
-                })
+    # Track which DD References have been used (not transaction index)
+    used_dd_references = set()
+    shortlists = {}
+    tier_of = {}
+    stored_matches = {}
+    allowed = {}
+    
+    # Unchanged customers keep last run's match; those that matched nothing are only
+    # scored against transactions they haven't been scored against before
+    state = None if args.rebuild else read_store(store_file, settings)
+    if state:
+        def still_matches(i, idx, match):
+            """Keep a stored match only if this run would accept it: same scorer, and a name
+            score at the threshold (anything else is matched again, as a rebuild would)"""
+            return (match.get('scorer') == args.scorer and
+                    score(*customer_names.tokens(i), *transaction_names.tokens(idx), 0.0) >= MATCH_THRESHOLD)
         
-        # Find best match (highest name score, then closest amount)
-        if matches:
-            # Sort by name score (desc), then amount difference (asc)
-            matches.sort(key=lambda x: (-x['name_score'], x['amount_diff']))
-            best_match = matches[0]
-            
-            # Mark DD Reference as used (if it exists)
-            if best_match['dd_ref']:
-                used_dd_references.add(best_match['dd_ref'])
-            
+        kept, unmatched, fresh = carry_forward(state, store_keys, customer_prints, transaction_prints,
+                                               dd_refs, customer_amounts, amounts, still_matches)
+        for i, (idx, match) in kept.items():
+            name_score = score(*customer_names.tokens(i), *transaction_names.tokens(idx), 0.0)
+            shortlists[i] = [(name_score, abs(customer_amounts[i] - amounts[idx]), idx)]
+            tier_of[i] = match['tier']
+            stored_matches[i] = match
+            if dd_refs[idx]:
+                used_dd_references.add(dd_refs[idx])
+        allowed = dict.fromkeys(unmatched, np.flatnonzero(fresh))
+        print(f"   ♻️  Kept {len(kept)} matches from the last run; {len(unmatched)} unchanged unmatched customers "
+              f"only scored against {int(fresh.sum())} new or released transactions")
+    
+    # Exact tiers first: a hash join per key both files carry
+    if not args.fuzzy_only:
+        for tier, customer_keys, transaction_keys in exact_tiers(customers, fieldnames, transactions, transaction_fields,
+                                                                 customer_names, transaction_names,
+                                                                 customer_amounts, amounts):
+            pending_keys = [None if i in shortlists else key for i, key in enumerate(customer_keys)]
+            joined = exact_join(pending_keys, transaction_keys, customer_amounts, amounts, dd_refs, used_dd_references)
+            for i, idx in joined.items():
+                name_score = score(*customer_names.tokens(i), *transaction_names.tokens(idx), 0.0)
+                shortlists[i] = [(name_score, abs(customer_amounts[i] - amounts[idx]), idx)]
+                tier_of[i] = tier
+            print(f"   🔗 {tier}: {len(joined)} exact matches")
+    
+    # Fuzzy name matching for everyone left (no name, can't match)
+    pending = [i for i, c in enumerate(customers) if i not in shortlists and c.get('Name', '').strip()]
+    print(f"   🔍 Fuzzy matching {len(pending)} remaining customers\n")
+    
+    # Trigram similarity join: every pending customer's K nearest distinct transaction names
+    # in one batch of sparse products; only the transactions under those names are fuzzy scored
+    if args.ngram is not None:
+        # dtype=str so an empty export still gives string names and integer indices
+        texts, name_of = np.unique(np.array([f'{first} {last}' for first, last in zip(transaction_names.first,
+                                                                                     transaction_names.last)],
+                                            dtype=str), return_inverse=True)
+        by_name = np.argsort(name_of, kind='stable')
+        name_starts = np.searchsorted(name_of[by_name], np.arange(len(texts) + 1))
+        neighbours = TrigramIndex(texts.tolist()).top_k([' '.join(customer_names.tokens(i)) for i in pending],
+                                                        args.ngram)
+        for i, nearest in zip(pending, neighbours):
+            rows = np.sort(np.concatenate([by_name[name_starts[n]:name_starts[n + 1]] for n in nearest] +
+                                          [np.zeros(0, dtype=np.int64)]))
+            allowed[i] = np.intersect1d(rows, allowed[i]) if i in allowed else rows
+    
+    # Score in parallel against the references still free; the assignment then
+    # resolves DD Reference conflicts in one place, exactly as it would sequentially
+    scored = None
+    if args.workers > 1:
+        # Optimal assignment weighs every candidate, greedy only the best k
+        k = None if args.assignment == 'optimal' else args.candidates
+        items = [(i, *customer_names.tokens(i), customer_amounts[i], allowed.get(i)) for i in pending]
+        scored = map_customers(matching_state, score_chunk, items, transaction_names, dd_refs, amounts,
+                               (score, blocked, k, frozenset(used_dd_references)), args.workers)
+    
+    fuzzy_matches = ASSIGNMENTS[args.assignment](customers, pending, customer_names, customer_amounts, index,
+                                                 transaction_data, used_dd_references, args.candidates, scored,
+                                                 allowed)
+    shortlists.update(fuzzy_matches)
+    tier_of.update(dict.fromkeys(fuzzy_matches, TIER_FUZZY))
+    matched_count = 0
+    matches = {}
+    
+    for i, (customer, customer_amount) in enumerate(zip(customers, customer_amounts)):
+        shortlist = shortlists.get(i)
+        if shortlist:
             # Add matched transaction data
-            trans = best_match['transaction']
+            name_score, _, idx = shortlist[0]
+            trans = transactions[idx]
             customer['Matched DD Reference'] = trans.get('DD Reference', '')
             customer['Matched Collection Date'] = trans.get('Collection Date', '')
             customer['Matched Amount'] = trans.get('Amount', '')
             
             # Calculate difference
-            matched_amount = parse_amount(trans.get('Amount', '0'))
-            diff = customer_amount - matched_amount
-            customer['Amount Difference'] = f"{diff:.2f}"
-            customer['Match Score'] = f"{best_match['name_score']:.2f}"
+            customer['Amount Difference'] = format_pence(customer_amount - amounts[idx])
+            matched_amounts[i] = amounts[idx]
+            amount_differences[i] = customer_amount - amounts[idx]
+            customer['Match Score'] = f"{name_score:.2f}"
+            customer['Match Tier'] = tier_of[i]
+            if i in stored_matches:
+                customer['Runner-up Candidates'] = stored_matches[i]['runner_ups']
+            else:
+                customer['Runner-up Candidates'] = '; '.join(describe_candidate(transactions[idx], name_score, amounts[idx])
+                                                             for name_score, _, idx in shortlist[1:])
+            matches[i] = {
+                'dd_reference': dd_refs[shortlist[0][2]],
+                'transaction': transaction_prints[shortlist[0][2]],
+                'score': name_score,
+                'scorer': args.scorer,
+                'tier': tier_of[i],
+                'runner_ups': customer['Runner-up Candidates']
+            }
             
             matched_count += 1
         else:
-            # No match found
+            # No name, or no match found
             customer['Matched DD Reference'] = ''
             customer['Matched Collection Date'] = ''
             customer['Matched Amount'] = ''
             customer['Amount Difference'] = ''
             customer['Match Score'] = ''
+            customer['Match Tier'] = ''
+            customer['Runner-up Candidates'] = ''
+    
+    if pence is not None:
+        pence['Matched Amount'] = matched_amounts
+        pence['Amount Difference'] = amount_differences
+    store = (settings, store_keys, customer_prints, transaction_prints, matches)
+    return new_fieldnames, tier_of, matched_count, store
+
+def print_match_summary(customers, transactions, matched_count, tier_of):
+    print(f"✅ Matching complete!")
+    print(f"   📊 Customers: {len(customers)}")
+    print(f"   💳 Transactions: {len(transactions)}")
+    print(f"   ✓ Matched: {matched_count}")
+    for tier, count in sorted(Counter(tier_of.values()).items(), key=lambda x: x[1], reverse=True):
+        print(f"      {tier}: {count}")
+    print(f"   ✗ Unmatched: {len(customers) - matched_count}")
+
+def main():
+    parser = add_match_arguments(argparse.ArgumentParser(description='Match DDS customers with transactions'))
+    args = parser.parse_args()
+    check_match_arguments(parser, args)
+    
+    downloads_dir = os.path.expanduser('~/Downloads')
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Input files
+    customers_file = os.path.join(output_dir, 'DDS_COMBINED.csv')
+    transactions_file = os.path.join(downloads_dir, TRANSACTIONS_EXPORT)
+    output_file = os.path.join(output_dir, 'DDS_MATCHED.csv')
+    
+    print("🔄 Matching customers with transactions...\n")
+    
+    transactions, transaction_fields = load_transactions(transactions_file, args.db)
+    
+    # Load customers
+    print("📂 Loading customers...")
+    customers = []
+    with open(customers_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        for row in reader:
+            customers.append(row)
+    
+    print(f"   ✅ Loaded {len(customers)} customers\n")
+    
+    new_fieldnames, tier_of, matched_count, store = match_customers(customers, fieldnames, transactions,
+                                                                    transaction_fields, args, STORE_FILE)
     
     # Write output
     print(f"💾 Writing matched data...\n")
@@ -200,12 +541,13 @@ def main():
         writer = csv.DictWriter(f, fieldnames=new_fieldnames)
         writer.writeheader()
         writer.writerows(customers)
+    write_store(STORE_FILE, *store)
+    if args.db:
+        conn = data_store.connect()
+        data_store.store_customers(conn, 'DDS_MATCHED', customers)
+        conn.close()
     
-    print(f"✅ Matching complete!")
-    print(f"   📊 Customers: {len(customers)}")
-    print(f"   💳 Transactions: {len(transactions)}")
-    print(f"   ✓ Matched: {matched_count}")
-    print(f"   ✗ Unmatched: {len(customers) - matched_count}")
+    print_match_summary(customers, transactions, matched_count, tier_of)
     print(f"\n📄 Output: {output_file}")
     
     # Copy to Downloads
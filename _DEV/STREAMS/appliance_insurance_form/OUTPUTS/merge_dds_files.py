@@ -4,10 +4,15 @@ Merge DDS NEED CSV files into one unified spreadsheet
 Maps similar columns together and preserves unique columns
 """
 
+import argparse
 import csv
+import glob
 import os
-from collections import OrderedDict
 from datetime import datetime
+from operator import itemgetter
+
+from customer_dedup import CustomerClusters, customer_keys
+from dds_sources import detect_source
 
 # Define the unified column structure (in order)
 UNIFIED_COLUMNS = [
@@ -28,155 +33,166 @@ UNIFIED_COLUMNS = [
     'Source File'  # Track which file the data came from
 ]
 
-# Column mapping for each file
-FILE_MAPPINGS = {
-    'Active Swap': {
-        0: 'Phone Numbers',  # First column is phone data
-        'Name': 'Name',
-        'Address': 'Address',
-        'Area': 'Area',
-        'Postcode': 'Postcode',
-        'Email': 'Email',
-        'Plan': 'Plan',
-        'TMP': 'Total Cost',
-        'Sort Code': 'Sort Code',
-        'Account number': 'Account number',
-        'First DD Date': 'DD Date',
-        'Notes': 'Notes'
-    },
-    'Tuesday 11th': {
-        # No headers, so map by position
-        0: 'Plan number',
-        1: 'Name',
-        2: 'Address',
-        3: 'Postcode',
-        4: 'Email',
-        5: 'Plan',
-        6: 'Total Cost',
-        7: 'Sort Code',
-        8: 'Account number',
-        9: 'DD Date',
-        10: 'Notes',
-        11: 'Agents'
-    },
-    'Sales': {
-        'Plan number': 'Plan number',
-        'Phone Numbers': 'Phone Numbers',
-        'Name': 'Name',
-        'Adress': 'Address',  # Fix spelling
-        'Postcode': 'Postcode',
-        'Email': 'Email',
-        'Plan': 'Plan',
-        'Total Cost': 'Total Cost',
-        'Sort Code': 'Sort Code',
-        'Account number': 'Account number',
-        'DD Date': 'DD Date',
-        'Notes - e.g. whats covered': 'Notes',
-        'Agents': 'Agents'
-    }
-}
+# Added after deduplication: the same ID on every row of one customer, across sheets
+CUSTOMER_ID_COLUMN = 'Customer ID'
+
+# The usual sheets, in ~/Downloads
+DEFAULT_SHEETS = ['DDS NEED ! - Active Swap.csv', 'DDS NEED ! - Tuesday 11th.csv', 'DDS NEED ! - Sales (1).csv']
 
-def read_csv_with_mapping(filepath, file_type, mapping):
-    """Read CSV and map columns to unified structure"""
-    rows = []
+class ColumnPlan:
+    """A file's column mapping compiled once against its header row
+
+    For every unified column, the source columns that fill it in the order
+    the cells are read: a header-name match overwrites, a positional match in
+    a file with headers only fills a column still empty, and a positional
+    match in a headerless file overwrites. Source File is always the file type.
+    """
     
+    def __init__(self, mapping, file_type, headers=None):
+        self.file_type = file_type
+        targets = {column: i for i, column in enumerate(UNIFIED_COLUMNS)}
+        positions = [key for key in mapping if isinstance(key, int)]
+        self.width = max([len(headers or ())] + [p + 1 for p in positions])
+        
+        sources = [[] for _ in UNIFIED_COLUMNS]
+        for col_idx in range(self.width):
+            if headers is not None and col_idx < len(headers) and headers[col_idx].strip() in mapping:
+                sources[targets[mapping[headers[col_idx].strip()]]].append((col_idx, False))
+            if col_idx in mapping:
+                sources[targets[mapping[col_idx]]].append((col_idx, headers is not None))
+        sources[targets['Source File']] = []
+        self.sources = sources
+        
+        # Usual case, one source per column: a single itemgetter over the row padded with ''
+        # (index `width` is always padding, standing in for unmapped columns)
+        self.getter = None
+        if all(len(steps) <= 1 for steps in sources):
+            self.getter = itemgetter(*[steps[0][0] if steps else self.width for steps in sources])
+    
+    def project(self, row):
+        """The row as a tuple in UNIFIED_COLUMNS order"""
+        if self.getter is not None:
+            # Trim or pad to width cells, plus the empty cell at index width
+            padded = row[:self.width] + [''] * (self.width + 1 - min(len(row), self.width))
+            values = [value.strip() for value in self.getter(padded)]
+        else:
+            values = []
+            for steps in self.sources:
+                value = ''
+                for col_idx, fill_only in steps:
+                    if col_idx < len(row) and not (fill_only and value):
+                        value = row[col_idx].strip()
+                values.append(value)
+        values[-1] = self.file_type
+        return tuple(values)
+
+def read_csv_with_mapping(filepath, file_type, mapping, has_headers=True):
+    """Read CSV and yield its rows mapped to the unified structure, as tuples"""
     with open(filepath, 'r', encoding='utf-8') as f:
         reader = csv.reader(f)
         
-        if file_type == 'Tuesday 11th':
+        if not has_headers:
             # No headers, skip first empty row if exists
+            plan = ColumnPlan(mapping, file_type)
             first_row = next(reader, None)
-            if first_row and all(cell.strip() == '' for cell in first_row):
-                # Skip empty header row
-                pass
-            else:
+            if first_row and not all(cell.strip() == '' for cell in first_row):
                 # Process first row as data
-                if first_row:
-                    row_data = OrderedDict.fromkeys(UNIFIED_COLUMNS, '')
-                    for col_idx, value in enumerate(first_row):
-                        if col_idx in mapping:
-                            unified_col = mapping[col_idx]
-                            row_data[unified_col] = value.strip()
-                    row_data['Source File'] = file_type
-                    rows.append(row_data)
-            
-            # Process remaining rows
-            for row in reader:
-                if not any(row):  # Skip empty rows
-                    continue
-                row_data = OrderedDict.fromkeys(UNIFIED_COLUMNS, '')
-                for col_idx, value in enumerate(row):
-                    if col_idx in mapping:
-                        unified_col = mapping[col_idx]
-                        row_data[unified_col] = value.strip()
-                row_data['Source File'] = file_type
-                rows.append(row_data)
-                
+                yield plan.project(first_row)
         else:
             # Has headers
-            headers = next(reader)
-            
-            for row in reader:
-                if not any(row):  # Skip empty rows
-                    continue
-                    
-                row_data = OrderedDict.fromkeys(UNIFIED_COLUMNS, '')
-                
-                for col_idx, value in enumerate(row):
-                    # Try to map by header name first
-                    if col_idx < len(headers):
-                        header = headers[col_idx].strip()
-                        if header in mapping:
-                            unified_col = mapping[header]
-                            row_data[unified_col] = value.strip()
-                    
-                    # Also check positional mapping (for first column in Active Swap)
-                    if col_idx in mapping:
-                        unified_col = mapping[col_idx]
-                        if not row_data[unified_col]:  # Don't overwrite if already set
-                            row_data[unified_col] = value.strip()
-                
-                row_data['Source File'] = file_type
-                rows.append(row_data)
-    
-    return rows
+            plan = ColumnPlan(mapping, file_type, next(reader))
+        
+        for row in reader:
+            if not any(row):  # Skip empty rows
+                continue
+            yield plan.project(row)
 
-def main():
+def sheet_files(pattern=None):
+    """Sheets to merge: every CSV matching pattern (sorted), or the usual sheets in ~/Downloads"""
+    if pattern:
+        files = sorted(glob.glob(os.path.expanduser(pattern)))
+        if not files:
+            print(f"   ⚠️  No files match: {pattern}\n")
+        return files
     downloads_dir = os.path.expanduser('~/Downloads')
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    files = [
-        (os.path.join(downloads_dir, 'DDS NEED ! - Active Swap.csv'), 'Active Swap'),
-        (os.path.join(downloads_dir, 'DDS NEED ! - Tuesday 11th.csv'), 'Tuesday 11th'),
-        (os.path.join(downloads_dir, 'DDS NEED ! - Sales (1).csv'), 'Sales')
-    ]
-    
-    all_rows = []
-    
-    print("🔄 Merging DDS NEED files...\n")
+    return [os.path.join(downloads_dir, name) for name in DEFAULT_SHEETS]
+
+def merged_rows(files, clusters):
+    """Every sheet's rows as tuples in UNIFIED_COLUMNS order (without the Customer ID),
+    each added to clusters under its dedup keys as it is read"""
+    # Columns the dedup keys are built from
+    key_columns = itemgetter(*[UNIFIED_COLUMNS.index(column) for column in
+                               ('Phone Numbers', 'Name', 'Postcode', 'Sort Code', 'Account number')])
     
-    for filepath, file_type in files:
+    for filepath in files:
         if os.path.exists(filepath):
+            file_type, has_headers, mapping, how = detect_source(filepath)
             print(f"📂 Processing: {file_type}")
-            mapping = FILE_MAPPINGS[file_type]
-            rows = read_csv_with_mapping(filepath, file_type, mapping)
-            all_rows.extend(rows)
-            print(f"   ✅ Added {len(rows)} rows\n")
+            if how != 'known':
+                mapped = ', '.join(f"{'col ' + str(source + 1) if isinstance(source, int) else source} → {column}"
+                                   for source, column in mapping.items())
+                print(f"   🔎 Layout {how}{'' if has_headers else ' (no header row)'}: {mapped}")
+            count = 0
+            for row in read_csv_with_mapping(filepath, file_type, mapping, has_headers):
+                clusters.add(customer_keys(*key_columns(row)), '\x1f'.join(row[:-1]))
+                count += 1
+                yield row
+            print(f"   ✅ Added {count} rows\n")
         else:
             print(f"   ⚠️  File not found: {filepath}\n")
+
+def merge_table(files):
+    """(columns, rows) of the merged sheets, each row a list ending with its Customer ID,
+    held in memory (for the pipeline runner)"""
+    clusters = CustomerClusters()
+    rows = [list(row) for row in merged_rows(files, clusters)]
+    for row, customer_id in zip(rows, clusters.ids()):
+        row.append(customer_id)
+    return UNIFIED_COLUMNS + [CUSTOMER_ID_COLUMN], rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge DDS NEED sheets into DDS_COMBINED.csv')
+    parser.add_argument('--glob', metavar='PATTERN',
+                        help="merge every CSV matching PATTERN (e.g. '~/Downloads/DDS NEED ! - *.csv'), "
+                             "detecting each sheet's layout, instead of the usual three sheets")
+    args = parser.parse_args()
+    
+    output_dir = os.path.dirname(os.path.abspath(__file__))
+    files = sheet_files(args.glob)
     
-    # Write combined CSV
     output_file = os.path.join(output_dir, 'DDS_COMBINED.csv')
+    merged_file = f'{output_file}.{os.getpid()}.tmp'
+    total_rows = 0
+    
+    print("🔄 Merging DDS NEED files...\n")
+    
+    clusters = CustomerClusters()
     
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=UNIFIED_COLUMNS)
-        writer.writeheader()
-        writer.writerows(all_rows)
+    try:
+        # Rows stream straight from each source to a merged file, keeping only their dedup keys
+        with open(merged_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for row in merged_rows(files, clusters):
+                writer.writerow(row)
+                total_rows += 1
+        
+        # Second pass: copy the merged rows across with their canonical customer ID
+        customer_ids = clusters.ids()
+        with open(merged_file, 'r', newline='', encoding='utf-8') as src, \
+                open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(UNIFIED_COLUMNS + [CUSTOMER_ID_COLUMN])
+            for row, customer_id in zip(csv.reader(src), customer_ids):
+                row.append(customer_id)
+                writer.writerow(row)
+    finally:
+        os.remove(merged_file)
     
-    print(f"\n✅ Combined {len(all_rows)} total rows")
+    print(f"\n✅ Combined {total_rows} total rows")
+    print(f"   👥 Distinct customers after deduplication: {len(set(customer_ids))}")
     print(f"📄 Output file: {output_file}")
-    print(f"\n📊 Unified columns ({len(UNIFIED_COLUMNS)}):")
-    for i, col in enumerate(UNIFIED_COLUMNS, 1):
+    print(f"\n📊 Unified columns ({len(UNIFIED_COLUMNS) + 1}):")
+    for i, col in enumerate(UNIFIED_COLUMNS + [CUSTOMER_ID_COLUMN], 1):
         print(f"   {i:2d}. {col}")
 
 if __name__ == '__main__':
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Money amounts as whole pence
+Amount columns ('£1,234.50', '20', blank) are parsed once, a whole column at
+a time, into int64 pence; totals, differences and matching work on those
+integers, and amounts are only formatted back to pounds for output
+"""
+
+import math
+
+import numpy as np
+
+
+def to_pence(value):
+    """One amount string in pence (blank or unparseable amounts are 0)"""
+    text = (value or '').replace('£', '').replace(',', '').strip()
+    if not text:
+        return 0
+    try:
+        amount = float(text)
+    except ValueError:
+        return 0
+    return round(amount * 100) if math.isfinite(amount) else 0
+
+
+def parse_pence(values):
+    """A column of amount strings as an int64 array of pence, as to_pence would parse each"""
+    values = list(values)
+    text = [value.replace('£', '').replace(',', '') if value else '0' for value in values]
+    try:
+        # One conversion for the whole column (surrounding spaces are allowed)
+        amounts = np.array(text, dtype=np.float64)
+    except ValueError:
+        # Some cell isn't a number - parse the column value by value instead
+        return np.array([to_pence(value) for value in values], dtype=np.int64)
+    amounts[~np.isfinite(amounts)] = 0
+    return np.rint(amounts * 100).astype(np.int64)
+
+
+def format_pence(pence):
+    """Pence as pounds with two decimals, e.g. -1999 -> '-19.99'"""
+    # pence / 100 is the double nearest the exact amount, so two decimals print it exactly
+    return f"{pence / 100:.2f}"
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Candidate blocking for fuzzy name matching
+Transactions are indexed by last-name prefix, last-name phonetic code and first
+initial. A customer is scored against the transactions in its blocks first;
+every other transaction has a cheap upper bound on its score, so only the few
+that could still beat the best block match need scoring, which keeps the
+results identical to comparing every pair
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+# Leading characters of the last name used as a block key
+PREFIX_LENGTH = 2
+
+# Letters counted separately for score bounds; anything else shares one slot
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+# Soundex digit for each consonant (vowels, h, w and y have none)
+SOUNDEX_CODES = {letter: str(digit)
+                 for digit, letters in enumerate(('bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'), 1)
+                 for letter in letters}
+
+
+def soundex(word):
+    """Four-character Soundex code of a lowercase word ('' if it has no letters)"""
+    letters = [c for c in word if c in ALPHABET]
+    if not letters:
+        return ''
+
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        digit = SOUNDEX_CODES.get(c, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w don't separate consonants with the same code; vowels do
+        if c not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def block_keys(first, last):
+    """Block keys of a normalized (first, last) name"""
+    return (('prefix', last[:PREFIX_LENGTH]),
+            ('phonetic', soundex(last)),
+            ('initial', first[:1]))
+
+
+def letter_counts(words):
+    """(len(words), 27) matrix of per-letter character counts"""
+    counts = np.zeros((len(words), len(ALPHABET) + 1), dtype=np.int16)
+    for i, word in enumerate(words):
+        for c in word:
+            # find() gives -1 for non-letters, which lands in the shared last slot
+            counts[i, ALPHABET.find(c)] += 1
+    return counts
+
+
+def ratio_bounds(counts, length, other_counts, other_lengths):
+    """Upper bound on SequenceMatcher.ratio() of one word against many
+
+    Neither matching blocks nor a longest common subsequence can pair more
+    characters than the two words have in common, so this is quick_ratio()
+    evaluated with the same float arithmetic as ratio(), and never below it.
+    """
+    shared = np.minimum(other_counts, counts).sum(axis=1)
+    total = other_lengths + length
+    return np.where(total > 0, 2.0 * shared / np.maximum(total, 1), 1.0)
+
+
+class BlockingIndex:
+    """Block key -> indices of the names (parallel first / last tokens) that carry it"""
+
+    def __init__(self, firsts, lasts):
+        self.size = len(firsts)
+        self.first_counts = letter_counts(firsts)
+        self.last_counts = letter_counts(lasts)
+        self.first_lengths = np.array([len(w) for w in firsts], dtype=np.int64)
+        self.last_lengths = np.array([len(w) for w in lasts], dtype=np.int64)
+
+        blocks = defaultdict(list)
+        for i, (first, last) in enumerate(zip(firsts, lasts)):
+            for key in set(block_keys(first, last)):
+                blocks[key].append(i)
+        self.blocks = {key: np.array(members, dtype=np.int64) for key, members in blocks.items()}
+
+    def lookup(self, first, last):
+        """(score bounds, block mask) of (first, last) against every indexed name
+
+        bounds[i] is never below the pair's 60% last / 40% first score, whether
+        the ratios come from SequenceMatcher or the LCS kernel; mask[i] is True where name i shares a block key with (first, last).
+        """
+        bounds = (ratio_bounds(letter_counts([last])[0], len(last), self.last_counts, self.last_lengths) * 0.6
+                  + ratio_bounds(letter_counts([first])[0], len(first), self.first_counts, self.first_lengths) * 0.4)
+
+        mask = np.zeros(self.size, dtype=bool)
+        for key in block_keys(first, last):
+            if key in self.blocks:
+                mask[self.blocks[key]] = True
+        return bounds, mask
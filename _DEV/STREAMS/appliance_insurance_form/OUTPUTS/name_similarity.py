@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Threshold-bounded name similarity kernel
+Scores names on their longest common subsequence, computed bit-parallel (one
+big-int update per character) and abandoned as soon as the threshold is out
+of reach
+
+SequenceMatcher.ratio() is 2*M/T, where M counts the characters in its
+matching blocks and T is the combined length. Those blocks form one common
+subsequence, so M never exceeds the LCS and 2*LCS/T is never below ratio().
+That lets the kernel rule pairs out for the exact scorer. Used as a scorer in
+its own right (the calibrated mode), it keeps the 60% last / 40% first
+weighting. The tolerance measured on generated UK name pairs by
+benchmark_name_scorer.py: about 96% of scores are identical, and the rest
+are higher by 0.08 on average and at most 0.4. The largest gaps come from
+long surnames where SequenceMatcher's greedy blocks miss the LCS. About 0.01%
+of pairs move across the 0.6 threshold. The kernel never scores a pair lower.
+"""
+
+from functools import lru_cache
+
+# Weighting of the existing scorer: 60% last name, 40% first name
+LAST_WEIGHT = 0.6
+FIRST_WEIGHT = 0.4
+
+
+@lru_cache(maxsize=None)
+def match_masks(word):
+    """Character -> bitmask of the positions it occupies in word"""
+    masks = {}
+    for i, c in enumerate(word):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def lcs_length(a, b, need=0):
+    """Length of the longest common subsequence of a and b
+
+    Returns None as soon as fewer than `need` common characters remain possible.
+    """
+    if min(len(a), len(b)) < need:
+        return None
+    if not a or not b:
+        return 0
+
+    masks = match_masks(a)
+    full = (1 << len(a)) - 1
+    v = full
+    # The cutoff can't trigger while at least `need` characters of b are left
+    unchecked = len(b) - need + 1
+    for c in b[:unchecked]:
+        u = v & masks.get(c, 0)
+        v = ((v + u) | (v - u)) & full
+    remaining = len(b) - unchecked
+    for c in b[unchecked:]:
+        u = v & masks.get(c, 0)
+        v = ((v + u) | (v - u)) & full
+        remaining -= 1
+        # Zero bits of v are the common subsequence so far; each character left adds at most one
+        if len(a) - v.bit_count() + remaining < need:
+            return None
+    return len(a) - v.bit_count()
+
+
+def lcs_ratio(a, b):
+    """2*LCS/T, the LCS counterpart of SequenceMatcher(None, a, b).ratio()"""
+    total = len(a) + len(b)
+    return 2.0 * lcs_length(a, b) / total if total else 1.0
+
+
+def lcs_match_score(first1, last1, first2, last2, threshold=0.0):
+    """60% last / 40% first name score on LCS ratios, or None if it can't reach threshold
+
+    The first names are compared in full; the last-name comparison stops once
+    too few common characters remain for the weighted score to reach threshold.
+    """
+    first_ratio = lcs_ratio(first1, first2)
+
+    total = len(last1) + len(last2)
+    if not total:
+        last_ratio = 1.0
+    else:
+        # Common characters the last names need; rounded down so float error never cuts a pair
+        need = int((threshold - first_ratio * FIRST_WEIGHT) / LAST_WEIGHT * total / 2)
+        common = lcs_length(last1, last2, need)
+        if common is None:
+            return None
+        last_ratio = 2.0 * common / total
+
+    return (last_ratio * LAST_WEIGHT) + (first_ratio * FIRST_WEIGHT)
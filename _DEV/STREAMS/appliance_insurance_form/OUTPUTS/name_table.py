@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Normalized name tokens for DDS matching
+Each customer or transaction name is normalized once into (first, last, full)
+tokens; scoring and blocking read the tokens instead of re-parsing the name
+"""
+
+# Titles dropped from names before matching
+TITLES = frozenset(['mr', 'mrs', 'ms', 'miss', 'dr', 'mr.', 'mrs.', 'ms.', 'miss.', 'dr.'])
+
+
+def normalize_name(name):
+    """Normalize name for matching: lowercase, remove extra spaces, punctuation"""
+    if not name:
+        return ""
+    name = name.lower().strip()
+
+    # Remove punctuation
+    name = name.replace('.', ' ').replace(',', ' ')
+
+    # Remove titles
+    words = [w for w in name.split() if w not in TITLES]
+
+    return ' '.join(words)
+
+
+def split_name(full):
+    """(first, last) of a normalized name: its first and last words"""
+    parts = full.split()
+    if not parts:
+        return ('', '')
+    elif len(parts) == 1:
+        return (parts[0], '')
+    return (parts[0], parts[-1])
+
+
+def extract_first_last(name):
+    """Extract first and last name from full name"""
+    return split_name(normalize_name(name))
+
+
+class NameTable:
+    """Parallel first / last / full token lists, one entry per input name
+
+    Raw names that repeat (a DD reference collected every month) are
+    normalized once and share their tokens.
+    """
+
+    def __init__(self, names):
+        self.first = []
+        self.last = []
+        self.full = []
+        seen = {}
+        for name in names:
+            tokens = seen.get(name)
+            if tokens is None:
+                full = normalize_name(name)
+                tokens = seen[name] = split_name(full) + (full,)
+            first, last, full = tokens
+            self.first.append(first)
+            self.last.append(last)
+            self.full.append(full)
+
+    @classmethod
+    def from_normalized(cls, fulls):
+        """Table over names that are already normalized (the .full tokens of another table)"""
+        table = cls(())
+        for full in fulls:
+            first, last = split_name(full)
+            table.first.append(first)
+            table.last.append(last)
+            table.full.append(full)
+        return table
+
+    def __len__(self):
+        return len(self.full)
+
+    def tokens(self, i):
+        """(first, last) tokens of entry i"""
+        return self.first[i], self.last[i]
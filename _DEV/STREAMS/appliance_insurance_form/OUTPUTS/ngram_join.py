@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Character-trigram similarity join for batch name matching
+Names become sparse TF-IDF vectors over their character trigrams; each
+customer's nearest transaction names by cosine similarity come out of
+blocked sparse products (inverted postings gathered and summed with
+np.bincount), so a whole batch is a handful of array operations
+"""
+
+import numpy as np
+
+
+def trigrams(text):
+    """Character trigrams of text, padded with a space at each end"""
+    padded = f' {text} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class TrigramIndex:
+    """TF-IDF trigram vectors of the indexed names, searched by cosine similarity
+
+    IDF comes from the indexed names; a query trigram they never contain
+    only counts towards the query's length.
+    """
+
+    def __init__(self, texts):
+        self.size = len(texts)
+        self.vocabulary = {}
+        docs, terms, counts = self._term_counts(texts, grow=True)
+
+        df = np.bincount(terms, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + self.size) / (1 + df)) + 1
+        self.unseen_idf = np.log(1 + self.size) + 1
+        weights = self._normalize(docs, counts * self.idf[terms], self.size)
+
+        # Postings: for each trigram, the names containing it and their weights
+        order = np.argsort(terms, kind='stable')
+        self.posting_starts = np.searchsorted(terms[order], np.arange(len(self.vocabulary) + 1))
+        self.posting_docs = docs[order]
+        self.posting_weights = weights[order]
+
+    def _term_counts(self, texts, grow=False):
+        """(doc, term, count) arrays with one entry per distinct trigram of each text;
+        unseen trigrams get negative ids unless grow adds them to the vocabulary"""
+        docs, terms, counts = [], [], []
+        unseen = {}
+        for doc, text in enumerate(texts):
+            row = {}
+            for gram in trigrams(text):
+                term = self.vocabulary.get(gram)
+                if term is None:
+                    if grow:
+                        term = self.vocabulary[gram] = len(self.vocabulary)
+                    else:
+                        term = unseen.setdefault(gram, -1 - len(unseen))
+                row[term] = row.get(term, 0) + 1
+            docs.extend([doc] * len(row))
+            terms.extend(row)
+            counts.extend(row.values())
+        return (np.array(docs, dtype=np.int64), np.array(terms, dtype=np.int64),
+                np.array(counts, dtype=np.float64))
+
+    @staticmethod
+    def _normalize(docs, weights, n_docs):
+        """Scale each document's weights to unit length"""
+        norms = np.sqrt(np.bincount(docs, weights=weights * weights, minlength=n_docs))
+        return weights / np.where(norms > 0, norms, 1.0)[docs]
+
+    def top_k(self, texts, k, block_cells=1 << 22):
+        """For each query text, the indices (ascending) of its k most similar indexed
+        names that share at least one trigram with it
+
+        Queries are scored block by block, about block_cells query x name
+        similarities at a time.
+        """
+        if not self.vocabulary:
+            # Nothing indexed (or only empty names): no query shares a trigram
+            return [np.zeros(0, dtype=np.int64) for _ in texts]
+        docs, terms, counts = self._term_counts(texts)
+        # Trigrams outside the vocabulary get their own negative ids; they only add to the length
+        weights = self._normalize(docs, counts * np.where(terms >= 0, self.idf[np.maximum(terms, 0)],
+                                                          self.unseen_idf), len(texts))
+        known = terms >= 0
+        docs, terms, weights = docs[known], terms[known], weights[known]
+
+        neighbours = []
+        rows_per_block = max(1, block_cells // max(self.size, 1))
+        for start in range(0, len(texts), rows_per_block):
+            stop = min(start + rows_per_block, len(texts))
+            lo, hi = np.searchsorted(docs, [start, stop])
+            block_docs, block_terms, block_weights = docs[lo:hi] - start, terms[lo:hi], weights[lo:hi]
+
+            # Expand every (query trigram, posting) pair and sum the products per (query, name)
+            lengths = self.posting_starts[block_terms + 1] - self.posting_starts[block_terms]
+            offsets = np.repeat(self.posting_starts[block_terms] - np.cumsum(lengths) + lengths, lengths)
+            postings = np.arange(int(lengths.sum())) + offsets
+            cells = np.repeat(block_docs, lengths) * self.size + self.posting_docs[postings]
+            products = np.repeat(block_weights, lengths) * self.posting_weights[postings]
+            sims = np.bincount(cells, weights=products,
+                               minlength=(stop - start) * self.size).reshape(stop - start, self.size)
+
+            if k < self.size:
+                best = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            else:
+                best = np.broadcast_to(np.arange(self.size), sims.shape)
+            for row, candidates in zip(sims, best):
+                neighbours.append(np.sort(candidates[row[candidates] > 0]))
+        return neighbours
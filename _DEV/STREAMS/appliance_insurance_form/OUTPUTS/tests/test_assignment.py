@@ -0,0 +1,57 @@
+"""The sparse matching reaches the same total weight as trying every assignment"""
+
+import random
+
+import pytest
+
+from assignment import max_weight_matching
+
+
+def brute_force(edges, fallback):
+    """Best total weight over every assignment of rows to distinct columns (or to their fallback)"""
+    best = float('-inf')
+
+    def assign(i, used, total):
+        nonlocal best
+        if i == len(edges):
+            best = max(best, total)
+            return
+        assign(i + 1, used, total + fallback[i])
+        for j, w in edges[i]:
+            if j not in used:
+                assign(i + 1, used | {j}, total + w)
+
+    assign(0, frozenset(), 0)
+    return best
+
+
+def random_instance(rng):
+    n_rows, n_columns = rng.randint(0, 7), rng.randint(0, 6)
+    edges = [[(j, rng.randint(-5, 20)) for j in rng.sample(range(n_columns), rng.randint(0, n_columns))]
+             for _ in range(n_rows)]
+    fallback = [rng.randint(-3, 8) for _ in range(n_rows)]
+    return edges, n_columns, fallback
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_matching_is_optimal(seed):
+    rng = random.Random(seed)
+    edges, n_columns, fallback = random_instance(rng)
+    columns = max_weight_matching(edges, n_columns, fallback)
+
+    assert len(columns) == len(edges)
+    chosen = [j for j in columns if j != -1]
+    assert len(chosen) == len(set(chosen))
+    total = 0
+    for i, j in enumerate(columns):
+        if j == -1:
+            total += fallback[i]
+        else:
+            weights = dict(edges[i])
+            assert j in weights
+            total += weights[j]
+    assert total == brute_force(edges, fallback)
+
+
+def test_default_fallback_leaves_rows_unassigned():
+    assert max_weight_matching([[(0, 5)], [(0, 7)], []], 1) == [-1, 0, -1]
@@ -0,0 +1,77 @@
+"""Blocking with the letter-count bound finds exactly the pairs exhaustive scoring does"""
+
+import random
+from difflib import SequenceMatcher
+
+import numpy as np
+import pytest
+
+from match_transactions import (MATCH_THRESHOLD, customer_matches, sequence_score, token_match_score,
+                                unfiltered_score)
+from name_blocking import BlockingIndex, letter_counts, ratio_bounds
+from name_table import NameTable
+
+FIRST_NAMES = ['john', 'jon', 'joan', 'mary', 'marie', 'stephen', 'steven', 'ann', 'anne', 'mohammed',
+               'muhammad', 'li', 'o', 'catherine', 'kathryn', 'bob', 'robert', 'siobhan', 'zoe', 'x']
+LAST_NAMES = ['smith', 'smyth', 'smithson', 'jones', 'johns', 'johnson', 'obrien', 'o brien', 'brien',
+              'macdonald', 'mcdonald', 'li', 'lee', 'ng', 'wong', 'taylor', 'tailor', 'featherstonehaugh',
+              'fanshawe', 'patel', 'pate', 'ab', 'smith jones']
+
+
+def mutate(word, rng):
+    """word with up to two random character edits (substitute, insert, delete or swap)"""
+    word = list(word)
+    for _ in range(rng.randint(0, 2)):
+        edit = rng.choice(['sub', 'ins', 'del', 'swap'])
+        at = rng.randrange(len(word) + 1)
+        letter = rng.choice('abcdehilmnorsty')
+        if edit == 'ins' or not word:
+            word.insert(at, letter)
+        elif edit == 'sub':
+            word[min(at, len(word) - 1)] = letter
+        elif edit == 'del':
+            del word[min(at, len(word) - 1)]
+        elif len(word) > 1:
+            at = min(at, len(word) - 2)
+            word[at], word[at + 1] = word[at + 1], word[at]
+    return ''.join(word)
+
+
+def random_names(rng, n):
+    return [f'{mutate(rng.choice(FIRST_NAMES), rng)} {mutate(rng.choice(LAST_NAMES), rng)}'.strip()
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ratio_bound_never_below_sequence_matcher(seed):
+    rng = random.Random(seed)
+    words = [mutate(rng.choice(FIRST_NAMES + LAST_NAMES), rng) for _ in range(60)]
+    lengths = np.array([len(w) for w in words])
+    counts = letter_counts(words)
+    for i, word in enumerate(words):
+        bounds = ratio_bounds(counts[i], lengths[i], counts, lengths)
+        for j, other in enumerate(words):
+            assert bounds[j] >= SequenceMatcher(None, word, other).ratio()
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('score', [unfiltered_score, sequence_score])
+def test_blocked_candidates_equal_exhaustive_scoring(seed, score):
+    rng = random.Random(seed)
+    customers = NameTable(random_names(rng, 80))
+    transactions = NameTable(random_names(rng, 150))
+    amounts = [rng.randrange(500, 5000) for _ in range(len(transactions))]
+    dd_refs = [f'REF{i}' for i in range(len(transactions))]
+    transaction_data = (transactions, dd_refs, amounts, score)
+    index = BlockingIndex(transactions.first, transactions.last)
+
+    for i in range(len(customers)):
+        first, last = customers.tokens(i)
+        expected = sorted(idx for idx in range(len(transactions))
+                          if token_match_score(first, last, *transactions.tokens(idx)) >= MATCH_THRESHOLD)
+        blocked = customer_matches(first, last, 1000, index, transaction_data, None)
+        assert sorted(idx for _, _, idx in blocked) == expected
+        # With a short list, blocking keeps the same best candidates as comparing every pair
+        for k in (1, 3):
+            assert (customer_matches(first, last, 1000, index, transaction_data, k) ==
+                    customer_matches(first, last, 1000, None, transaction_data, k))
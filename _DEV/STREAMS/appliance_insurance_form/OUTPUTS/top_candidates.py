@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Bounded best-k candidate list for DDS matching
+Keeps only the k best (score, amount difference, transaction index) tuples
+seen for a customer, in a heap whose weakest entry also tells the scorer how
+high a new candidate has to reach
+"""
+
+import heapq
+
+
+class TopCandidates:
+    """The k best candidates pushed: highest score, then smallest amount
+    difference, then earliest transaction (k=None keeps every candidate)"""
+
+    def __init__(self, k, threshold):
+        self.k = k
+        self.threshold = threshold
+        # Min-heap on rank, so heap[0] is the weakest candidate kept
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def floor(self):
+        """Lowest score a new candidate needs to have a chance of being kept"""
+        if self.k is not None and len(self.heap) >= self.k:
+            return self.heap[0][0]
+        return self.threshold
+
+    def push(self, score, amount_diff, index):
+        entry = (score, -amount_diff, -index)
+        if self.k is None or len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def ranked(self):
+        """(score, amount_diff, index) tuples, best first"""
+        return [(score, -diff, -index) for score, diff, index in sorted(self.heap, reverse=True)]